@@ -0,0 +1,133 @@
+import numpy as np
+
+from aggregates import HISTOGRAM_EDGES
+from caching import LRUCache
+
+# Two-sided 95% normal quantile of the confidence bands; with the dozens of games a
+# fit needs, the Student t quantile is practically the same
+CONFIDENCE_Z = 1.96
+# Share of the games each LOWESS fit is local to, as statsmodels' frac
+LOWESS_FRAC = 0.3
+# Points the fitted curves are evaluated at
+GRID_POINTS = 100
+# Fewer games than this per time class are not fitted
+MIN_GAMES = 3
+
+_MODELS = LRUCache(maxsize=64)
+
+
+def linear_fit(sums, grid, z=CONFIDENCE_Z):
+    """
+    Fits accuracy = intercept + slope * opponent rating by least squares from sufficient sums.
+
+    The confidence band is the closed-form band of the mean response,
+    se(x) = s * sqrt(1/n + (x - mean_x)^2 / Sxx), so no game is looked at again.
+
+    :param sums: The sums n, Σx, Σy, Σx², Σxy and Σy² (see range_analysis.REGRESSION_SUMS).
+    :param grid: The opponent ratings to evaluate the line at.
+    :param z: The quantile of the band.
+    :return: A dictionary with 'slope', 'intercept', 'r', 'games', 'fit', 'lower' and 'upper',
+        or None if there are fewer than MIN_GAMES games.
+    """
+    n, sum_x, sum_y, sum_xx, sum_xy, sum_yy = (float(value) for value in sums)
+    if n < MIN_GAMES:
+        return None
+
+    mean_x, mean_y = sum_x / n, sum_y / n
+    # Centered sums; clipped since rounding can make them slightly negative
+    sxx = max(sum_xx - sum_x * mean_x, 0.0)
+    syy = max(sum_yy - sum_y * mean_y, 0.0)
+    sxy = sum_xy - sum_x * mean_y
+
+    # Without any spread in the opponents' ratings the best line is flat
+    slope = sxy / sxx if sxx > 0 else 0.0
+    intercept = mean_y - slope * mean_x
+    residual_variance = max(syy - slope * sxy, 0.0) / (n - 2)
+    leverage = 1 / n + ((grid - mean_x) ** 2 / sxx if sxx > 0 else 0.0)
+    half_width = z * np.sqrt(residual_variance * leverage)
+
+    fit = intercept + slope * grid
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'r': sxy / np.sqrt(sxx * syy) if sxx * syy > 0 else np.nan,
+        'games': int(n),
+        'fit': fit,
+        'lower': fit - half_width,
+        'upper': fit + half_width,
+    }
+
+
+def binned_lowess(counts, sums, centers, grid, frac=LOWESS_FRAC):
+    """
+    Locally weighted linear regression over binned data.
+
+    Every bin stands for its games at the bin center with their mean accuracy. For
+    each grid point a weighted line is fitted through the nearest bins holding a
+    fraction `frac` of the games, with tricube weights, so the cost depends on the
+    number of bins and grid points only. Unlike statsmodels' lowess there are no
+    robustness iterations.
+
+    :param counts: The number of games per bin.
+    :param sums: The sum of the accuracies per bin.
+    :param centers: The bin centers.
+    :param grid: The opponent ratings to evaluate the curve at.
+    :param frac: The share of the games each local fit uses.
+    :return: A float array with the curve on the grid.
+    """
+    occupied = counts > 0
+    x, weights = centers[occupied], counts[occupied]
+    y = sums[occupied] / weights
+
+    # Local coordinates around every grid point: shape (grid points, bins)
+    dx = x[None, :] - grid[:, None]
+    distance = np.abs(dx)
+    order = np.argsort(distance, axis=1)
+    cumulative = np.cumsum(weights[order], axis=1)
+    nearest = np.argmax(cumulative >= frac * weights.sum(), axis=1)
+    radius = np.take_along_axis(distance, np.take_along_axis(order, nearest[:, None], axis=1), axis=1)
+    # Keep the neighbourhood at least a bin wide on each side
+    radius = np.maximum(radius, centers[1] - centers[0]) * 1.0001
+
+    w = weights * np.clip(1 - (distance / radius) ** 3, 0, None) ** 3
+    s0, s1, s2 = w.sum(axis=1), (w * dx).sum(axis=1), (w * dx ** 2).sum(axis=1)
+    t0, t1 = (w * y).sum(axis=1), (w * dx * y).sum(axis=1)
+    determinant = s0 * s2 - s1 ** 2
+
+    # The local line's value at the grid point is its intercept in local coordinates
+    with np.errstate(divide='ignore', invalid='ignore'):
+        line = (t0 * s2 - s1 * t1) / determinant
+        mean = t0 / s0
+    return np.where(determinant > 1e-9 * np.maximum(s0 * s2, 1e-300), line, mean)
+
+
+def accuracy_models(aggregates, lowess=False):
+    """
+    Fits the player's accuracy against the opponent's rating per time class, cached by data version.
+
+    :param aggregates: A RangeAggregates holding the games.
+    :param lowess: Whether to also fit binned LOWESS curves.
+    :return: A dictionary mapping time class to a linear_fit result plus 'grid' and 'lowess'
+        (None unless requested). Time classes with fewer than MIN_GAMES games with accuracies are left out.
+    """
+    key = (aggregates.version, lowess)
+    return _MODELS.get_or_compute(key, lambda: _fit_models(aggregates, lowess))
+
+
+def _fit_models(aggregates, lowess):
+    width = HISTOGRAM_EDGES[1] - HISTOGRAM_EDGES[0]
+    centers = HISTOGRAM_EDGES[:-1] + width / 2
+    models = {}
+    for time_class in sorted(aggregates.regression):
+        counts, sums, _ = aggregates.accuracy_bins[time_class]
+        occupied = np.flatnonzero(counts)
+        # Curves span the opponent ratings seen, to the resolution of the bins
+        grid = np.linspace(HISTOGRAM_EDGES[occupied[0]], HISTOGRAM_EDGES[occupied[-1] + 1], GRID_POINTS)
+
+        model = linear_fit(aggregates.regression[time_class], grid)
+        if model is None:
+            continue
+        model['grid'] = grid
+        model['lowess'] = binned_lowess(counts, sums, centers, grid) if lowess else None
+        models[time_class] = model
+    return models
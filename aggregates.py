@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from game_store import GameStore, player_key
+
+# Fixed-width bins for the opponent rating histograms
+HISTOGRAM_MIN = 0
+HISTOGRAM_MAX = 4000
+HISTOGRAM_WIDTH = 25
+HISTOGRAM_EDGES = np.arange(HISTOGRAM_MIN, HISTOGRAM_MAX + HISTOGRAM_WIDTH, HISTOGRAM_WIDTH)
+
+# Additive columns of an aggregate row and the extremes that are combined with min/max
+SUM_COLUMNS = [
+    'games', 'wins', 'draws', 'losses', 'rating_sum',
+    'opponent_rating_sum', 'accuracy_sum', 'accuracy_count',
+]
+MIN_COLUMNS = ['rating_min']
+MAX_COLUMNS = ['rating_max', 'opponent_rating_max']
+
+
+class GameAggregates:
+    """
+    A class to maintain per player, time class and month aggregates of cleaned games.
+
+    Rows are recomputed from a month's games whenever that month is ingested, and
+    summaries over any date range are rolled up from the monthly rows, so their
+    cost depends on the number of months rather than the number of games.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS aggregates (
+            player TEXT NOT NULL,
+            time_class TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            games INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            draws INTEGER NOT NULL,
+            losses INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            rating_min INTEGER NOT NULL,
+            rating_max INTEGER NOT NULL,
+            opponent_rating_sum INTEGER NOT NULL,
+            opponent_rating_max INTEGER NOT NULL,
+            accuracy_sum REAL NOT NULL,
+            accuracy_count INTEGER NOT NULL,
+            histogram BLOB NOT NULL,
+            PRIMARY KEY (player, time_class, year, month)
+        )
+    """
+
+    COLUMNS = ['time_class', 'year', 'month'] + SUM_COLUMNS + MIN_COLUMNS + MAX_COLUMNS + ['histogram']
+
+    def __init__(self, path=GameStore.DEFAULT_PATH):
+        """
+        Initialize the GameAggregates. The database is opened lazily on first use.
+
+        :param path: Path to the SQLite database file.
+        """
+        self.path = path
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Open a new connection to the database, creating the schema if needed.
+
+        :return: A sqlite3 connection.
+        """
+        if not self._initialized:
+            # Usually GameStore's database, which may not have been created yet
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    with connection:
+                        connection.execute(self.SCHEMA)
+                    self._initialized = True
+        return connection
+
+    @staticmethod
+    def compute(cleaned_data, player_name):
+        """
+        Computes the monthly aggregate rows of a set of cleaned games.
+
+        :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+        :param player_name: The player's username on Chess.com.
+        :return: A DataFrame with one row per time class and month (histograms as int32 arrays).
+        """
+        rating = cleaned_data[f"{player_name}'s rating"].to_numpy(dtype=np.int64)
+        opponent_rating = cleaned_data["opponent's rating"].to_numpy(dtype=np.int64)
+        accuracy_column = f"{player_name} accuracy"
+        if accuracy_column in cleaned_data.columns:
+            accuracy = cleaned_data[accuracy_column].to_numpy(dtype=np.float64)
+        else:
+            accuracy = np.full(len(cleaned_data), np.nan)
+        has_accuracy = ~np.isnan(accuracy)
+        result = cleaned_data['result'].astype(str).to_numpy()
+
+        games = pd.DataFrame({
+            'time_class': cleaned_data['time_class'].astype(str).to_numpy(),
+            'year': cleaned_data['end_time'].dt.year.to_numpy(),
+            'month': cleaned_data['end_time'].dt.month.to_numpy(),
+            'games': 1,
+            'wins': result == 'win',
+            'draws': result == 'draw',
+            'losses': result == 'loss',
+            'rating_sum': rating,
+            'rating_min': rating,
+            'rating_max': rating,
+            'opponent_rating_sum': opponent_rating,
+            'opponent_rating_max': opponent_rating,
+            'accuracy_sum': np.where(has_accuracy, accuracy, 0.0),
+            'accuracy_count': has_accuracy,
+        })
+
+        grouped = games.groupby(['time_class', 'year', 'month'], sort=True)
+        rows = pd.concat([
+            grouped[SUM_COLUMNS].sum(),
+            grouped[MIN_COLUMNS].min(),
+            grouped[MAX_COLUMNS].max(),
+        ], axis=1).reset_index()
+
+        # One bincount over (group, bin) pairs builds every histogram at once
+        group_ids = grouped.ngroup().to_numpy()
+        bins = np.clip((opponent_rating - HISTOGRAM_MIN) // HISTOGRAM_WIDTH, 0, len(HISTOGRAM_EDGES) - 2)
+        n_bins = len(HISTOGRAM_EDGES) - 1
+        histograms = np.bincount(group_ids * n_bins + bins, minlength=len(rows) * n_bins)
+        rows['histogram'] = list(histograms.reshape(len(rows), n_bins).astype(np.int32))
+
+        integer_columns = [column for column in SUM_COLUMNS + MIN_COLUMNS + MAX_COLUMNS if column != 'accuracy_sum']
+        rows[integer_columns] = rows[integer_columns].astype(np.int64)
+        return rows[GameAggregates.COLUMNS]
+
+    def update(self, player_name, cleaned_data):
+        """
+        Recomputes and stores the aggregates of every month present in a set of cleaned games.
+
+        :param player_name: The player's username on Chess.com.
+        :param cleaned_data: A DataFrame holding complete months of cleaned games.
+        """
+        if cleaned_data is None or cleaned_data.empty:
+            return
+
+        rows = self.compute(cleaned_data, player_name)
+        player = player_key(player_name)
+        months = [(player, int(year), int(month)) for year, month in rows[['year', 'month']].drop_duplicates().itertuples(index=False)]
+        records = [
+            (player, *(value.item() if isinstance(value, np.generic) else value for value in row[:-1]), sqlite3.Binary(row[-1].tobytes()))
+            for row in rows.itertuples(index=False)
+        ]
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM aggregates WHERE player = ? AND year = ? AND month = ?", months
+                )
+                connection.executemany(
+                    f"INSERT INTO aggregates (player, {', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(self.COLUMNS) + 1))})",
+                    records,
+                )
+        finally:
+            connection.close()
+
+    def has_month(self, player_name, year, month):
+        """
+        Checks whether aggregates have been stored for a player and month.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The year.
+        :param month: The month.
+        :return: True if the month has been aggregated.
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT 1 FROM aggregates WHERE player = ? AND year = ? AND month = ? LIMIT 1",
+                (player_key(player_name), int(year), int(month)),
+            ).fetchone()
+        finally:
+            connection.close()
+        return row is not None
+
+    def monthly(self, player_name, start=None, end=None):
+        """
+        Returns the stored monthly aggregate rows of a player.
+
+        :param player_name: The player's username on Chess.com.
+        :param start: The first month as a (year, month) tuple (optional).
+        :param end: The last month as a (year, month) tuple (optional).
+        :return: A DataFrame with one row per time class and month.
+        """
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM aggregates WHERE player = ?"
+        params = [player_key(player_name)]
+        if start:
+            query += " AND year * 12 + month >= ?"
+            params.append(start[0] * 12 + start[1])
+        if end:
+            query += " AND year * 12 + month <= ?"
+            params.append(end[0] * 12 + end[1])
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(query + " ORDER BY year, month, time_class", params).fetchall()
+        finally:
+            connection.close()
+
+        monthly = pd.DataFrame(rows, columns=self.COLUMNS)
+        monthly['histogram'] = [np.frombuffer(blob, dtype=np.int32) for blob in monthly['histogram']]
+        return monthly
+
+    def rollup(self, player_name, start=None, end=None):
+        """
+        Rolls the monthly aggregates of a player up into one summary per time class.
+
+        :param player_name: The player's username on Chess.com.
+        :param start: The first month as a (year, month) tuple (optional).
+        :param end: The last month as a (year, month) tuple (optional).
+        :return: A DataFrame indexed by time_class with totals, averages and a 'histogram' column.
+        """
+        return self.combine(self.monthly(player_name, start, end))
+
+    @staticmethod
+    def combine(monthly):
+        """
+        Combines aggregate rows into one summary per time class.
+
+        :param monthly: A DataFrame of aggregate rows as returned by monthly or compute.
+        :return: A DataFrame indexed by time_class.
+        """
+        if monthly.empty:
+            return pd.DataFrame(columns=SUM_COLUMNS + MIN_COLUMNS + MAX_COLUMNS + ['histogram']).rename_axis('time_class')
+
+        grouped = monthly.groupby('time_class')
+        summary = pd.concat([
+            grouped[SUM_COLUMNS].sum(),
+            grouped[MIN_COLUMNS].min(),
+            grouped[MAX_COLUMNS].max(),
+        ], axis=1)
+        summary['histogram'] = grouped['histogram'].apply(lambda histograms: np.sum(np.stack(histograms.to_list()), axis=0))
+        summary['avg_rating'] = summary['rating_sum'] / summary['games']
+        summary['avg_opponent_rating'] = summary['opponent_rating_sum'] / summary['games']
+        summary['avg_accuracy'] = summary['accuracy_sum'] / summary['accuracy_count'].where(summary['accuracy_count'] > 0)
+        return summary
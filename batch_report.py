@@ -0,0 +1,223 @@
+import argparse
+import datetime
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from fetch_games import ChessAPI
+from game_cache import CleanedGameCache
+from game_store import player_key
+from move_stats import MOVE_COLUMNS, move_totals
+from range_analysis import available_months
+from rating_model import add_expectations, band_summary, reconstruct_ratings
+from request_scheduler import BACKGROUND, RequestScheduler, request_context
+
+
+def parse_month(value):
+    """
+    Parses a YYYY-MM command line argument.
+
+    :param value: The argument value.
+    :return: A (year, month) tuple.
+    """
+    try:
+        date = datetime.datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid month '{value}', expected YYYY-MM.")
+    return date.year, date.month
+
+
+def summarize_games(cleaned_data, player_name):
+    """
+    Aggregates cleaned games into one row per time class.
+
+    :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+    :param player_name: The player's username on Chess.com.
+    :return: A DataFrame indexed by time_class.
+    """
+    rating = f"{player_name}'s rating"
+    accuracy = f"{player_name} accuracy"
+    cleaned_data = add_expectations(cleaned_data.sort_values('end_time'), player_name)
+    cleaned_data['reconstructed rating'] = reconstruct_ratings(cleaned_data, player_name)
+    grouped = cleaned_data.groupby('time_class', observed=True)
+
+    summary = pd.DataFrame({
+        'games': grouped.size(),
+        'first_game': grouped['end_time'].min(),
+        'last_game': grouped['end_time'].max(),
+        'rating_start': grouped[rating].first(),
+        'rating_end': grouped[rating].last(),
+        'rating_reconstructed': grouped['reconstructed rating'].last().round(),
+        'rating_max': grouped[rating].max(),
+        'avg_opponent_rating': grouped["opponent's rating"].mean().round(),
+        'max_opponent_rating': grouped["opponent's rating"].max(),
+        'score': grouped['score'].mean().round(3),
+        'expected_score': grouped['expected score'].mean().astype(float).round(3),
+        'performance': grouped['score surplus'].mean().astype(float).round(3),
+    })
+    if accuracy in cleaned_data.columns:
+        summary['avg_accuracy'] = grouped[accuracy].mean().round(1)
+    return summary
+
+
+def summarize_moves(player_name, months):
+    """
+    Aggregates game length, clock usage and time trouble into one row per time class.
+
+    The moves and clocks are only in the raw archives, which are read (from the
+    local store where possible) and summarized one month at a time.
+
+    :param player_name: The player's username on Chess.com.
+    :param months: A list of (year, month) tuples.
+    :return: A DataFrame indexed by time_class, without rows if there are no games.
+    """
+    totals = []
+    for year, month in months:
+        games = ChessAPI.fetch_games(player_name, year, month, columns=MOVE_COLUMNS)
+        if games is not None and len(games):
+            totals.append(move_totals(games))
+    if not totals:
+        return pd.DataFrame(columns=['avg_moves', 'avg_move_seconds', 'time_pressure_share'])
+
+    totals = pd.concat(totals).groupby(level='time_class', observed=True).sum()
+    return pd.DataFrame({
+        'avg_moves': (totals['plies'] / totals['games'] / 2).round(1),
+        'avg_move_seconds': (totals['seconds'] / totals['timed_plies']).round(2),
+        'time_pressure_share': (totals['time_pressure'] / totals['games']).round(3),
+    })
+
+
+def init_worker(workers, shared_pause):
+    """
+    Gives a worker process its share of the API rate limit.
+
+    Every process has its own scheduler, so the limits are divided between them.
+    A 429 pause is shared, so every process backs off together.
+
+    :param workers: The number of worker processes, at most max_workers().
+    :param shared_pause: A multiprocessing.Value('d') holding the time.time() the current pause ends at.
+    """
+    ChessAPI.scheduler = RequestScheduler(
+        rate=RequestScheduler.RATE / workers,
+        burst=RequestScheduler.BURST // workers,
+        max_concurrency=RequestScheduler.MAX_CONCURRENCY // workers,
+        min_rate=RequestScheduler.MIN_RATE / workers,
+        shared_pause=shared_pause,
+    )
+
+
+def max_workers():
+    """
+    Returns the largest number of worker processes the API limits can be divided between.
+
+    Each process needs at least one request in flight and one token of burst, so
+    more processes than that would exceed the limits together.
+
+    :return: The maximum number of worker processes.
+    """
+    return min(RequestScheduler.MAX_CONCURRENCY, RequestScheduler.BURST)
+
+
+def analyze_player(player_name, start, end, band_width=None):
+    """
+    Fetches, cleans and aggregates a player's games over a range of months.
+
+    Runs in a worker process, so everything it needs is created here.
+
+    :param player_name: The player's username on Chess.com.
+    :param start: The first month as a (year, month) tuple.
+    :param end: The last month as a (year, month) tuple.
+    :param band_width: If given, summarize per time class and opponent rating band of this width.
+    :return: A DataFrame with one row per time class (and band), or None if there are no games.
+    """
+    with request_context(priority=BACKGROUND):
+        # Only request months the player actually has an archive for
+        months = available_months(player_name, start, end)
+        cleaned_data = CleanedGameCache().load_range(player_name, months)
+        if cleaned_data is None:
+            return None
+
+        if band_width:
+            summary = band_summary(cleaned_data, player_name, band_width).reset_index()
+        else:
+            summary = summarize_games(cleaned_data, player_name).join(summarize_moves(player_name, months)).reset_index()
+    summary.insert(0, 'player', player_name)
+    return summary
+
+
+def run_report(usernames, start, end, workers=None, band_width=None):
+    """
+    Analyzes many players in parallel and combines the results.
+
+    :param usernames: A list of Chess.com usernames.
+    :param start: The first month as a (year, month) tuple.
+    :param end: The last month as a (year, month) tuple.
+    :param workers: The number of worker processes (optional, defaults to the CPU count; capped at max_workers()).
+    :param band_width: If given, report per opponent rating band of this width (optional).
+    :return: A DataFrame with one row per player and time class (and band).
+    """
+    results = []
+
+    workers = min(workers or os.cpu_count() or 1, max_workers())
+    shared_pause = multiprocessing.Value('d', 0.0)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(workers, shared_pause)) as executor:
+        futures = {executor.submit(analyze_player, name, start, end, band_width): name for name in usernames}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:
+                ChessAPI._log_error(f"Error analyzing player {futures[future]}: {e}")
+                continue
+            if summary is not None:
+                results.append(summary)
+
+    if not results:
+        return pd.DataFrame()
+    report = pd.concat(results, ignore_index=True)
+    return report.sort_values([column for column in ('player', 'time_class', 'opponent_band') if column in report.columns], ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a combined game report for many Chess.com players.")
+    parser.add_argument("usernames", nargs="*", help="Chess.com usernames to analyze.")
+    parser.add_argument("-f", "--file", help="Read additional usernames from a file, one per line.")
+    parser.add_argument("--start", type=parse_month, required=True, help="First month, as YYYY-MM.")
+    parser.add_argument("--end", type=parse_month, help="Last month, as YYYY-MM (defaults to the current month).")
+    parser.add_argument("-j", "--workers", type=int, help=f"Number of worker processes (at most {max_workers()}).")
+    parser.add_argument("--bands", type=int, metavar="WIDTH", help="Compare results with the expected score per opponent rating band of this width.")
+    parser.add_argument("-o", "--output", default="report.csv", help="Output file (.csv or .parquet).")
+    args = parser.parse_args(argv)
+
+    usernames = list(args.usernames)
+    if args.file:
+        with open(args.file) as f:
+            usernames += [line.strip() for line in f if line.strip()]
+    if not usernames:
+        parser.error("No usernames given.")
+    try:
+        # One report per player, whatever case the name was written in
+        usernames = list(dict.fromkeys(player_key(name) for name in usernames))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.workers and args.workers > max_workers():
+        print(f"Using {max_workers()} worker processes, the most the API rate limit can be shared between.", file=sys.stderr)
+
+    today = datetime.date.today()
+    end = args.end or (today.year, today.month)
+
+    report = run_report(usernames, args.start, end, args.workers, args.bands)
+    if args.output.endswith(".parquet"):
+        report.to_parquet(args.output, index=False)
+    else:
+        report.to_csv(args.output, index=False)
+
+    print(f"Wrote {len(report)} rows for {report['player'].nunique() if len(report) else 0} players to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
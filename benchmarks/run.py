@@ -0,0 +1,280 @@
+"""
+Benchmarks of ingestion, cleaning and plotting on synthetic Chess.com archives.
+
+Run from the repository root:
+
+    python -m benchmarks.run                      # compare with benchmarks/baseline.json
+    python -m benchmarks.run --sizes 100 1000000  # pick the archive sizes
+    python -m benchmarks.run --time-classes blitz # only generate blitz games
+    python -m benchmarks.run --save-baseline      # record a new baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import streamlit.config
+import streamlit.logger
+
+import accuracy_model
+import density
+from aggregates import GameAggregates
+from benchmarks.server import ArchiveServer
+from benchmarks.synthetic import TIME_CLASSES, iter_archive
+from data_cleaner import ChessDataCleaner
+from data_visualizer import ChessDataVisualizer
+from fetch_games import ChessAPI
+from move_stats import MOVE_COLUMNS, extract_move_stats
+from range_analysis import RangeAggregates
+
+PLAYER_NAME = 'BenchPlayer'
+DEFAULT_SIZES = [100, 1000, 10000, 100000, 1000000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A benchmark regresses when it is this many times slower (or bigger) than the baseline ...
+DEFAULT_TOLERANCE = 2.0
+# ... and the difference is larger than the measurement noise
+MIN_SECONDS_DELTA = 0.1
+MIN_MEMORY_DELTA_MB = 1.0
+
+
+def measure(run, repeat=3, reset=None):
+    """
+    Times a benchmark and measures its peak traced memory.
+
+    An untimed warm-up run comes first, and the timing runs and the memory run are
+    separate, since tracing allocations slows the code down.
+
+    :param run: A callable without arguments running the benchmark once.
+    :param repeat: The number of timed runs; the fastest one is reported.
+    :param reset: A callable run before every run, e.g. to clear caches (optional).
+    :return: A dictionary with 'seconds' and 'peak_mb'.
+    """
+    times = []
+    for _ in range(repeat + 1):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': round(min(times[1:]), 5), 'peak_mb': round(peak / 2 ** 20, 3)}
+
+
+def quiet_streamlit():
+    """
+    Silences the warning Streamlit logs for every chart drawn outside a session.
+
+    Streamlit sets its log level from its config when the config is first read,
+    which would undo an earlier set_log_level, so the config is read first.
+    """
+    streamlit.config.get_config_options()
+    streamlit.logger.set_log_level('error')
+
+
+def ingestion_benchmarks(url, repeat):
+    """
+    Measures fetching and cleaning an archive.
+
+    The raw games are only held while this runs, which keeps them out of the
+    memory of the later benchmarks on large archives.
+
+    :return: A tuple (measurements, cleaned DataFrame).
+    """
+    measurements = {}
+    games = ChessAPI._fetch_data_from_url(url)
+    measurements['fetch_data_from_url'] = measure(lambda: ChessAPI._fetch_data_from_url(url), repeat)
+    cleaned_data = ChessDataCleaner(games, PLAYER_NAME).clean_data()
+    measurements['clean_data'] = measure(lambda: ChessDataCleaner(games, PLAYER_NAME).clean_data(), repeat)
+    # The size of the cleaned frame itself, which is what a cached history holds
+    frame_bytes = ChessDataCleaner.memory_usage_report(cleaned_data).loc['total', 'bytes']
+    measurements['clean_data']['frame_mb'] = round(frame_bytes / 2 ** 20, 3)
+    return measurements, cleaned_data
+
+
+def move_stats_benchmark(url, repeat):
+    """
+    Measures extract_move_stats on the moves and clocks of an archive.
+
+    The PGNs are only held while this benchmark runs.
+    """
+    moves = ChessAPI._fetch_data_from_url(url, columns=MOVE_COLUMNS)
+    return measure(lambda: extract_move_stats(moves), repeat)
+
+
+def clear_render_caches():
+    ChessDataVisualizer.rendered.clear()
+    density._CURVES.clear()
+    accuracy_model._MODELS.clear()
+
+
+def visualizer_benchmarks(cleaned_data):
+    """
+    Returns a callable per ChessDataVisualizer method, each drawing one chart from scratch.
+    """
+    def visualizer():
+        return ChessDataVisualizer(cleaned_data, PLAYER_NAME)
+
+    summary = GameAggregates.combine(GameAggregates.compute(cleaned_data, PLAYER_NAME))
+    aggregates = RangeAggregates.from_frame(cleaned_data, PLAYER_NAME)
+    grid, curves = density.kde_curves(cleaned_data, "opponent's rating", 'time_class')
+    return {
+        'print_kde': lambda: visualizer().print_kde(x="opponent's rating", hue='time_class', xlabel='Rating', ylabel='Density'),
+        'print_density_curves': lambda: visualizer().print_density_curves(grid, curves, 'time_class', xlabel='Rating', ylabel='Density'),
+        'print_histogram': lambda: visualizer().print_histogram(x="opponent's rating", hue='time_class', xlabel='Rating', ylabel='Count'),
+        'print_distribution[pie]': lambda: visualizer().print_distribution(column='time_class', chart_type='pie'),
+        'print_distribution[countplot]': lambda: visualizer().print_distribution(column='time_class', xlabel='Game type', ylabel='Count', chart_type='countplot'),
+        'print_performance': lambda: visualizer().print_performance(data=cleaned_data),
+        'print_rating': lambda: visualizer().print_rating(cleaned_data["opponent's rating"]),
+        'print_rating_summary': lambda: visualizer().print_rating_summary(summary),
+        'print_accuracy': lambda: visualizer().print_accuracy(aggregates, lowess=True),
+    }
+
+
+def run_benchmarks(sizes, repeat=3, accuracy_fraction=0.5, pgn_moves=40, time_classes=None, directory=None):
+    """
+    Runs every benchmark on archives of the given sizes.
+
+    :param sizes: The numbers of games per archive.
+    :param repeat: The number of timed runs per benchmark.
+    :param accuracy_fraction: The fraction of games with accuracies.
+    :param pgn_moves: The average number of plies per game.
+    :param time_classes: The time classes of the games (optional, defaults to all of TIME_CLASSES).
+    :param directory: Where the archives are generated (optional, defaults to a temporary directory).
+    :return: A dictionary mapping size to {benchmark: measurement}.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as workdir, ArchiveServer() as server:
+        for size in sizes:
+            path = os.path.join(workdir, f"{size}.json")
+            with open(path, 'wb') as f:
+                chunks = iter_archive(
+                    size, player_name=PLAYER_NAME, time_classes=time_classes,
+                    accuracy_fraction=accuracy_fraction, pgn_moves=pgn_moves,
+                )
+                for chunk in chunks:
+                    f.write(chunk)
+            server.add_archive(PLAYER_NAME, 2023, 1, path)
+            url = server.archive_url(PLAYER_NAME, 2023, 1)
+
+            print(f"{size} games ({os.path.getsize(path) / 2 ** 20:.1f} MB archive)", file=sys.stderr)
+
+            measurements, cleaned_data = ingestion_benchmarks(url, repeat)
+            measurements['range_aggregates'] = measure(lambda: RangeAggregates(PLAYER_NAME).add(cleaned_data), repeat)
+            measurements['extract_move_stats'] = move_stats_benchmark(url, repeat)
+
+            for name, run in visualizer_benchmarks(cleaned_data).items():
+                measurements[name] = measure(run, repeat, reset=clear_render_caches)
+
+            os.remove(path)
+            results[str(size)] = measurements
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Finds the benchmarks that got slower or use more memory than in the baseline.
+
+    :param results: The results of run_benchmarks.
+    :param baseline: The 'results' of a saved baseline.
+    :param tolerance: The allowed slowdown factor.
+    :return: A list of regression descriptions.
+    """
+    regressions = []
+    for size, measurements in results.items():
+        for name, measured in measurements.items():
+            reference = baseline.get(size, {}).get(name)
+            if not reference:
+                continue
+            seconds, reference_seconds = measured['seconds'], reference['seconds']
+            if _regressed(seconds, reference_seconds, tolerance, MIN_SECONDS_DELTA):
+                regressions.append(f"{name} ({size} games): {seconds:.3f}s vs {reference_seconds:.3f}s")
+            for key in ('peak_mb', 'frame_mb'):
+                size_mb, reference_mb = measured.get(key), reference.get(key)
+                if _regressed(size_mb, reference_mb, tolerance, MIN_MEMORY_DELTA_MB):
+                    regressions.append(f"{name} ({size} games): {size_mb:.1f} MB vs {reference_mb:.1f} MB ({key})")
+    return regressions
+
+
+def _regressed(value, reference, tolerance, min_delta):
+    """
+    Whether a measurement exceeds tolerance times its reference by more than the noise.
+    """
+    if value is None or reference is None:
+        return False
+    return value > reference * tolerance and value - reference > min_delta
+
+
+def format_table(results, baseline=None):
+    lines = [f"{'benchmark':<32}{'games':>9}{'seconds':>11}{'peak MB':>11}{'vs base':>9}"]
+    for size, measurements in results.items():
+        for name, measured in measurements.items():
+            reference = (baseline or {}).get(size, {}).get(name)
+            ratio = f"{measured['seconds'] / reference['seconds']:.2f}x" if reference and reference['seconds'] else ''
+            lines.append(f"{name:<32}{size:>9}{measured['seconds']:>11.4f}{measured['peak_mb']:>11.2f}{ratio:>9}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, cleaning and plotting on synthetic archives.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of games per archive.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark.")
+    parser.add_argument("--accuracy-fraction", type=float, default=0.5, help="Fraction of games with accuracies (0 for none).")
+    parser.add_argument("--pgn-moves", type=int, default=40, help="Average number of plies per game.")
+    parser.add_argument("--time-classes", nargs="+", choices=list(TIME_CLASSES), help="Time classes of the games (default: all).")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare with or save to.")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown factor.")
+    parser.add_argument("-o", "--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    quiet_streamlit()
+
+    results = run_benchmarks(args.sizes, args.repeat, args.accuracy_fraction, args.pgn_moves, args.time_classes)
+    report = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'settings': {
+            'repeat': args.repeat, 'accuracy_fraction': args.accuracy_fraction,
+            'pgn_moves': args.pgn_moves, 'time_classes': args.time_classes or list(TIME_CLASSES),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(format_table(results))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print(format_table(results, baseline))
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
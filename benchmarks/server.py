@@ -0,0 +1,169 @@
+import email.utils
+import json
+import os
+import re
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_GAMES = re.compile(r'^/pub/player/([^/]+)/games/(\d{4})/(\d{2})$')
+_ARCHIVES = re.compile(r'^/pub/player/([^/]+)/games/archives$')
+_STATS = re.compile(r'^/pub/player/([^/]+)/stats$')
+_PLAYER = re.compile(r'^/pub/player/([^/]+)$')
+_COUNTRY = re.compile(r'^/pub/country/([A-Z]{2})$')
+
+
+class ArchiveServer:
+    """
+    A local stand-in for api.chess.com serving pre-generated archive files.
+
+    Archives are registered as files and streamed from disk, so serving a large
+    archive costs no memory and the time measured by a client is only transfer
+    and parsing, not generation.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """
+        Initialize the ArchiveServer.
+
+        :param host: The interface to listen on.
+        :param port: The port to listen on (0 picks a free port).
+        """
+        self.archives = {}
+        # The (path, status) of every request served, in order
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """
+        The URL to use as ChessAPI.BASE_URL.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/pub"
+
+    def add_archive(self, player_name, year, month, path):
+        """
+        Serves a monthly archive file.
+
+        :param player_name: The player's username.
+        :param year: The year of the archive.
+        :param month: The month of the archive.
+        :param path: The path of the archive JSON file.
+        """
+        self.archives[(player_name.lower(), int(year), int(month))] = path
+
+    def archive_url(self, player_name, year, month):
+        """
+        Returns the URL of a monthly archive.
+        """
+        return f"{self.base_url}/player/{player_name}/games/{int(year)}/{int(month):02d}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        routes = [
+            (_GAMES, self._games),
+            (_ARCHIVES, self._archives),
+            (_STATS, self._stats),
+            (_PLAYER, self._player),
+            (_COUNTRY, self._country),
+        ]
+        log = self.requests
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_response(self, code, message=None):
+                log.append((self.path, code))
+                super().send_response(code, message)
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                for pattern, route in routes:
+                    match = pattern.match(path)
+                    if match:
+                        return route(self, match)
+                self.send_error(404)
+
+        return Handler
+
+    def _games(self, request, match):
+        path = self.archives.get((match[1].lower(), int(match[2]), int(match[3])))
+        if path is None:
+            return _send_json(request, {'games': []})
+        return _send_file(request, path)
+
+    def _archives(self, request, match):
+        return _send_json(request, {'archives': [
+            self.archive_url(player, year, month)
+            for player, year, month in sorted(self.archives) if player == match[1].lower()
+        ]})
+
+    def _stats(self, request, match):
+        return _send_json(request, {
+            time_class: {'last': {'rating': 1500, 'date': 1672531200, 'rd': 50}, 'record': {'win': 10, 'loss': 8, 'draw': 2}}
+            for time_class in ('chess_bullet', 'chess_blitz', 'chess_rapid')
+        })
+
+    def _player(self, request, match):
+        return _send_json(request, {
+            'username': match[1].lower(),
+            'joined': 1577836800,
+            'last_online': 1672531200,
+            'followers': 0,
+            'status': 'basic',
+            'country': f"{self.base_url}/country/PL",
+        })
+
+    def _country(self, request, match):
+        return _send_json(request, {'code': match[1], 'name': 'Poland'})
+
+
+def _send_json(request, payload):
+    body = json.dumps(payload).encode()
+    request.send_response(200)
+    request.send_header('Content-Type', 'application/json')
+    request.send_header('Content-Length', str(len(body)))
+    request.end_headers()
+    request.wfile.write(body)
+
+
+def _send_file(request, path):
+    """
+    Streams an archive file with the validators Chess.com sends, answering
+    conditional requests for an unchanged file with 304 Not Modified.
+    """
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if request.headers.get('If-None-Match') == etag:
+        request.send_response(304)
+        request.send_header('ETag', etag)
+        request.end_headers()
+        return
+
+    with open(path, 'rb') as f:
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(stat.st_size))
+        request.send_header('ETag', etag)
+        request.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+        request.end_headers()
+        shutil.copyfileobj(f, request.wfile, 1024 * 1024)
@@ -0,0 +1,183 @@
+import calendar
+import json
+import time
+
+import numpy as np
+
+from move_stats import TCN_ALPHABET
+
+TIME_CLASSES = {
+    'bullet': ['60', '120+1'],
+    'blitz': ['180', '180+2', '300'],
+    'rapid': ['600', '900+10'],
+    'daily': ['1/86400'],
+}
+
+# Opening lines the games start with, so opening statistics have realistic repeats
+OPENINGS = [
+    ('Sicilian-Defense', ['e4', 'c5', 'Nf3', 'd6', 'd4', 'cxd4', 'Nxd4', 'Nf6']),
+    ('Ruy-Lopez-Opening', ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6']),
+    ('Queens-Gambit-Declined', ['d4', 'd5', 'c4', 'e6', 'Nc3', 'Nf6', 'Bg5', 'Be7']),
+    ('French-Defense', ['e4', 'e6', 'd4', 'd5', 'Nc3', 'Nf6', 'e5', 'Nfd7']),
+    ('Kings-Indian-Defense', ['d4', 'Nf6', 'c4', 'g6', 'Nc3', 'Bg7', 'e4', 'd6']),
+    ('English-Opening', ['c4', 'e5', 'Nc3', 'Nf6', 'g3', 'd5', 'cxd5', 'Nxd5']),
+]
+MIDDLEGAME_MOVES = ['Nf3', 'Nc6', 'Bc4', 'Be7', 'O-O', 'Re1', 'Qd2', 'h6', 'a4', 'Rb8', 'Kh1', 'Qe7', 'Bxf6', 'gxf6']
+
+LOSING_RESULTS = ['checkmated', 'resigned', 'timeout', 'abandoned']
+DRAW_RESULTS = ['agreed', 'repetition', 'stalemate', 'insufficient', '50move', 'timevsinsufficient']
+
+
+def _clock(seconds):
+    seconds = max(seconds, 0.0)
+    return f"{int(seconds // 3600)}:{int(seconds % 3600 // 60):02d}:{seconds % 60:04.1f}"
+
+
+# Number of distinct move sequences rendered per opening and time control
+MOVETEXT_VARIANTS = 16
+
+
+def _movetext(rng, opening, base, plies):
+    moves = (opening + [MIDDLEGAME_MOVES[j] for j in rng.integers(len(MIDDLEGAME_MOVES), size=plies)])[:plies]
+    clocks = base - np.cumsum(rng.exponential(base / 80, plies))
+    text = []
+    for ply, (move, clock) in enumerate(zip(moves, clocks)):
+        number = f"{ply // 2 + 1}. " if ply % 2 == 0 else f"{ply // 2 + 1}... "
+        text.append(f"{number}{move} {{[%clk {_clock(clock)}]}}")
+    return ' '.join(text)
+
+
+def _pgn(game, movetext, eco_name):
+    white, black = game['white'], game['black']
+    result = '1-0' if white['result'] == 'win' else '0-1' if black['result'] == 'win' else '1/2-1/2'
+    date = time.strftime('%Y.%m.%d', time.gmtime(game['end_time']))
+    return (
+        f'[Event "Live Chess"]\n[Site "Chess.com"]\n[Date "{date}"]\n[Round "-"]\n'
+        f'[White "{white["username"]}"]\n[Black "{black["username"]}"]\n[Result "{result}"]\n'
+        f'[ECO "B20"]\n[ECOUrl "https://www.chess.com/openings/{eco_name}"]\n'
+        f'[WhiteElo "{white["rating"]}"]\n[BlackElo "{black["rating"]}"]\n'
+        f'[TimeControl "{game["time_control"]}"]\n[Link "{game["url"]}"]\n\n'
+        f'{movetext} {result}\n'
+    )
+
+
+def generate_games(n_games, player_name='BenchPlayer', year=2023, month=1, time_classes=None,
+                   accuracy_fraction=0.5, pgn_moves=40, seed=0):
+    """
+    Generates realistic Chess.com game dictionaries, one at a time.
+
+    Random values are drawn for all games up front and move sequences are rendered
+    once per opening, time control and variant, which keeps generating a million
+    games practical.
+
+    :param n_games: The number of games.
+    :param player_name: The username of the player the archive belongs to.
+    :param year: The year of the archive; games are spread over its month.
+    :param month: The month of the archive.
+    :param time_classes: The time classes to draw from (optional, defaults to all of TIME_CLASSES).
+    :param accuracy_fraction: The fraction of games with computer accuracies (0 leaves the key out entirely).
+    :param pgn_moves: The average number of plies of a game, which sets the size of 'pgn' and 'tcn'.
+    :param seed: The random seed.
+    :return: An iterator of game dictionaries shaped like the Chess.com API's.
+    """
+    rng = np.random.default_rng(seed)
+    time_classes = time_classes or list(TIME_CLASSES)
+    start = calendar.timegm((year, month, 1, 0, 0, 0))
+    length = calendar.monthrange(year, month)[1] * 86400
+
+    end_times = np.sort(rng.integers(start, start + length, n_games)).tolist()
+    player_ratings = (1500 + np.cumsum(rng.integers(-8, 9, n_games))).tolist()
+    opponent_ratings = (np.array(player_ratings) + rng.normal(0, 150, n_games)).astype(int).tolist()
+    opponents = rng.integers(n_games // 4 + 10, size=n_games).tolist()
+    time_class_ids = rng.integers(len(time_classes), size=n_games).tolist()
+    control_ids = rng.integers(1 << 16, size=n_games).tolist()
+    opening_ids = rng.integers(len(OPENINGS), size=n_games).tolist()
+    variant_ids = rng.integers(MOVETEXT_VARIANTS, size=n_games).tolist()
+    outcomes = rng.random(n_games).tolist()
+    detail_ids = rng.integers(1 << 16, size=n_games).tolist()
+    plays_white = (rng.random(n_games) < 0.5).tolist()
+    rated = (rng.random(n_games) < 0.9).tolist()
+    has_accuracy = (rng.random(n_games) < accuracy_fraction).tolist() if accuracy_fraction else [False] * n_games
+    accuracies = rng.uniform(50, 99, (n_games, 2)).round(2).tolist()
+    uuids = rng.integers(1 << 62, size=(n_games, 3)).tolist()
+
+    movetexts = {}
+    for i in range(n_games):
+        time_class = time_classes[time_class_ids[i]]
+        controls = TIME_CLASSES.get(time_class, ['180'])
+        time_control = controls[control_ids[i] % len(controls)]
+        eco_name, opening = OPENINGS[opening_ids[i]]
+
+        key = (time_control, opening_ids[i], variant_ids[i])
+        if key not in movetexts:
+            base = float(time_control.split('+')[0].split('/')[-1])
+            plies = max(int(rng.normal(pgn_moves, pgn_moves / 4)), 2)
+            movetexts[key] = (_movetext(rng, opening, base, plies), ''.join(TCN_ALPHABET[j] for j in rng.integers(64, size=2 * plies)))
+        movetext, tcn = movetexts[key]
+
+        detail = detail_ids[i]
+        if outcomes[i] < 0.48:
+            player_result, opponent_result = 'win', LOSING_RESULTS[detail % len(LOSING_RESULTS)]
+        elif outcomes[i] < 0.55:
+            player_result = opponent_result = DRAW_RESULTS[detail % len(DRAW_RESULTS)]
+        else:
+            player_result, opponent_result = LOSING_RESULTS[detail % len(LOSING_RESULTS)], 'win'
+
+        player = {'rating': player_ratings[i], 'result': player_result, 'username': player_name}
+        opponent = {'rating': opponent_ratings[i], 'result': opponent_result, 'username': f"opponent{opponents[i]}"}
+        white, black = (player, opponent) if plays_white[i] else (opponent, player)
+        for side, uuid in ((white, uuids[i][1]), (black, uuids[i][2])):
+            side['@id'] = f"https://api.chess.com/pub/player/{side['username'].lower()}"
+            side['uuid'] = f"{uuid:016x}"
+
+        game = {
+            'url': f"https://www.chess.com/game/live/{10 ** 10 + i}",
+            'time_control': time_control,
+            'end_time': end_times[i],
+            'rated': rated[i],
+            'tcn': tcn,
+            'uuid': f"{uuids[i][0]:016x}",
+            'initial_setup': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+            'fen': 'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+            'time_class': time_class,
+            'rules': 'chess',
+            'white': white,
+            'black': black,
+            'eco': f"https://www.chess.com/openings/{eco_name}",
+        }
+        if has_accuracy[i]:
+            game['accuracies'] = {'white': accuracies[i][0], 'black': accuracies[i][1]}
+        game['pgn'] = _pgn(game, movetext, eco_name)
+        yield game
+
+
+def iter_archive(n_games, chunk_games=1000, **options):
+    """
+    Encodes a monthly archive as JSON incrementally, so large archives never exist in memory at once.
+
+    :param n_games: The number of games.
+    :param chunk_games: The number of games encoded per chunk.
+    :param options: Options passed to generate_games.
+    :return: An iterator of bytes chunks of the archive document.
+    """
+    yield b'{"games":['
+    batch = []
+    for i, game in enumerate(generate_games(n_games, **options)):
+        batch.append(json.dumps(game))
+        if len(batch) == chunk_games:
+            yield (',' if i >= chunk_games else '').encode() + ','.join(batch).encode()
+            batch = []
+    if batch:
+        yield (',' if n_games > len(batch) else '').encode() + ','.join(batch).encode()
+    yield b']}'
+
+
+def archive_bytes(n_games, **options):
+    """
+    Returns a whole monthly archive document.
+
+    :param n_games: The number of games.
+    :param options: Options passed to generate_games.
+    :return: The archive as JSON bytes.
+    """
+    return b''.join(iter_archive(n_games, **options))
@@ -0,0 +1,190 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+
+def frame_version(dataframe, columns=None):
+    """
+    Computes a content hash of (some columns of) a DataFrame.
+
+    Used as part of cache keys, so cached results are reused for identical data
+    and recomputed as soon as the data changes.
+
+    :param dataframe: The DataFrame to hash.
+    :param columns: The columns to include (optional, defaults to all columns).
+    :return: A hexadecimal version string.
+    """
+    if columns is not None:
+        dataframe = dataframe[[column for column in columns if column in dataframe.columns]]
+    hashes = pd.util.hash_pandas_object(dataframe, index=False).to_numpy()
+    return hashlib.blake2b(hashes.tobytes(), digest_size=8).hexdigest()
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded mapping that evicts the least recently used entry.
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        Initialize the LRUCache.
+
+        :param maxsize: The maximum number of entries kept.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for a key and marks it as recently used.
+
+        :param key: The cache key.
+        :param default: The value returned on a miss.
+        :return: The cached value or default.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+
+        :param key: The cache key.
+        :param value: The value to cache.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for a key, computing and storing it on a miss.
+
+        :param key: The cache key.
+        :param compute: A callable without arguments producing the value.
+        :return: The cached or computed value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose entries also expire after a time-to-live.
+
+    Loads through get_or_load are coalesced: while a key is being loaded, other
+    threads asking for the same key wait for that load instead of starting their own.
+    """
+
+    def __init__(self, maxsize=128, ttl=300):
+        """
+        Initialize the TTLCache.
+
+        :param maxsize: The maximum number of entries kept.
+        :param ttl: The default time-to-live of an entry in seconds.
+        """
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self._inflight = {}
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for a key if it has not expired.
+
+        :param key: The cache key.
+        :param default: The value returned on a miss.
+        :return: The cached value or default.
+        """
+        with self._lock:
+            entry = super().get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def put(self, key, value, ttl=None):
+        """
+        Stores a value for ttl seconds.
+
+        :param key: The cache key.
+        :param value: The value to cache.
+        :param ttl: The time-to-live in seconds (optional, defaults to the cache's ttl).
+        """
+        super().put(key, (time.monotonic() + (self.ttl if ttl is None else ttl), value))
+
+    def get_or_load(self, key, load, ttl=None, on_wait=None):
+        """
+        Returns the cached value for a key, loading it once on a miss.
+
+        Concurrent callers missing the same key share a single call to load. Falsy
+        results (failed requests) are returned but not cached.
+
+        :param key: The cache key.
+        :param load: A callable without arguments producing the value.
+        :param ttl: The time-to-live in seconds (optional, defaults to the cache's ttl).
+        :param on_wait: A callable without arguments, called when this caller waits for another caller's load (optional).
+        :return: The cached or loaded value.
+        """
+        missing = object()
+        with self._lock:
+            value = self.get(key, missing)
+            if value is not missing:
+                return value
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = Future()
+
+        if future is None:
+            return self._load(key, load, ttl)
+        if on_wait:
+            on_wait()
+        return future.result()
+
+    def _load(self, key, load, ttl):
+        """
+        Runs a load registered in _inflight and hands its result to the callers waiting for it.
+        """
+        future = self._inflight[key]
+        try:
+            value = load()
+            if value:
+                self.put(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
@@ -1,6 +1,9 @@
+import hashlib
+import inspect
 import pandas as pd
 import numpy as np
-from fetch_games import ChessAPI
+from game_parser import GAME_COLUMNS
+from instrumentation import span
 
 class ChessDataCleaner:
     """
@@ -12,6 +15,137 @@ class ChessDataCleaner:
         'white.@id', 'white.uuid', 'black.@id', 'black.uuid'
     ]
 
+    # The player's result for the Chess.com result code of their side; other codes are losses
+    RESULT_CODES = {
+        'win': 'win',
+        'agreed': 'draw',
+        'repetition': 'draw',
+        'stalemate': 'draw',
+        'insufficient': 'draw',
+        '50move': 'draw',
+        'timevsinsufficient': 'draw',
+    }
+    SCORES = {'win': 1.0, 'draw': 0.5, 'loss': 0.0}
+
+    # How a game ended, keyed by the result code of the side that did not win
+    TERMINATIONS = {
+        'checkmated': 'checkmate',
+        'resigned': 'resignation',
+        'timeout': 'timeout',
+        'abandoned': 'abandonment',
+        'lose': 'loss',
+        'kingofthehill': 'king of the hill',
+        'threecheck': 'three-check',
+        'bughousepartnerlose': 'bughouse partner lost',
+        'agreed': 'agreement',
+        'repetition': 'repetition',
+        'stalemate': 'stalemate',
+        'insufficient': 'insufficient material',
+        '50move': '50-move rule',
+        'timevsinsufficient': 'timeout vs insufficient material',
+    }
+
+    # Number of games the rolling form metrics are computed over
+    FORM_WINDOW = 20
+
+    # Schema of the cleaned frame. Low-cardinality strings are stored as
+    # categoricals, ratings fit in int16 and accuracies (0-100) in float32.
+    # Player-specific columns are listed with a "{player}" placeholder.
+    SCHEMA = {
+        'time_control': 'category',
+        'time_class': 'category',
+        'rules': 'category',
+        'eco': 'category',
+        'opening': 'category',
+        'white.username': 'category',
+        'white.result': 'category',
+        'black.username': 'category',
+        'black.result': 'category',
+        'result': 'category',
+        'termination': 'category',
+        'score': 'float32',
+        'win streak': 'int32',
+        'loss streak': 'int32',
+        'rolling score': 'float32',
+        'performance rating': 'float32',
+        'white.rating': 'int16',
+        'black.rating': 'int16',
+        'accuracies.white': 'float32',
+        'accuracies.black': 'float32',
+        "{player}'s rating": 'int16',
+        "opponent's rating": 'int16',
+        "{player} accuracy": 'float32',
+        "Opponent accuracy": 'float32',
+    }
+
+    @classmethod
+    def apply_schema(cls, dataframe: pd.DataFrame, player_name: str) -> pd.DataFrame:
+        """
+        Cast the columns of a cleaned DataFrame to the compact SCHEMA dtypes.
+
+        Concatenating frames whose categoricals have different categories falls
+        back to object columns, so this is also applied to multi-month frames.
+
+        :param dataframe: A cleaned DataFrame.
+        :param player_name: The player's username the data was cleaned for.
+        :return: The DataFrame with compact dtypes.
+        """
+        dtypes = {}
+        for column, dtype in cls.SCHEMA.items():
+            column = column.format(player=player_name)
+            if column in dataframe.columns and dataframe[column].dtype != dtype:
+                dtypes[column] = dtype
+        return dataframe.astype(dtypes) if dtypes else dataframe
+
+    @classmethod
+    def rename_player(cls, dataframe: pd.DataFrame, player_name: str) -> pd.DataFrame:
+        """
+        Rename the player-specific columns of a cleaned DataFrame to another spelling of the player's name.
+
+        Usernames are case-insensitive, so a frame cleaned for "Hikaru" also serves "hikaru".
+
+        :param dataframe: A cleaned DataFrame.
+        :param player_name: The player's username, as the columns should be named.
+        :return: The DataFrame with renamed columns.
+        """
+        targets = {
+            column.format(player=player_name).lower(): column.format(player=player_name)
+            for column in cls.SCHEMA if '{player}' in column
+        }
+        columns = {
+            column: targets[column.lower()]
+            for column in dataframe.columns if column.lower() in targets and column != targets[column.lower()]
+        }
+        return dataframe.rename(columns=columns) if columns else dataframe
+
+    @staticmethod
+    def memory_usage_report(dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Report the dtype and memory footprint of every column of a DataFrame.
+
+        :param dataframe: The DataFrame to inspect.
+        :return: A DataFrame indexed by column with 'dtype' and 'bytes', plus a 'total' row.
+        """
+        report = pd.DataFrame({
+            'dtype': dataframe.dtypes.astype(str),
+            'bytes': dataframe.memory_usage(index=False, deep=True),
+        })
+        report.loc['total'] = ['', report['bytes'].sum()]
+        return report
+
+    @classmethod
+    def version_hash(cls) -> str:
+        """
+        Return a hash identifying the cleaner's logic and input schema.
+
+        Cached cleaned frames are keyed by this value, so any change to the
+        cleaner or to the parsed columns invalidates them automatically.
+
+        :return: A short hexadecimal digest.
+        """
+        source = inspect.getsource(cls) + repr(sorted(GAME_COLUMNS.items()))
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+
     def __init__(self, dataframe: pd.DataFrame, player_name: str):
         """
         Initialize the ChessDataCleaner.
@@ -22,27 +156,49 @@ class ChessDataCleaner:
         self.dataframe = dataframe.copy()
         self.player_name = player_name
         self.has_accuracy = 'accuracies.white' in self.dataframe.columns
+        self.is_white = None
+
+    @staticmethod
+    def plays_white(dataframe: pd.DataFrame, player_name: str) -> np.ndarray:
+        """
+        Find the games a player played as white.
+
+        Usernames are compared case-insensitively, since the archives keep the
+        player's own capitalization whatever case the name was entered in.
+
+        :param dataframe: A DataFrame with a 'white.username' column.
+        :param player_name: The player's username on Chess.com, in any case.
+        :return: A boolean array with one value per game.
+        """
+        return (dataframe['white.username'].astype(str).str.lower() == player_name.lower()).to_numpy()
 
     def drop_columns(self):
         """
         Drop unnecessary columns from the DataFrame.
         """
-        self.dataframe.drop(columns=self.COLUMNS_TO_DROP, axis=1, inplace=True)
+        # Frames from the streaming parser never contain these columns in the first place
+        self.dataframe.drop(columns=self.COLUMNS_TO_DROP, inplace=True, errors='ignore')
         
         if 'tournament' in self.dataframe.columns:
-            self.dataframe.drop(columns=['tournament'], axis=1, inplace=True)
+            self.dataframe.drop(columns=['tournament'], inplace=True)
+
+    def find_player_color(self):
+        """
+        Find which games the player played as white.
+        """
+        self.is_white = self.plays_white(self.dataframe, self.player_name)
 
     def calculate_ratings(self):
         """
         Calculate player and opponent ratings based on the game's data.
         """
         self.dataframe[self.player_name + "'s rating"] = np.where(
-            self.dataframe['white.username'] == self.player_name,
+            self.is_white,
             self.dataframe['white.rating'],
             self.dataframe['black.rating']
         )
         self.dataframe["opponent's rating"] = np.where(
-            self.dataframe['white.username'] != self.player_name,
+            ~self.is_white,
             self.dataframe['white.rating'],
             self.dataframe['black.rating']
         )
@@ -53,29 +209,132 @@ class ChessDataCleaner:
         """
         if self.has_accuracy:
             self.dataframe[self.player_name + " accuracy"] = np.where(
-                self.dataframe['white.username'] == self.player_name,
+                self.is_white,
                 self.dataframe['accuracies.white'],
                 self.dataframe['accuracies.black']
             )
             self.dataframe["Opponent accuracy"] = np.where(
-                self.dataframe['white.username'] != self.player_name,
+                ~self.is_white,
                 self.dataframe['accuracies.white'],
                 self.dataframe['accuracies.black']
             )
 
+    def calculate_results(self):
+        """
+        Calculate the player's result (win, draw or loss), score and the game's termination reason.
+        """
+        white_result = self.dataframe['white.result'].to_numpy(dtype=object)
+        black_result = self.dataframe['black.result'].to_numpy(dtype=object)
+        player_result = np.where(self.is_white, white_result, black_result)
+        opponent_result = np.where(self.is_white, black_result, white_result)
+
+        # Decode the few distinct codes once and spread them over the games
+        codes, uniques = pd.factorize(player_result, use_na_sentinel=False)
+        results = np.array([self.RESULT_CODES.get(code, 'loss') for code in uniques], dtype=object)
+        self.dataframe['result'] = results[codes]
+        self.dataframe['score'] = np.array([self.SCORES[result] for result in results], dtype=float)[codes]
+
+        # The side that did not win carries the reason the game ended
+        is_win = player_result == 'win'
+        termination = pd.Series(np.where(is_win, opponent_result, player_result), index=self.dataframe.index)
+        self.dataframe['termination'] = termination.map(self.TERMINATIONS).fillna(termination)
+
+    @classmethod
+    def form_metrics(cls, dataframe: pd.DataFrame, window: int = FORM_WINDOW) -> pd.DataFrame:
+        """
+        Add streak and rolling form metrics to a cleaned DataFrame.
+
+        These depend on the games before each one, so they are computed on the
+        whole period being analyzed (e.g. a multi-month frame) rather than per
+        month. Every metric is derived from cumulative sums over the games in
+        chronological order, without a loop over the rows:
+
+        - 'win streak' / 'loss streak': consecutive wins / losses up to and including the game.
+        - 'rolling score': the mean score over the last `window` games.
+        - 'performance rating': the average opponent rating over the last `window`
+          games plus 400 * (wins - losses) / games.
+
+        :param dataframe: A DataFrame returned by clean_data (or several concatenated).
+        :param window: The number of games the rolling metrics cover.
+        :return: A copy of the DataFrame with the metrics added.
+        """
+        dataframe = dataframe.copy()
+        if dataframe.empty:
+            for column in ('win streak', 'loss streak', 'rolling score', 'performance rating'):
+                dataframe[column] = pd.Series(dtype=cls.SCHEMA[column])
+            return dataframe
+
+        order = np.argsort(dataframe['end_time'].to_numpy(), kind='stable')
+        result = dataframe['result'].to_numpy(dtype=object)[order]
+        score = dataframe['score'].to_numpy(dtype=float)[order]
+        opponent_rating = dataframe["opponent's rating"].to_numpy(dtype=float)[order]
+
+        def streak(mask):
+            # Count since the last game that broke the streak
+            count = np.cumsum(mask)
+            return count - np.maximum.accumulate(np.where(mask, 0, count))
+
+        def rolling_sum(values):
+            total = np.cumsum(values)
+            total[window:] -= total[:-window].copy()
+            return total
+
+        games = np.minimum(np.arange(1, len(order) + 1), window)
+        wins_minus_losses = rolling_sum((result == 'win').astype(float) - (result == 'loss'))
+        metrics = {
+            'win streak': streak(result == 'win'),
+            'loss streak': streak(result == 'loss'),
+            'rolling score': rolling_sum(score) / games,
+            'performance rating': (rolling_sum(opponent_rating) + 400 * wins_minus_losses) / games,
+        }
+
+        for column, values in metrics.items():
+            unsorted = np.empty_like(values)
+            unsorted[order] = values
+            dataframe[column] = unsorted.astype(cls.SCHEMA[column])
+        return dataframe
+
+    def calculate_openings(self):
+        """
+        Derive the opening name from the game's ECO URL if available.
+        """
+        if 'eco' in self.dataframe.columns:
+            self.dataframe['opening'] = (
+                self.dataframe['eco'].str.rsplit('/', n=1).str[-1].str.replace('-', ' ')
+            )
+
     def clean_data(self) -> pd.DataFrame:
         """
         Clean and process the data.
 
         :return: The cleaned DataFrame.
         """
-        self.drop_columns()
-        self.calculate_ratings()
-        self.calculate_accuracies()
+        stages = [
+            self.drop_columns,
+            self.find_player_color,
+            self.calculate_ratings,
+            self.calculate_accuracies,
+            self.calculate_results,
+            self.calculate_openings,
+            self.convert_times,
+            self.compact,
+        ]
+        for stage in stages:
+            with span(f"clean.{stage.__name__}", 'clean', rows=len(self.dataframe)):
+                stage()
 
-        # Convert the 'end_time' column to datetime format
+        return self.dataframe
+
+    def convert_times(self):
+        """
+        Convert the 'end_time' column to datetime format.
+        """
         self.dataframe['end_time'] = pd.to_datetime(self.dataframe['end_time'], unit='s')
 
-        return self.dataframe
+    def compact(self):
+        """
+        Cast the columns to the compact SCHEMA dtypes.
+        """
+        self.dataframe = self.apply_schema(self.dataframe, self.player_name)
 
 
@@ -1,16 +1,111 @@
-import seaborn as sns
-import matplotlib.pyplot as plt
-import streamlit as st
-from matplotlib.figure import Figure
+import io
+import math
+import threading
+import density
+from accuracy_model import accuracy_models
+from caching import LRUCache, frame_version
+from instrumentation import span
+from timeseries import downsample
+
+# Seaborn style applied once, when the first chart is drawn
+STYLE = "whitegrid"
+PALETTE = "pastel"
+
+_seaborn = None
+_seaborn_lock = threading.Lock()
+
+
+def seaborn():
+    """
+    Imports seaborn on first use and applies the global style once.
+
+    Seaborn and matplotlib are only needed to draw charts, so importing this module
+    stays cheap for code that never draws one.
+
+    :return: The seaborn module.
+    """
+    global _seaborn
+    if _seaborn is None:
+        with _seaborn_lock:
+            if _seaborn is None:
+                import seaborn as sns
+                sns.set_theme(style=STYLE, palette=PALETTE)
+                _seaborn = sns
+    return _seaborn
+
+
+def figure():
+    """
+    Creates a matplotlib Figure that is not registered with pyplot, in the global style.
+    """
+    seaborn()
+    from matplotlib.figure import Figure
+    return Figure()
+
 
 class ChessDataVisualizer:
-    def __init__(self, dataframe, player_name):
+    # Rendered PNG images shared by every visualizer, keyed by player, date range,
+    # chart, chart arguments and data version
+    rendered = LRUCache(maxsize=128)
+
+    # Points kept per time class in the performance chart
+    PERFORMANCE_POINTS = 500
+
+    def __init__(self, dataframe, player_name, data_version=None):
+        """
+        Initialize the ChessDataVisualizer.
+
+        :param dataframe: The cleaned games, or None when only precomputed data is drawn.
+        :param player_name: The player's username on Chess.com.
+        :param data_version: A version of the data used in cache keys instead of hashing the
+            dataframe, e.g. RangeAggregates.version (optional).
+        """
         self.dataframe = dataframe
         self.player_name = player_name
+        self._data_version = data_version
+
+    @property
+    def data_version(self):
+        """
+        A content hash of the data, computed once per visualizer.
+        """
+        if self._data_version is None:
+            self._data_version = frame_version(self.dataframe)
+        return self._data_version
 
-        # Set custom Seaborn style
-        sns.set_theme(style="whitegrid")
-        sns.set_palette("pastel")
+    @property
+    def date_range(self):
+        """
+        The first and last game end times of the data.
+        """
+        if self.dataframe is None or 'end_time' not in self.dataframe.columns or self.dataframe.empty:
+            return None
+        return self.dataframe['end_time'].min(), self.dataframe['end_time'].max()
+
+    def _show(self, chart, build, *args):
+        """
+        Display a chart, rendering it only if the same chart has not been rendered before.
+
+        :param chart: The chart type, part of the cache key.
+        :param build: A callable returning the matplotlib Figure.
+        :param args: The chart arguments, part of the cache key.
+        """
+        import streamlit as st
+
+        rows = len(self.dataframe) if self.dataframe is not None else None
+        with span(f"render.{chart}", 'render', rows=rows, hit=True) as attributes:
+            key = (self.player_name, self.date_range, chart, args, self.data_version)
+            image = self.rendered.get(key)
+
+            if image is None:
+                attributes['hit'] = False
+                buffer = io.BytesIO()
+                build().savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+                image = buffer.getvalue()
+                self.rendered.put(key, image)
+            attributes['bytes'] = len(image)
+
+            st.image(image, width="stretch")
 
     def _set_aesthetics(self, ax, title, xlabel, ylabel):
         """
@@ -25,76 +120,212 @@ class ChessDataVisualizer:
     def print_kde(self, x, hue, fill=True, xlabel=None, ylabel=None):
         """
         Plot univariate distributions using kernel density estimation.
+
+        The curves are precomputed on a binned grid (see density.kde_curves) and
+        cached, so drawing does not depend on the number of games.
+        """
+        def build():
+            grid, curves = density.kde_curves(self.dataframe, x, hue, common_norm=True)
+            return self._density_figure(grid, curves, hue, fill, xlabel, ylabel)
+
+        self._show('kde', build, x, hue, fill, xlabel, ylabel)
+
+    def print_density_curves(self, grid, curves, hue, fill=True, xlabel=None, ylabel=None):
+        """
+        Plot precomputed density curves, one per group.
+
+        The curves must be derived from the visualizer's data, since the cached
+        image is keyed by its version.
+
+        :param grid: The x values shared by all curves.
+        :param curves: A dictionary mapping group labels to density arrays.
+        :param hue: The name of the grouping, used as legend title.
         """
-        fig = Figure()
+        self._show('density_curves', lambda: self._density_figure(grid, curves, hue, fill, xlabel, ylabel), hue, fill, xlabel, ylabel)
+
+    def _density_figure(self, grid, curves, hue, fill, xlabel, ylabel):
+        fig = figure()
         ax = fig.subplots()
+        colors = seaborn().color_palette(n_colors=max(len(curves), 1))
 
-        # Normalize the KDE to represent percentages
-        sns.kdeplot(data=self.dataframe, x=x, hue=hue, fill=fill, ax=ax, common_norm=True)
+        for color, (label, curve) in zip(colors, curves.items()):
+            ax.plot(grid, curve, color=color, label=label)
+            if fill:
+                ax.fill_between(grid, curve, color=color, alpha=0.25)
 
+        if curves:
+            ax.legend(title=hue)
         self._set_aesthetics(ax, "Chess Opponent Ratings Distribution", xlabel, ylabel)
         ax.set_ylabel(ylabel)
         ax.set_xlabel(xlabel)
-        st.pyplot(fig)
-    
+        return fig
+
     def print_histogram(self, x, hue, xlabel=None, ylabel=None, bins=10):
         """
         Plot a histogram of the data.
         """
-        fig = Figure()
-        ax = fig.subplots()
-        sns.histplot(data=self.dataframe, x=x, hue=hue, bins=bins, ax=ax)
-        self._set_aesthetics(ax, "Histogram", xlabel, ylabel)
-        ax.set_ylabel(ylabel)
-        ax.set_xlabel(xlabel)
-        st.pyplot(fig)
+        def build():
+            edges, counts = density.histogram_counts(self.dataframe, x, hue, bins=bins)
+            fig = figure()
+            ax = fig.subplots()
+            colors = seaborn().color_palette(n_colors=max(len(counts), 1))
+
+            for color, (label, values) in zip(colors, counts.items()):
+                ax.stairs(values, edges, fill=True, color=color, alpha=0.5, label=label)
+                ax.stairs(values, edges, color=color)
+
+            if counts:
+                ax.legend(title=hue)
+            self._set_aesthetics(ax, "Histogram", xlabel, ylabel)
+            ax.set_ylabel(ylabel)
+            ax.set_xlabel(xlabel)
+            return fig
 
+        self._show('histogram', build, x, hue, xlabel, ylabel, bins)
 
-    def print_distribution(self, column, xlabel=None, ylabel=None, chart_type='pie'):
+    def print_distribution(self, column, xlabel=None, ylabel=None, chart_type='pie', counts=None):
         """
         Show the counts of observations in each categorical bin using either bars (default) or a pie chart.
+
+        :param counts: Precomputed counts per category, e.g. from aggregates (optional, counted from the data otherwise).
         """
-        if chart_type == 'countplot':
-            fig = Figure()
-            ax = fig.subplots()
-            sns.countplot(data=self.dataframe, x=column, order=self.dataframe[column].value_counts().index, ax=ax)
-            self._set_aesthetics(ax, "Distribution of " + column, xlabel, ylabel)
-            ax.set_ylabel(ylabel)
-            ax.set_xlabel(xlabel)
-            st.pyplot(fig)
-        elif chart_type == 'pie':
-            counts = self.dataframe[column].value_counts()
-            labels = counts.index
-            sizes = counts.values
-
-            fig, ax = plt.subplots()
-            ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-            ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-
-            plt.title("Distribution of " + column)
-            st.pyplot(fig)
-        else:
+        if chart_type not in ('countplot', 'pie'):
+            import streamlit as st
             st.write("Invalid chart_type. Supported types: 'countplot', 'pie'")
+            return
+
+        def build():
+            values = self.dataframe[column].value_counts() if counts is None else counts.sort_values(ascending=False)
+            # Categorical columns also count categories that do not occur
+            values = values[values > 0]
+            fig = figure()
+            ax = fig.subplots()
+
+            if chart_type == 'countplot':
+                seaborn().barplot(x=values.index.astype(str), y=values.to_numpy(), ax=ax)
+                self._set_aesthetics(ax, "Distribution of " + column, xlabel, ylabel)
+                ax.set_ylabel(ylabel)
+                ax.set_xlabel(xlabel)
+            else:
+                ax.pie(values.values, labels=values.index, autopct='%1.1f%%', startangle=90)
+                ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+                ax.set_title("Distribution of " + column)
+            return fig
+
+        self._show('distribution', build, column, xlabel, ylabel, chart_type)
 
     def print_performance(self, data, xlabel=None, ylabel=None):
         """
         Plot a line plot for ratings over time.
+
+        Each time class is downsampled to PERFORMANCE_POINTS points with LTTB, so the
+        chart costs the same for a month or for several years of games.
         """
-        fig = Figure()
+        rating = f"{self.player_name}'s rating"
+
+        def build():
+            games = self.dataframe.sort_values('end_time')
+            groups = games.groupby('time_class', observed=True)
+            return self._rating_figure((label, group['end_time'].to_numpy(), group[rating].to_numpy()) for label, group in groups)
+
+        self._show('performance', build, self.PERFORMANCE_POINTS)
+
+    def print_rating_curve(self, curve):
+        """
+        Plot the player's daily closing rating over time.
+
+        :param curve: A DataFrame indexed by day with 'time_class' and 'close' columns,
+            as returned by RangeAggregates.rating_curve.
+        """
+        def build():
+            groups = curve.sort_index(kind='stable').groupby('time_class', sort=True)
+            return self._rating_figure((label, group.index.to_numpy(), group['close'].to_numpy()) for label, group in groups)
+
+        self._show('rating_curve', build, self.PERFORMANCE_POINTS)
+
+    def _rating_figure(self, series):
+        """
+        Draws one rating line per time class, each downsampled to PERFORMANCE_POINTS points with LTTB.
+
+        :param series: An iterable of (time class, times, ratings) tuples.
+        """
+        series = list(series)
+        fig = figure()
         ax = fig.subplots()
-        sns.lineplot(data=self.dataframe, x='end_time', y=f"{self.player_name}'s rating", ax=ax, hue = 'time_class')
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=90)
-        self._set_aesthetics(ax, f"{self.player_name}'s Rating Over Time", "Date", "Rating")        
-        ax.legend()
-        st.pyplot(fig)
+        colors = seaborn().color_palette(n_colors=max(len(series), 1))
+
+        for color, (label, times, values) in zip(colors, series):
+            times, values = downsample(times, values, self.PERFORMANCE_POINTS)
+            ax.plot(times, values, color=color, label=label)
+
+        ax.tick_params(axis='x', rotation=90)
+        self._set_aesthetics(ax, f"{self.player_name}'s Rating Over Time", "Date", "Rating")
+        if series:
+            ax.legend(title='time_class')
+        return fig
+
+    def print_accuracy(self, aggregates, lowess=False):
+        """
+        Plot the player's accuracy against the opponent's rating, one panel per time class.
+
+        Only the fitted line with its 95% confidence band (and the binned LOWESS curve,
+        if asked for) and a fixed-size random sample of the games are drawn, so the
+        chart costs the same however many games have accuracies.
+
+        :param aggregates: The RangeAggregates of the visualizer's data.
+        :param lowess: Whether to also draw a binned LOWESS curve.
+        """
+        def build():
+            models = accuracy_models(aggregates, lowess)
+            columns = min(len(models), 2)
+            rows = math.ceil(len(models) / 2)
+            fig = figure()
+            fig.set_size_inches(5 * columns, 5 * rows)
+            axes = fig.subplots(rows, columns, squeeze=False)
+            line_color, lowess_color = seaborn().color_palette(n_colors=2)
+
+            for ax, (time_class, model) in zip(axes.flat, models.items()):
+                x, y = aggregates.accuracy_sample(time_class)
+                ax.scatter(x, y, color="indigo", alpha=0.2, s=10)
+                ax.plot(model['grid'], model['fit'], color=line_color)
+                ax.fill_between(model['grid'], model['lower'], model['upper'], color=line_color, alpha=0.15)
+                if model['lowess'] is not None:
+                    ax.plot(model['grid'], model['lowess'], color=lowess_color, linestyle='--', label='LOWESS')
+                    ax.legend()
+                ax.set_title(f"time_class = {time_class} ({model['games']} games, r = {model['r']:.2f})")
+                ax.set_xlabel("opponent's rating")
+                ax.set_ylabel(f"{self.player_name} accuracy")
+            for ax in axes.flat[len(models):]:
+                ax.set_visible(False)
+            fig.tight_layout()
+            return fig
+
+        self._show('accuracy', build, lowess)
 
     def print_rating(self, data_series):
         """
         Print information about opponent's summary statistics.
         """
+        import streamlit as st
+
         avg_opp_rating = data_series.mean().round()
         max_opp_rating = data_series.max()
         st.markdown(
             f"**Average Opponent Rating:** {avg_opp_rating}\n"
             f"**Highest Opponent Rating:** {max_opp_rating}"
         )
+
+    def print_rating_summary(self, summary):
+        """
+        Print opponent rating summary statistics from pre-aggregated totals.
+
+        :param summary: A DataFrame returned by GameAggregates.rollup.
+        """
+        import streamlit as st
+
+        avg_opp_rating = round(summary['opponent_rating_sum'].sum() / summary['games'].sum())
+        max_opp_rating = summary['opponent_rating_max'].max()
+        st.markdown(
+            f"**Average Opponent Rating:** {avg_opp_rating}\n"
+            f"**Highest Opponent Rating:** {max_opp_rating}"
+        )
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+from caching import LRUCache, frame_version
+
+# Width of the grid the KDE is evaluated on, in rating points
+KDE_BIN_WIDTH = 5.0
+# How many bandwidths the curves extend past the data, as in seaborn
+KDE_CUT = 3
+
+_CURVES = LRUCache(maxsize=64)
+
+
+def group_codes(dataframe, hue):
+    """
+    Encodes the hue column of a DataFrame as integer codes.
+
+    :param dataframe: The DataFrame.
+    :param hue: The grouping column.
+    :return: A tuple (labels, codes).
+    """
+    codes, labels = pd.factorize(dataframe[hue], sort=True)
+    return list(labels), codes
+
+
+def binned_counts(values, codes, n_groups, edges):
+    """
+    Counts values per group into fixed-width bins with a single bincount.
+
+    :param values: A float array of values.
+    :param codes: An integer group code per value (negative codes are skipped).
+    :param n_groups: The number of groups.
+    :param edges: Equally spaced bin edges.
+    :return: An int64 array of shape (n_groups, len(edges) - 1).
+    """
+    n_bins = len(edges) - 1
+    width = edges[1] - edges[0]
+    valid = (codes >= 0) & ~np.isnan(values)
+    bins = np.clip(((values[valid] - edges[0]) // width).astype(np.int64), 0, n_bins - 1)
+    counts = np.bincount(codes[valid] * n_bins + bins, minlength=n_groups * n_bins)
+    return counts.reshape(n_groups, n_bins)
+
+
+def binned_std(counts, centers):
+    """
+    Estimates the standard deviation of each group from its histogram.
+
+    :param counts: An array of shape (n_groups, n_bins).
+    :param centers: The bin centers.
+    :return: A float array with one standard deviation per group.
+    """
+    totals = counts.sum(axis=1)
+    safe_totals = np.maximum(totals, 1)
+    means = counts @ centers / safe_totals
+    variances = counts @ centers ** 2 / safe_totals - means ** 2
+    return np.sqrt(np.maximum(variances, 0) * totals / np.maximum(totals - 1, 1))
+
+
+def fft_kde(counts, bin_width, bandwidths):
+    """
+    Smooths binned counts with Gaussian kernels using FFT-based convolution.
+
+    :param counts: An array of shape (n_groups, n_bins).
+    :param bin_width: The width of a bin.
+    :param bandwidths: The kernel standard deviation of each group.
+    :return: A float array of the same shape with the (unnormalized) smoothed counts.
+    """
+    n_groups, n_bins = counts.shape
+    bandwidths = np.maximum(np.asarray(bandwidths, dtype=float), bin_width)
+    half_width = int(np.ceil(4 * bandwidths.max() / bin_width))
+    offsets = np.arange(-half_width, half_width + 1) * bin_width
+
+    kernels = np.exp(-0.5 * (offsets[None, :] / bandwidths[:, None]) ** 2)
+    kernels /= kernels.sum(axis=1, keepdims=True)
+
+    size = 1 << int(np.ceil(np.log2(n_bins + len(offsets))))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size, axis=1) * np.fft.rfft(kernels, size, axis=1), size, axis=1)
+    return np.maximum(smoothed[:, half_width:half_width + n_bins], 0)
+
+
+def kde_curves(dataframe, x, hue, bin_width=KDE_BIN_WIDTH, common_norm=True):
+    """
+    Computes KDE curves of a column per group, cached by the content of the data.
+
+    The values are binned once on a fixed-width grid and every group is smoothed by
+    FFT convolution with a Gaussian kernel (Scott's rule bandwidth), so the cost is
+    one pass over the games plus a small FFT over the grid.
+
+    :param dataframe: The DataFrame containing the data.
+    :param x: The column to estimate the density of.
+    :param hue: The grouping column.
+    :param bin_width: The spacing of the evaluation grid.
+    :param common_norm: Whether the curves are scaled so their total area is 1 (as in seaborn).
+    :return: A tuple (grid, {label: density array}).
+    """
+    key = ('kde', frame_version(dataframe, [x, hue]), x, hue, bin_width, common_norm)
+    return _CURVES.get_or_compute(key, lambda: _compute_kde_curves(dataframe, x, hue, bin_width, common_norm))
+
+
+def _compute_kde_curves(dataframe, x, hue, bin_width, common_norm):
+    values = dataframe[x].to_numpy(dtype=float)
+    labels, codes = group_codes(dataframe, hue)
+    finite = values[~np.isnan(values)]
+    if not len(finite) or not labels:
+        return np.zeros(0), {}
+
+    # Bin finely over the data range first to get each group's bandwidth
+    edges = np.arange(finite.min(), finite.max() + 2 * bin_width, bin_width)
+    counts = binned_counts(values, codes, len(labels), edges)
+    bandwidths = binned_std(counts, edges[:-1] + bin_width / 2) * np.maximum(counts.sum(axis=1), 1) ** -0.2
+
+    # Then extend the grid by KDE_CUT bandwidths on both sides, like seaborn does
+    padding = KDE_CUT * max(bandwidths.max(), bin_width)
+    edges = np.arange(finite.min() - padding, finite.max() + padding + bin_width, bin_width)
+    counts = binned_counts(values, codes, len(labels), edges)
+    return grid_density(counts, edges, bandwidths, labels, common_norm)
+
+
+def grid_density(counts, edges, bandwidths, labels, common_norm=True):
+    """
+    Turns binned counts into density curves on the bin centers.
+
+    :param counts: An array of shape (n_groups, n_bins).
+    :param edges: Equally spaced bin edges.
+    :param bandwidths: The kernel standard deviation of each group.
+    :param labels: The group labels.
+    :param common_norm: Whether the curves are scaled so their total area is 1.
+    :return: A tuple (grid, {label: density array}).
+    """
+    bin_width = edges[1] - edges[0]
+    smoothed = fft_kde(counts, bin_width, bandwidths)
+    totals = counts.sum(axis=1)
+    if common_norm:
+        density = smoothed / (max(totals.sum(), 1) * bin_width)
+    else:
+        density = smoothed / (np.maximum(totals, 1)[:, None] * bin_width)
+    grid = edges[:-1] + bin_width / 2
+    return grid, {label: density[i] for i, label in enumerate(labels) if totals[i]}
+
+
+def histogram_counts(dataframe, x, hue, bins=10):
+    """
+    Computes equal-width histogram counts of a column per group, cached by the content of the data.
+
+    :param dataframe: The DataFrame containing the data.
+    :param x: The column to bin.
+    :param hue: The grouping column.
+    :param bins: The number of bins spanning the data range.
+    :return: A tuple (edges, {label: counts array}).
+    """
+    key = ('hist', frame_version(dataframe, [x, hue]), x, hue, bins)
+    return _CURVES.get_or_compute(key, lambda: _compute_histogram_counts(dataframe, x, hue, bins))
+
+
+def _compute_histogram_counts(dataframe, x, hue, bins):
+    values = dataframe[x].to_numpy(dtype=float)
+    labels, codes = group_codes(dataframe, hue)
+    finite = values[~np.isnan(values)]
+    if not len(finite) or not labels:
+        return np.zeros(0), {}
+
+    low, high = finite.min(), finite.max()
+    edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+    counts = binned_counts(values, codes, len(labels), edges)
+    return edges, {label: counts[i] for i, label in enumerate(labels) if counts[i].any()}
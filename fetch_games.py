@@ -1,7 +1,19 @@
+import logging
+import re
+import threading
 import requests
 import pandas as pd
-import streamlit as st
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from caching import TTLCache
+from instrumentation import span, submit
+from request_scheduler import RequestScheduler, parse_retry_after
+from game_parser import iter_chunks, parse_games
+from game_store import GameStore
+
+logger = logging.getLogger(__name__)
 
 class ChessAPI:
     """
@@ -10,13 +22,126 @@ class ChessAPI:
 
     BASE_URL = "https://api.chess.com/pub"
 
+    # Local copy of the monthly archives; closed months are served from here
+    store = GameStore()
+
+    # Connection pool and retry policy shared by every request. Rate limiting (429)
+    # is handled by the scheduler instead, so every thread backs off together; urllib3
+    # would otherwise retry any response carrying a Retry-After header on its own.
+    TIMEOUT = 30
+    POOL_SIZE = 16
+    # Archives downloaded at once by fetch_all_games, unless the caller sets its own cap
+    MAX_WORKERS = 8
+    CHUNK_SIZE = 64 * 1024
+    RETRY = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=False,
+    )
+    _session = None
+    _session_lock = threading.Lock()
+
+    # Admits every request at the rate Chess.com allows, fairly across sessions
+    scheduler = RequestScheduler()
+    RATE_LIMIT_RETRIES = 4
+
+    # In-process cache of profile, country and stats responses, with a time-to-live
+    # in seconds per endpoint
+    CACHE_TTLS = {
+        'player': 600,
+        'country': 24 * 3600,
+        'stats': 300,
+        'archives': 600,
+    }
+    responses = TTLCache(maxsize=1024)
+
+    # URL classes used to label the timing spans of requests
+    URL_CLASSES = [
+        ('archive', re.compile(r'/player/[^/]+/games/\d{4}/\d{2}$')),
+        ('archives', re.compile(r'/player/[^/]+/games/archives$')),
+        ('stats', re.compile(r'/player/[^/]+/stats$')),
+        ('player', re.compile(r'/player/[^/]+$')),
+        ('country', re.compile(r'/country/[^/]+$')),
+    ]
+
     # Define a user-agent header
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
     }
 
     @classmethod
-    def fetch_games(cls, player_name=None, year=None, month=None, url=None):
+    def _get_session(cls):
+        """
+        Returns the shared requests session, creating it on first use.
+
+        :return: A requests.Session with pooled keep-alive connections and retries.
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    session.headers.update(cls.headers)
+                    adapter = HTTPAdapter(pool_maxsize=cls.POOL_SIZE, max_retries=cls.RETRY)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def _get(cls, url, headers=None, stream=False):
+        """
+        Sends a GET request through the shared session once the scheduler admits it.
+
+        A 429 response pauses the scheduler for the Retry-After period (or an
+        exponential backoff) and the request is queued again, up to RATE_LIMIT_RETRIES
+        times. Successful (2xx or 304) responses let the scheduler raise its rate again.
+        With stream=True the scheduler slot is released once the headers have arrived.
+
+        :param url: The URL to request.
+        :param headers: Extra headers for this request (optional).
+        :param stream: Whether to defer downloading the body until it is iterated (optional).
+        :return: The requests.Response.
+        """
+        url_class = cls._url_class(url)
+        with span(f"http.{url_class}", 'http', url_class=url_class, conditional=bool(headers), queue_ms=0.0) as attributes:
+            for attempt in range(cls.RATE_LIMIT_RETRIES + 1):
+                with cls.scheduler.slot() as waited:
+                    attributes['queue_ms'] += waited * 1000
+                    response = cls._get_session().get(url, headers=headers, timeout=cls.TIMEOUT, stream=stream)
+                if response.status_code != 429 or attempt == cls.RATE_LIMIT_RETRIES:
+                    break
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                cls.scheduler.rate_limited(retry_after if retry_after is not None else 2 ** attempt)
+                response.close()
+
+            # Only a served request shows the API has room again; errors leave the rate alone
+            if 200 <= response.status_code < 300 or response.status_code == 304:
+                cls.scheduler.succeeded()
+            attributes['rate_limited'] = attempt + (response.status_code == 429)
+            attributes['status'] = response.status_code
+            retries = getattr(response.raw, 'retries', None)
+            attributes['retries'] = len(retries.history) if retries else 0
+            if not stream:
+                attributes['bytes'] = len(response.content)
+            elif response.headers.get('Content-Length', '').isdigit():
+                attributes['bytes'] = int(response.headers['Content-Length'])
+        return response
+
+    @classmethod
+    def _url_class(cls, url):
+        """
+        Returns the kind of API resource a URL points to (archive, archives, stats, player, country or other).
+        """
+        path = url.split('?')[0].rstrip('/')
+        for url_class, pattern in cls.URL_CLASSES:
+            if pattern.search(path):
+                return url_class
+        return 'other'
+
+    @classmethod
+    def fetch_games(cls, player_name=None, year=None, month=None, url=None, columns=None):
         """
         Fetches and returns a DataFrame containing games either based on player_name, year, and month or a provided URL.
 
@@ -24,35 +149,106 @@ class ChessAPI:
         :param year: The year for which to filter the games (optional).
         :param month: The month for which to filter the games (optional).
         :param url: The API URL to fetch games (optional, if provided, player_name, year, and month are ignored).
+        :param columns: A mapping of column name to (JSON path, type) to extract (optional, defaults to GAME_COLUMNS).
         :return: A pandas DataFrame containing the games.
         """
         if url:
-            return cls._fetch_data_from_url(url)
+            return cls._fetch_data_from_url(url, columns)
 
         elif not player_name or not year or not month:
             raise ValueError("Either provide player_name, year, and month or provide a valid URL.")
 
-        url = f"{cls.BASE_URL}/player/{player_name}/games/{year}/{month}"
-        return cls._fetch_data_from_url(url)
+        return cls._fetch_archive(player_name, int(year), int(month), columns)
 
     @classmethod
-    def _fetch_data_from_url(cls, url):
+    def _fetch_archive(cls, player_name, year, month, columns=None):
+        """
+        Fetches and returns the games of a single month, using the local store when possible.
+
+        Closed months are read from the store without any network traffic. The current
+        month (or a month stored before it was over) is revalidated with a conditional
+        request, so an unchanged archive costs a 304 response instead of a full download.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The year of the archive.
+        :param month: The month of the archive.
+        :param columns: A mapping of column name to (JSON path, type) to extract (optional).
+        :return: A pandas DataFrame containing the games. Its attrs['complete'] is True only if
+            the games are the month's final archive, i.e. the month is closed and the body was
+            fetched or revalidated after that, not a stored copy used because the API failed.
+        """
+        url = f"{cls.BASE_URL}/player/{player_name}/games/{year}/{month:02d}"
+        with span('cache.archive_store', 'cache') as attributes:
+            archive = cls.store.get(player_name, year, month)
+            attributes['hit'] = bool(archive and archive.complete)
+
+        if archive and archive.complete:
+            return cls._mark_complete(cls._parse_games(archive.body, url, columns), True)
+
+        try:
+            response = cls._get(url, headers=cls._conditional_headers(archive))
+
+            if response.status_code == 304 and archive:
+                cls.store.touch(player_name, year, month)
+                return cls._mark_complete(cls._parse_games(archive.body, url, columns), cls.store.is_closed(year, month))
+
+            response.raise_for_status()
+            cls.store.put(
+                player_name, year, month, response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+            return cls._mark_complete(cls._parse_games(response.content, url, columns), cls.store.is_closed(year, month))
+        except requests.RequestException as e:
+            cls._log_error(f"Error fetching games from URL {url}: {e}")
+
+        # Fall back to the last stored copy if the API is unreachable; it may predate the end of the month
+        if archive:
+            return cls._mark_complete(cls._parse_games(archive.body, url, columns), False)
+        return None
+
+    @staticmethod
+    def _conditional_headers(archive):
+        """
+        Returns the headers revalidating a stored archive, so an unchanged one is answered with 304.
+
+        :param archive: The StoredArchive, or None if the month has not been stored yet.
+        :return: A dictionary of request headers.
+        """
+        headers = {}
+        if archive and archive.etag:
+            headers['If-None-Match'] = archive.etag
+        if archive and archive.last_modified:
+            headers['If-Modified-Since'] = archive.last_modified
+        return headers
+
+    @staticmethod
+    def _mark_complete(data, complete):
+        """
+        Records in a games DataFrame's attrs whether it holds a month's final archive.
+        """
+        if data is not None:
+            data.attrs['complete'] = complete
+        return data
+
+    @classmethod
+    def _fetch_data_from_url(cls, url, columns=None):
         """
         Fetches and returns data from a provided URL.
 
         :param url: The API URL to fetch data from.
+        :param columns: A mapping of column name to (JSON path, type) to extract (optional).
         :return: The fetched data.
         """
         data = None
 
         try:
-            # Include the user-agent header in the request
-            response = requests.get(url, headers=cls.headers)
+            response = cls._get(url, stream=True)
             response.raise_for_status()
-            games_data = response.json().get('games', [])
-
-            if games_data:
-                data = pd.json_normalize(games_data, max_level=1)
+            # Downloading and parsing are interleaved, so they are timed together
+            with span('parse.stream', 'parse', url_class=cls._url_class(url)) as attributes:
+                data = parse_games(response.iter_content(chunk_size=cls.CHUNK_SIZE), columns)
+                attributes['rows'] = 0 if data is None else len(data)
         except requests.RequestException as e:
             cls._log_error(f"Error fetching games from URL {url}: {e}")
         except (KeyError, TypeError, ValueError) as e:
@@ -60,6 +256,27 @@ class ChessAPI:
 
         return data
 
+    @classmethod
+    def _parse_games(cls, body, url, columns=None):
+        """
+        Parses a raw archive response body into a DataFrame.
+
+        :param body: The raw JSON response body.
+        :param url: The API URL the body was fetched from (used for error messages).
+        :param columns: A mapping of column name to (JSON path, type) to extract (optional).
+        :return: A pandas DataFrame containing the games, or None if there are none.
+        """
+        data = None
+
+        try:
+            with span('parse.archive', 'parse', bytes=len(body)) as attributes:
+                data = parse_games(iter_chunks(body, cls.CHUNK_SIZE), columns)
+                attributes['rows'] = 0 if data is None else len(data)
+        except (KeyError, TypeError, ValueError) as e:
+            cls._log_error(f"Error processing games data from URL {url}: {e}")
+
+        return data
+
     @classmethod
     def fetch_player_data(cls, player_name):
         """
@@ -70,15 +287,17 @@ class ChessAPI:
         """
         url = f"{cls.BASE_URL}/player/{player_name}"
 
-        try:
-            # Include the user-agent header in the request
-            response = requests.get(url, headers=cls.headers)
-            response.raise_for_status()
-            player_data = response.json()
-            return player_data
-        except requests.RequestException as e:
-            cls._log_error(f"Error fetching player data from URL {url}: {e}")
-            return None
+        def load():
+            try:
+                response = cls._get(url)
+                response.raise_for_status()
+                player_data = response.json()
+                return player_data
+            except requests.RequestException as e:
+                cls._log_error(f"Error fetching player data from URL {url}: {e}")
+                return None
+
+        return cls._cached('player', url, load)
 
     @classmethod
     def fetch_country_data(cls, country_url):
@@ -88,15 +307,17 @@ class ChessAPI:
         :param country_url: The API URL for the country data.
         :return: A dictionary containing data about the country.
         """
-        try:
-            # Include the user-agent header in the request
-            response = requests.get(country_url, headers=cls.headers)
-            response.raise_for_status()
-            country_data = response.json()
-            return country_data
-        except requests.RequestException as e:
-            cls._log_error(f"Error fetching country data from URL {country_url}: {e}")
-            return None
+        def load():
+            try:
+                response = cls._get(country_url)
+                response.raise_for_status()
+                country_data = response.json()
+                return country_data
+            except requests.RequestException as e:
+                cls._log_error(f"Error fetching country data from URL {country_url}: {e}")
+                return None
+
+        return cls._cached('country', country_url, load)
 
     @classmethod
     def fetch_player_stats(cls, player_name):
@@ -107,17 +328,46 @@ class ChessAPI:
         :return: A dictionary containing statistics for the player.
         """
         url = f"{cls.BASE_URL}/player/{player_name}/stats"
-        player_stats = {}
 
-        try:
-            # Include the user-agent header in the request
-            response = requests.get(url, headers=cls.headers)
-            response.raise_for_status()
-            player_stats = response.json()
-        except requests.RequestException as e:
-            cls._log_error(f"Error fetching player stats from URL {url}: {e}")
+        def load():
+            player_stats = {}
+
+            try:
+                response = cls._get(url)
+                response.raise_for_status()
+                player_stats = response.json()
+            except requests.RequestException as e:
+                cls._log_error(f"Error fetching player stats from URL {url}: {e}")
 
-        return player_stats
+            return player_stats
+
+        return cls._cached('stats', url, load)
+
+    @classmethod
+    def _cached(cls, endpoint, url, load):
+        """
+        Returns a response from the shared response cache, loading it on a miss.
+
+        Concurrent requests for the same URL (e.g. from several Streamlit sessions)
+        share one upstream call; the callers that waited for it are recorded as
+        coalesced misses. Failed requests are not cached.
+
+        :param endpoint: The endpoint name, selecting the time-to-live from CACHE_TTLS.
+        :param url: The requested URL.
+        :param load: A callable performing the request.
+        :return: The loaded or cached response data.
+        """
+        with span(f"cache.{endpoint}", 'cache', hit=True, coalesced=False) as attributes:
+            def miss():
+                attributes['hit'] = False
+                return load()
+
+            # Waiting for another caller's request is not a hit: the response was not cached yet
+            def coalesced():
+                attributes['hit'] = False
+                attributes['coalesced'] = True
+
+            return cls.responses.get_or_load((endpoint, url.lower()), miss, ttl=cls.CACHE_TTLS[endpoint], on_wait=coalesced)
 
     @staticmethod
     def _log_error(message):
@@ -126,7 +376,7 @@ class ChessAPI:
 
         :param message: The error message to be logged.
         """
-        print(f"Error: {message}")
+        logger.error(message)
 
     @classmethod
     def display_player_info(cls, player_name):
@@ -135,20 +385,32 @@ class ChessAPI:
 
         :param player_name: The player's username on Chess.com.
         """
-        st.subheader("Player Information")
-
         player_info = cls.fetch_player_data(player_name)
 
+        # Handle the case where 'country' is another API link
+        country_data = None
+        if player_info and player_info.get('country'):
+            country_data = cls.fetch_country_data(player_info['country'])
+
+        cls.render_player_info(player_info, country_data)
+
+    @staticmethod
+    def render_player_info(player_info, country_data=None):
+        """
+        Displays already fetched player information in a Streamlit app.
+
+        :param player_info: The player data returned by fetch_player_data.
+        :param country_data: The country data returned by fetch_country_data (optional).
+        """
+        import streamlit as st
+
+        st.subheader("Player Information")
+
         if player_info:
             st.write("Username: ", player_info['username'])
 
-            # Handle the case where 'country' is another API link
-            if 'country' in player_info and player_info['country']:
-                country_data = cls.fetch_country_data(player_info['country'])
-                if country_data:
-                    st.write("Country: ", country_data.get('name'))
-                else:
-                    st.write("Country data not available.")
+            if country_data:
+                st.write("Country: ", country_data.get('name'))
             else:
                 st.write("Country data not available.")
 
@@ -166,9 +428,18 @@ class ChessAPI:
 
         :param player_name: The player's username on Chess.com.
         """
-        st.subheader("Player Statistics")
+        cls.render_player_stats(cls.fetch_player_stats(player_name))
 
-        player_stats = cls.fetch_player_stats(player_name)
+    @staticmethod
+    def render_player_stats(player_stats):
+        """
+        Displays already fetched player statistics in a Streamlit app.
+
+        :param player_stats: The statistics returned by fetch_player_stats.
+        """
+        import streamlit as st
+
+        st.subheader("Player Statistics")
 
         if player_stats:
             # Display the statistics (customize this based on the API response structure)
@@ -193,20 +464,60 @@ class ChessAPI:
         """
         url = f"{cls.BASE_URL}/player/{player_name}/games/archives"
 
-        try:
-            # Include the user-agent header in the request
-            response = requests.get(url, headers=cls.headers)
-            response.raise_for_status()
-            game_archives = response.json().get('archives', [])
-            return game_archives
-        except requests.RequestException as e:
-            cls._log_error(f"Error fetching game archives from URL {url}: {e}")
-            return []
-
-# Usage examples:
-df = ChessAPI.fetch_games(player_name="DanielNaroditsky", year=2014, month='03')
-print(df.columns)
-# ChessAPI.fetch_games(url="https://example.com/api/endpoint")
-# ChessAPI.display_player_info(player_name="example_player")
-# ChessAPI.display_player_stats(player_name="example_player")
-# ChessAPI.fetch_game_archives(player_name="example_player")
+        def load():
+            try:
+                response = cls._get(url)
+                response.raise_for_status()
+                game_archives = response.json().get('archives', [])
+                return game_archives
+            except requests.RequestException as e:
+                cls._log_error(f"Error fetching game archives from URL {url}: {e}")
+                return []
+
+        return cls._cached('archives', url, load)
+
+    @classmethod
+    def fetch_all_games(cls, player_name, max_workers=None, columns=None):
+        """
+        Fetches and returns every game a player has played, downloading monthly archives concurrently.
+
+        Closed months already in the local store are read from it, so only new or
+        changed months are downloaded. Every download still goes through the request
+        scheduler, which caps the rate whatever the number of workers.
+
+        :param player_name: The player's username on Chess.com.
+        :param max_workers: The maximum number of archives downloaded at once (optional, defaults to MAX_WORKERS).
+        :param columns: A mapping of column name to (JSON path, type) to extract (optional).
+        :return: A pandas DataFrame containing the games in chronological order, or None if there are none.
+        """
+        months = sorted(cls._parse_archive_url(url) for url in cls.fetch_game_archives(player_name))
+        max_workers = max(min(max_workers or cls.MAX_WORKERS, cls.POOL_SIZE), 1)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [submit(executor, cls._fetch_archive, player_name, year, month, columns) for year, month in months]
+            frames = [future.result() for future in futures]
+
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _parse_archive_url(url):
+        """
+        Extracts the year and month from a monthly archive URL.
+
+        :param url: An archive URL such as https://api.chess.com/pub/player/hikaru/games/2020/05.
+        :return: A (year, month) tuple of integers.
+        """
+        year, month = url.rstrip('/').split('/')[-2:]
+        return int(year), int(month)
+
+if __name__ == "__main__":
+    # Usage examples:
+    df = ChessAPI.fetch_games(player_name="DanielNaroditsky", year=2014, month='03')
+    print(df.columns)
+    # ChessAPI.fetch_games(url="https://example.com/api/endpoint")
+    # ChessAPI.display_player_info(player_name="example_player")
+    # ChessAPI.display_player_stats(player_name="example_player")
+    # ChessAPI.fetch_game_archives(player_name="example_player")
@@ -0,0 +1,136 @@
+import os
+import threading
+
+import pandas as pd
+
+from data_cleaner import ChessDataCleaner
+from fetch_games import ChessAPI
+from game_store import player_key
+from instrumentation import span
+
+
+def month_range(start, end):
+    """
+    Lists the months between two months, both included.
+
+    :param start: The first month as a (year, month) tuple.
+    :param end: The last month as a (year, month) tuple.
+    :return: A list of (year, month) tuples in chronological order.
+    """
+    first = start[0] * 12 + start[1] - 1
+    last = end[0] * 12 + end[1] - 1
+    return [(index // 12, index % 12 + 1) for index in range(first, last + 1)]
+
+
+class CleanedGameCache:
+    """
+    A class to cache cleaned monthly game frames as Parquet files.
+
+    Files live under <directory>/<player key>/<cleaner version>/<year>-<month>.parquet,
+    where the player key is the lowercased username (see game_store.player_key).
+    Only final archives of closed months are written, since their games can no
+    longer change; the current month, or a stored copy served while the API was
+    unreachable, is always cleaned from the (locally stored) archive.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache", "cleaned")
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, aggregates=None):
+        """
+        Initialize the CleanedGameCache.
+
+        :param directory: The root directory of the cache.
+        :param aggregates: A GameAggregates updated whenever a month is cleaned (optional).
+        """
+        self.directory = directory
+        self.aggregates = aggregates
+        self._version = None
+
+    @property
+    def version(self):
+        """
+        The version hash of the cleaner, computed once per process.
+        """
+        if self._version is None:
+            self._version = ChessDataCleaner.version_hash()
+        return self._version
+
+    def path(self, player_name, year, month):
+        """
+        Returns the cache file path for a player and month.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The year of the games.
+        :param month: The month of the games.
+        :return: The path of the Parquet file.
+        """
+        return os.path.join(self.directory, player_key(player_name), self.version, f"{int(year)}-{int(month):02d}.parquet")
+
+    def load(self, player_name, year, month):
+        """
+        Returns the cleaned games of a player for a month, cleaning and caching them if needed.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The year of the games.
+        :param month: The month of the games.
+        :return: The cleaned DataFrame, or None if the player has no games that month.
+        """
+        path = self.path(player_name, year, month)
+        if os.path.exists(path):
+            with span('cache.cleaned_games', 'cache', hit=True):
+                cleaned_data = pd.read_parquet(path, memory_map=True)
+            # The month may have been cached for another spelling of the name
+            cleaned_data = ChessDataCleaner.rename_player(cleaned_data, player_name)
+            if self.aggregates and not self.aggregates.has_month(player_name, year, month):
+                self.aggregates.update(player_name, cleaned_data)
+            return cleaned_data
+
+        data = ChessAPI.fetch_games(player_name, year, month)
+        if data is None or data.empty:
+            return None
+
+        cleaned_data = ChessDataCleaner(data, player_name).clean_data()
+        if self.aggregates:
+            self.aggregates.update(player_name, cleaned_data)
+        if data.attrs.get('complete'):
+            with span('cache.cleaned_games', 'cache', hit=False, rows=len(cleaned_data)):
+                self._write(cleaned_data, path)
+        return cleaned_data
+
+    def iter_months(self, player_name, months):
+        """
+        Lazily yields the cleaned games of a player month by month.
+
+        :param player_name: The player's username on Chess.com.
+        :param months: An iterable of (year, month) tuples.
+        :return: An iterator of ((year, month), DataFrame) pairs, skipping months without games.
+        """
+        for year, month in months:
+            cleaned_data = self.load(player_name, year, month)
+            if cleaned_data is not None:
+                yield (year, month), cleaned_data
+
+    def load_range(self, player_name, months):
+        """
+        Returns the cleaned games of a player over several months as one DataFrame.
+
+        :param player_name: The player's username on Chess.com.
+        :param months: An iterable of (year, month) tuples.
+        :return: The concatenated DataFrame, or None if there are no games.
+        """
+        frames = [cleaned_data for _, cleaned_data in self.iter_months(player_name, months)]
+        if not frames:
+            return None
+        return ChessDataCleaner.apply_schema(pd.concat(frames, ignore_index=True), player_name)
+
+    def _write(self, cleaned_data, path):
+        """
+        Atomically writes a cleaned frame to the cache.
+
+        :param cleaned_data: The cleaned DataFrame.
+        :param path: The destination path.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        cleaned_data.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
@@ -0,0 +1,207 @@
+import array
+import codecs
+import json
+
+import numpy as np
+import pandas as pd
+
+# Columns materialized from each game, mapped to their JSON path and buffer type.
+# Only what ChessDataCleaner and ChessDataVisualizer use is kept, so the large
+# 'pgn', 'tcn' and 'fen' strings never reach the DataFrame.
+GAME_COLUMNS = {
+    'time_control': (('time_control',), 'str'),
+    'end_time': (('end_time',), 'int'),
+    'rated': (('rated',), 'bool'),
+    'time_class': (('time_class',), 'str'),
+    'rules': (('rules',), 'str'),
+    'eco': (('eco',), 'str'),
+    'accuracies.white': (('accuracies', 'white'), 'float'),
+    'accuracies.black': (('accuracies', 'black'), 'float'),
+    'white.rating': (('white', 'rating'), 'int'),
+    'white.result': (('white', 'result'), 'str'),
+    'white.username': (('white', 'username'), 'str'),
+    'black.rating': (('black', 'rating'), 'int'),
+    'black.result': (('black', 'result'), 'str'),
+    'black.username': (('black', 'username'), 'str'),
+}
+
+# Columns that are only added to the frame when at least one game has a value
+OPTIONAL_COLUMNS = {'accuracies.white', 'accuracies.black'}
+
+CHUNK_SIZE = 64 * 1024
+
+_BUFFER_TYPES = {'int': 'q', 'float': 'd', 'bool': 'b'}
+_WHITESPACE = ' \t\n\r,'
+
+
+def iter_chunks(body, chunk_size=CHUNK_SIZE):
+    """
+    Splits an in-memory response body into chunks without copying it.
+
+    :param body: The raw response body (bytes).
+    :param chunk_size: The size of each chunk in bytes.
+    :return: An iterator of memoryview chunks.
+    """
+    view = memoryview(body)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+class _TextWindow:
+    """
+    The decoded part of a chunked document that has not been consumed yet.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.exhausted = False
+
+    def read_more(self):
+        """
+        Appends the next chunk to the text, or marks the document as exhausted.
+        """
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            self.text += self.utf8.decode(b'', final=True)
+            return
+        self.text += chunk if isinstance(chunk, str) else self.utf8.decode(chunk)
+
+    def discard(self, pos):
+        """
+        Drops the text before a position, which then becomes position 0.
+        """
+        self.text = self.text[pos:]
+
+
+def _find_array(window, key):
+    """
+    Returns the position just after the opening bracket of an array, or None if there is none.
+    """
+    marker = f'"{key}"'
+    while True:
+        start = window.text.find(marker)
+        bracket = window.text.find('[', start + len(marker)) if start >= 0 else -1
+        if bracket >= 0:
+            return bracket + 1
+        if window.exhausted:
+            return None
+        window.read_more()
+
+
+def _skip_separators(text, pos):
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _next_item(window, decoder, pos):
+    """
+    Decodes the array item at a position, reading more chunks until it is complete.
+
+    :return: A tuple (item, position after it), or None at the end of the array.
+    """
+    while True:
+        pos = _skip_separators(window.text, pos)
+        if window.text[pos:pos + 1] == ']':
+            return None
+        try:
+            if pos >= len(window.text):
+                raise json.JSONDecodeError("Incomplete document", window.text, pos)
+            return decoder.raw_decode(window.text, pos)
+        except json.JSONDecodeError:
+            if window.exhausted:
+                raise
+            window.discard(pos)
+            pos = 0
+            window.read_more()
+
+
+def iter_games(chunks, key='games'):
+    """
+    Incrementally decodes the objects of a top-level JSON array, one game at a time.
+
+    Only a small window of the body is held as text and each game dictionary can be
+    discarded as soon as it has been consumed, instead of materializing the whole list.
+
+    :param chunks: An iterable of bytes (or str) chunks of the JSON document.
+    :param key: The key of the array inside the top-level object.
+    :return: An iterator of game dictionaries.
+    """
+    decoder = json.JSONDecoder()
+    window = _TextWindow(chunks)
+    pos = _find_array(window, key)
+    if pos is None:
+        return
+
+    while True:
+        item = _next_item(window, decoder, pos)
+        if item is None:
+            return
+        game, pos = item
+        yield game
+
+
+def parse_games(chunks, columns=None):
+    """
+    Parses a monthly archive into a DataFrame holding only the requested columns.
+
+    Values are appended to typed column buffers while the archive is decoded, so no
+    intermediate list of games or wide normalized frame is ever built.
+
+    :param chunks: An iterable of bytes (or str) chunks of the archive JSON.
+    :param columns: A mapping of column name to (JSON path, type) (optional, defaults to GAME_COLUMNS).
+    :return: A pandas DataFrame containing the games, or None if there are none.
+    """
+    columns = columns or GAME_COLUMNS
+    buffers = {
+        name: array.array(_BUFFER_TYPES[kind]) if kind in _BUFFER_TYPES else []
+        for name, (_, kind) in columns.items()
+    }
+    seen = set()
+    count = 0
+
+    for game in iter_games(chunks):
+        count += 1
+        for name, (path, kind) in columns.items():
+            value = _lookup(game, path)
+            if value is not None:
+                seen.add(name)
+            _append(buffers[name], kind, value)
+
+    if not count:
+        return None
+
+    data = {
+        name: np.frombuffer(buffer, dtype=buffer.typecode) if isinstance(buffer, array.array) else buffer
+        for name, buffer in buffers.items()
+        if name not in OPTIONAL_COLUMNS or name in seen
+    }
+    if 'rated' in data:
+        data['rated'] = data['rated'].astype(bool)
+    return pd.DataFrame(data)
+
+
+def _lookup(game, path):
+    """
+    Returns the value at a JSON path of a game, or None if any part of it is missing.
+    """
+    value = game
+    for part in path:
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _append(buffer, kind, value):
+    """
+    Appends a value to a column buffer, filling in missing numbers.
+    """
+    if kind == 'float':
+        buffer.append(np.nan if value is None else value)
+    elif kind in _BUFFER_TYPES:
+        buffer.append(value or 0)
+    else:
+        buffer.append(value)
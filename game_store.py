@@ -0,0 +1,173 @@
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+StoredArchive = namedtuple(
+    "StoredArchive",
+    ["player", "year", "month", "body", "etag", "last_modified", "fetched_at", "complete"],
+)
+
+# Characters allowed in a Chess.com username
+USERNAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def player_key(player_name):
+    """
+    Returns the key a player's data is stored and cached under.
+
+    Chess.com usernames are case-insensitive, so "Hikaru" and "hikaru" share one
+    key. Names are validated first, since the key also ends up in file paths.
+
+    :param player_name: The player's username on Chess.com, in any case.
+    :return: The lowercased username.
+    :raises ValueError: If the name is not a valid Chess.com username.
+    """
+    if not isinstance(player_name, str) or not USERNAME_PATTERN.fullmatch(player_name):
+        raise ValueError(f"Invalid Chess.com username: {player_name!r}")
+    return player_name.lower()
+
+
+class GameStore:
+    """
+    A class to persist monthly Chess.com game archives in a local SQLite database.
+
+    Every archive is stored once per (player, year, month) together with the
+    validators returned by the API, so the current month can be revalidated with
+    a conditional request and closed months never have to be downloaded again.
+    """
+
+    DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "chess.db")
+
+    # Games finishing around midnight UTC can show up in an archive a little late,
+    # so a month is only treated as closed once this much time has passed.
+    CLOSED_MONTH_GRACE = datetime.timedelta(hours=12)
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS archives (
+            player TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (player, year, month)
+        )
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Initialize the GameStore. The database is opened lazily on first use.
+
+        :param path: Path to the SQLite database file.
+        """
+        self.path = path
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Open a new connection to the database, creating the schema if needed.
+
+        :return: A sqlite3 connection.
+        """
+        if not self._initialized:
+            # The database is not shipped with the repository, so its directory may not exist yet
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    with connection:
+                        connection.execute(self.SCHEMA)
+                    self._initialized = True
+        return connection
+
+    @classmethod
+    def is_closed(cls, year, month, now=None):
+        """
+        Check whether a month is over, meaning its archive can no longer change.
+
+        :param year: The archive year.
+        :param month: The archive month.
+        :param now: The reference time as a UTC datetime (defaults to the current time).
+        :return: True if the month has ended, False otherwise.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        next_month = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+        return now >= next_month + cls.CLOSED_MONTH_GRACE
+
+    def get(self, player_name, year, month):
+        """
+        Returns the stored archive for a player and month.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The archive year.
+        :param month: The archive month.
+        :return: A StoredArchive, or None if the month has not been stored yet.
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT player, year, month, body, etag, last_modified, fetched_at, complete "
+                "FROM archives WHERE player = ? AND year = ? AND month = ?",
+                (player_key(player_name), int(year), int(month)),
+            ).fetchone()
+        finally:
+            connection.close()
+
+        if row is None:
+            return None
+        return StoredArchive(*row[:7], bool(row[7]))
+
+    def put(self, player_name, year, month, body, etag=None, last_modified=None):
+        """
+        Stores (or replaces) the archive for a player and month.
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The archive year.
+        :param month: The archive month.
+        :param body: The raw JSON response body.
+        :param etag: The ETag header returned by the API (optional).
+        :param last_modified: The Last-Modified header returned by the API (optional).
+        """
+        year, month = int(year), int(month)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO archives "
+                    "(player, year, month, body, etag, last_modified, fetched_at, complete) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        player_key(player_name), year, month, sqlite3.Binary(body),
+                        etag, last_modified, time.time(), int(self.is_closed(year, month)),
+                    ),
+                )
+        finally:
+            connection.close()
+
+    def touch(self, player_name, year, month):
+        """
+        Marks a stored archive as revalidated (e.g. after a 304 Not Modified response).
+
+        :param player_name: The player's username on Chess.com.
+        :param year: The archive year.
+        :param month: The archive month.
+        """
+        year, month = int(year), int(month)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "UPDATE archives SET fetched_at = ?, complete = ? "
+                    "WHERE player = ? AND year = ? AND month = ?",
+                    (time.time(), int(self.is_closed(year, month)), player_key(player_name), year, month),
+                )
+        finally:
+            connection.close()
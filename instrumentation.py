@@ -0,0 +1,187 @@
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Every finished span is logged here as one JSON object at DEBUG level
+span_logger = logging.getLogger(f"{__name__}.spans")
+
+# The trace (e.g. one page load) the current code runs for
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Recorder:
+    """
+    A thread-safe buffer of the most recent spans.
+    """
+
+    def __init__(self, maxsize=20000):
+        """
+        Initialize the Recorder.
+
+        :param maxsize: The number of spans kept; older spans are dropped.
+        """
+        self._spans = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self._spans.append(record)
+
+    def spans(self, trace=None):
+        """
+        Returns the recorded spans.
+
+        :param trace: Only return the spans of this trace (optional).
+        :return: A list of span dictionaries, oldest first.
+        """
+        with self._lock:
+            spans = list(self._spans)
+        if trace is not None:
+            spans = [record for record in spans if record['trace'] == trace]
+        return spans
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+recorder = Recorder()
+
+
+def new_trace(name=None):
+    """
+    Starts a new trace in the current context, e.g. for one page load.
+
+    :param name: A readable prefix of the trace id (optional).
+    :return: The trace id.
+    """
+    trace = f"{name}-{uuid.uuid4().hex[:8]}" if name else uuid.uuid4().hex[:8]
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    """
+    Returns the id of the trace the current code runs for, or None.
+    """
+    return _trace.get()
+
+
+def submit(executor, function, *args, **kwargs):
+    """
+    Submits a function to an executor so that it runs in a copy of the current context.
+
+    Worker threads do not inherit context variables, so without this the spans of
+    background work would not belong to the trace that started it.
+
+    :param executor: A concurrent.futures executor.
+    :param function: The callable to run.
+    :return: A Future.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
+
+
+@contextlib.contextmanager
+def span(name, category, **attributes):
+    """
+    Times a block of code and records it as a span.
+
+    The yielded dictionary holds the span's attributes, so the block can add
+    what is only known at the end (response size, cache hit, ...).
+
+    :param name: The span name, e.g. 'http.archive' or 'clean.calculate_ratings'.
+    :param category: The kind of work: 'http', 'cache', 'parse', 'clean', 'aggregate' or 'render'.
+    :param attributes: Initial attributes of the span.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            'trace': _trace.get(),
+            'name': name,
+            'category': category,
+            'start': started_at,
+            'duration_ms': (time.perf_counter() - start) * 1000,
+            'thread': threading.current_thread().name,
+            'error': error,
+            **attributes,
+        }
+        recorder.record(record)
+        if span_logger.isEnabledFor(logging.DEBUG):
+            span_logger.debug(json.dumps(record, default=_json_default))
+
+
+def spans_frame(trace=None):
+    """
+    Returns the recorded spans as a DataFrame.
+
+    :param trace: Only return the spans of this trace (optional).
+    :return: A DataFrame with one row per span.
+    """
+    return pd.DataFrame(recorder.spans(trace))
+
+
+def summary(trace=None):
+    """
+    Summarizes the recorded spans per name.
+
+    :param trace: Only summarize the spans of this trace (optional).
+    :return: A DataFrame indexed by category and name with count, total, mean, p50, p95
+        and max durations in milliseconds, plus bytes transferred, cache hits and coalesced
+        loads where recorded.
+    """
+    spans = spans_frame(trace)
+    if spans.empty:
+        return pd.DataFrame(columns=['count', 'total_ms', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms'])
+
+    grouped = spans.groupby(['category', 'name'])
+    durations = grouped['duration_ms']
+    result = pd.DataFrame({
+        'count': durations.size(),
+        'total_ms': durations.sum(),
+        'mean_ms': durations.mean(),
+        'p50_ms': durations.quantile(0.5),
+        'p95_ms': durations.quantile(0.95),
+        'max_ms': durations.max(),
+    })
+    if 'bytes' in spans.columns:
+        result['bytes'] = grouped['bytes'].sum(min_count=1)
+    if 'hit' in spans.columns:
+        hits = spans['hit'].astype('float64')
+        result['hit_rate'] = hits.groupby([spans['category'], spans['name']]).mean()
+    if 'coalesced' in spans.columns:
+        coalesced = spans['coalesced'].astype('float64')
+        result['coalesced'] = coalesced.groupby([spans['category'], spans['name']]).sum(min_count=1)
+    return result.round(3)
+
+
+def export(path, trace=None):
+    """
+    Writes the recorded spans to a file, one JSON object per line.
+
+    :param path: The output file.
+    :param trace: Only export the spans of this trace (optional).
+    """
+    with open(path, 'w') as f:
+        for record in recorder.spans(trace):
+            f.write(json.dumps(record, default=_json_default) + '\n')
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
@@ -0,0 +1,258 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Columns needed from the archive to extract move statistics
+MOVE_COLUMNS = {
+    'end_time': (('end_time',), 'int'),
+    'time_class': (('time_class',), 'str'),
+    'time_control': (('time_control',), 'str'),
+    'pgn': (('pgn',), 'str'),
+    'tcn': (('tcn',), 'str'),
+}
+
+# Chess.com's TCN alphabet: every ply is two characters, the square the piece leaves
+# and the square it lands on (a1 = 0 ... h8 = 63). Indices above 63 in the second
+# character encode a promotion, indices above 75 in the first character a drop.
+TCN_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!?{~}(^)[_]@#$,./&-*++="
+PIECES = "qnrbkp"
+
+_TCN_LOOKUP = np.full(256, -1, dtype=np.int16)
+for _index, _char in reversed(list(enumerate(TCN_ALPHABET))):
+    _TCN_LOOKUP[ord(_char)] = _index
+
+_CLOCK_TAG = b"[%clk "
+# Bytes a clock value reaches past its tag at most: "hhh:mm:ss.f]"
+_CLOCK_PADDING = len(_CLOCK_TAG) + 12
+
+# Number of PGNs scanned per NumPy buffer
+BATCH_SIZE = 10000
+
+MoveStats = namedtuple(
+    "MoveStats",
+    [
+        "move_count",         # plies per game (int32)
+        "base_time",          # initial clock in seconds per game, NaN for daily games (float32)
+        "increment",          # increment in seconds per game (float32)
+        "time_pressure_ply",  # first ply whose mover dropped below the pressure threshold, -1 if never (int32)
+        "move_offsets",       # CSR offsets into the per-ply arrays below (int64, n_games + 1)
+        "from_square",        # origin square per ply, -1 for drops (int8)
+        "to_square",          # destination square per ply (int8)
+        "promotion",          # index into PIECES of the promoted/dropped piece, -1 otherwise (int8)
+        "clock_offsets",      # CSR offsets into the per-clock arrays below (int64, n_games + 1)
+        "clock",              # clock remaining after each annotated ply in seconds (float32)
+        "time_spent",         # thinking time for each annotated ply in seconds (float32)
+    ],
+)
+
+
+def _offsets(lengths):
+    """
+    Converts per-game lengths into CSR offsets.
+
+    :param lengths: An integer array of lengths.
+    :return: An int64 array of len(lengths) + 1 offsets.
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _parse_digits(buffer, starts, lengths, max_digits):
+    """
+    Parses unsigned decimal numbers out of a byte buffer for many positions at once.
+
+    :param buffer: A uint8 array.
+    :param starts: The start position of each number.
+    :param lengths: The number of digits of each number.
+    :param max_digits: An upper bound on lengths.
+    :return: An int64 array of values.
+    """
+    values = np.zeros(len(starts), dtype=np.int64)
+    for k in range(max_digits):
+        has_digit = k < lengths
+        digit = buffer[np.minimum(starts + k, len(buffer) - 1)].astype(np.int64) - 48
+        values = np.where(has_digit, values * 10 + digit, values)
+    return values
+
+
+def decode_tcn(tcns):
+    """
+    Decodes TCN move strings of many games into flat square arrays.
+
+    :param tcns: A sequence of TCN strings (None or NaN for missing).
+    :return: A tuple (move_offsets, from_square, to_square, promotion).
+    """
+    tcns = ['' if not isinstance(tcn, str) else tcn for tcn in tcns]
+    lengths = np.fromiter(map(len, tcns), dtype=np.int64, count=len(tcns)) // 2
+    codes = _TCN_LOOKUP[np.frombuffer(''.join(tcns).encode('ascii'), dtype=np.uint8)].reshape(-1, 2)
+
+    origin = codes[:, 0].astype(np.int16)
+    target = codes[:, 1].astype(np.int16)
+    promotion = np.full(len(codes), -1, dtype=np.int16)
+
+    promoted = target > 63
+    promotion[promoted] = (target[promoted] - 64) // 3
+    target = np.where(
+        promoted,
+        origin + np.where(origin < 16, -8, 8) + (target - 1) % 3 - 1,
+        target,
+    )
+
+    dropped = origin > 75
+    promotion[dropped] = origin[dropped] - 79
+    origin = np.where(dropped, -1, origin)
+
+    return _offsets(lengths), origin.astype(np.int8), target.astype(np.int8), promotion.astype(np.int8)
+
+
+def parse_time_controls(time_controls):
+    """
+    Splits time control strings such as "180+2" into base time and increment.
+
+    :param time_controls: A sequence of time control strings.
+    :return: A tuple of float32 arrays (base_time, increment); daily games get NaN.
+    """
+    parts = pd.Series(time_controls, dtype=object).astype(str).str.extract(r'^(\d+)(?:\+(\d+))?$')
+    base_time = parts[0].astype(float).to_numpy(dtype=np.float32)
+    increment = parts[1].astype(float).fillna(0).to_numpy(dtype=np.float32)
+    return base_time, increment
+
+
+def extract_clocks(pgns, batch_size=BATCH_SIZE):
+    """
+    Extracts every [%clk h:mm:ss(.f)] annotation of many PGNs into a flat array.
+
+    The PGNs are scanned as byte buffers with NumPy; no per-move Python objects are built.
+
+    :param pgns: A sequence of PGN strings (None or NaN for missing).
+    :param batch_size: The number of games scanned at once, bounding the size of the buffers.
+    :return: A tuple (clock_offsets, clock) with clocks in seconds.
+    """
+    pgns = [pgn if isinstance(pgn, str) else '' for pgn in pgns]
+    batches = [_extract_clocks_batch(pgns[start:start + batch_size]) for start in range(0, len(pgns), batch_size)]
+    if not batches:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    clock_counts = np.concatenate([counts for counts, _ in batches])
+    return _offsets(clock_counts), np.concatenate([clock for _, clock in batches])
+
+
+def _extract_clocks_batch(pgns):
+    """
+    Extracts the clock annotations of a batch of PGNs.
+
+    :param pgns: A list of PGN strings.
+    :return: A tuple (clock_counts, clock) with the number of clocks per game and clocks in seconds.
+    """
+    # Padding lets every tag's value be read without bounds checks
+    encoded = [pgn.encode('utf-8') for pgn in pgns]
+    game_starts = _offsets(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+    buffer = np.frombuffer(b''.join(encoded) + bytes(_CLOCK_PADDING), dtype=np.uint8)
+    del encoded
+
+    # Candidate tags start at a '%' and are verified against the full "[%clk " prefix
+    percent = np.flatnonzero(buffer == ord('%'))
+    percent = percent[percent >= 1]
+    is_clock = np.ones(len(percent), dtype=bool)
+    for k, char in enumerate(_CLOCK_TAG):
+        is_clock &= buffer[percent - 1 + k] == char
+    value_starts = percent[is_clock] - 1 + len(_CLOCK_TAG)
+
+    # Values are "h:mm:ss" or "h:mm:ss.f" with one to three hour digits, so every
+    # position is found by looking a few bytes past the tag, never across the buffer
+    hour_digits = np.full(len(value_starts), 3)
+    for digits in (2, 1):
+        hour_digits[buffer[value_starts + digits] == ord(':')] = digits
+    first_colon = value_starts + hour_digits
+    seconds_end = first_colon + 6
+    has_tenths = buffer[seconds_end] == ord('.')
+    value_ends = np.where(has_tenths, seconds_end + 2, seconds_end)
+    is_clock = buffer[value_ends] == ord(']')
+    value_starts, hour_digits, seconds_end, has_tenths = (
+        values[is_clock] for values in (value_starts, hour_digits, seconds_end, has_tenths)
+    )
+
+    two_digits = np.full(len(value_starts), 2)
+    hours = _parse_digits(buffer, value_starts, hour_digits, 3)
+    minutes = _parse_digits(buffer, seconds_end - 5, two_digits, 2)
+    seconds = _parse_digits(buffer, seconds_end - 2, two_digits, 2)
+    tenths = np.where(has_tenths, buffer[seconds_end + 1].astype(np.int64) - 48, 0)
+    clock = (hours * 3600 + minutes * 60 + seconds + tenths / 10).astype(np.float32)
+
+    game_ids = np.searchsorted(game_starts, value_starts, side='right') - 1
+    return np.bincount(game_ids, minlength=len(pgns)), clock
+
+
+def extract_move_stats(dataframe, pressure_fraction=0.1):
+    """
+    Computes move statistics for a batch of games.
+
+    :param dataframe: A DataFrame with 'pgn', 'tcn' and 'time_control' columns (see MOVE_COLUMNS).
+    :param pressure_fraction: Share of the base time below which a player is considered in time trouble.
+    :return: A MoveStats tuple of NumPy arrays.
+    """
+    move_offsets, from_square, to_square, promotion = decode_tcn(dataframe['tcn'].tolist())
+    clock_offsets, clock = extract_clocks(dataframe['pgn'].tolist())
+    base_time, increment = parse_time_controls(dataframe['time_control'].tolist())
+
+    n_games = len(dataframe)
+    clock_counts = np.diff(clock_offsets)
+    game_ids = np.repeat(np.arange(n_games), clock_counts)
+    ply = np.arange(len(clock)) - clock_offsets[game_ids]
+
+    # A player's previous clock is two plies back; their first move starts from the base time
+    previous = np.empty_like(clock)
+    previous[2:] = clock[:-2]
+    first_moves = ply < 2
+    previous[first_moves] = base_time[game_ids[first_moves]]
+    time_spent = previous - clock + np.where(first_moves, 0, increment[game_ids])
+
+    in_pressure = clock < base_time[game_ids] * pressure_fraction
+    time_pressure_ply = np.full(n_games, -1, dtype=np.int32)
+    pressured_games, first_index = np.unique(game_ids[in_pressure], return_index=True)
+    time_pressure_ply[pressured_games] = ply[in_pressure][first_index]
+
+    return MoveStats(
+        move_count=np.diff(move_offsets).astype(np.int32),
+        base_time=base_time,
+        increment=increment,
+        time_pressure_ply=time_pressure_ply,
+        move_offsets=move_offsets,
+        from_square=from_square,
+        to_square=to_square,
+        promotion=promotion,
+        clock_offsets=clock_offsets,
+        clock=clock,
+        time_spent=time_spent.astype(np.float32),
+    )
+
+
+def move_totals(dataframe, stats=None):
+    """
+    Sums game length, clock usage and time trouble per time class.
+
+    The totals of several months add up, so a career can be summarized one month
+    at a time.
+
+    :param dataframe: A DataFrame with the MOVE_COLUMNS.
+    :param stats: The MoveStats of the DataFrame (optional, extracted if not given).
+    :return: A DataFrame indexed by time_class with 'games', 'plies', 'timed_plies' (plies
+        with a known thinking time), 'seconds' (their total thinking time) and
+        'time_pressure' (games in which either player got into time trouble) columns.
+    """
+    stats = stats if stats is not None else extract_move_stats(dataframe)
+    n_games = len(dataframe)
+    game_ids = np.repeat(np.arange(n_games), np.diff(stats.clock_offsets))
+    timed = ~np.isnan(stats.time_spent)
+
+    totals = pd.DataFrame({
+        'time_class': dataframe['time_class'].to_numpy(),
+        'games': 1,
+        'plies': stats.move_count.astype(np.int64),
+        'timed_plies': np.bincount(game_ids[timed], minlength=n_games),
+        'seconds': np.bincount(game_ids[timed], weights=stats.time_spent[timed], minlength=n_games),
+        'time_pressure': (stats.time_pressure_ply >= 0).astype(np.int64),
+    })
+    return totals.groupby('time_class', observed=True).sum()
@@ -0,0 +1,292 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_cleaner import ChessDataCleaner
+from fetch_games import ChessAPI
+from game_parser import GAME_COLUMNS
+from game_store import player_key
+
+# Columns needed from the archive to index openings
+OPENING_COLUMNS = {**GAME_COLUMNS, 'pgn': (('pgn',), 'str')}
+
+# Number of plies indexed per game
+MAX_PLIES = 12
+
+_HEADERS = re.compile(r'^\[.*?\]\s*$', re.MULTILINE)
+_COMMENTS = re.compile(r'\{[^}]*\}|\([^)]*\)|\$\d+')
+_MOVE_NUMBERS = re.compile(r'\d+\.(?:\.\.)?')
+_RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+
+COLORS = ('white', 'black')
+
+
+def split_moves(movetext, max_plies=MAX_PLIES):
+    """
+    Splits a SAN move sequence such as "1.e4 c5 2.Nf3" into moves.
+
+    :param movetext: The moves, with or without move numbers, comments or a result.
+    :param max_plies: The maximum number of moves returned.
+    :return: A list of SAN moves.
+    """
+    movetext = _MOVE_NUMBERS.sub(' ', _COMMENTS.sub(' ', movetext))
+    return [move.rstrip('!?') for move in movetext.split() if move not in _RESULTS][:max_plies]
+
+
+def opening_moves(pgns, max_plies=MAX_PLIES):
+    """
+    Extracts the first plies of many PGNs.
+
+    The headers, clock comments and move numbers are stripped with vectorized string
+    operations over the whole batch before each game's moves are split.
+
+    :param pgns: A sequence of PGN strings.
+    :param max_plies: The number of plies kept per game.
+    :return: A list with a list of SAN moves per game.
+    """
+    movetext = (
+        pd.Series(pgns, dtype=object).fillna('').astype(str)
+        .str.replace(_HEADERS, '', regex=True)
+        .str.replace(_COMMENTS, ' ', regex=True)
+        .str.replace(_MOVE_NUMBERS, ' ', regex=True)
+        .str.split()
+    )
+    return [[move for move in moves if move not in _RESULTS][:max_plies] for moves in movetext]
+
+
+class OpeningIndex:
+    """
+    A class holding a player's opening repertoire as a prefix tree of moves.
+
+    Nodes are addressed through a hash table keyed by (parent node, move), and
+    every node keeps the player's wins, draws, losses and opponent rating sum in
+    NumPy arrays. Games are added incrementally, month by month, so querying a
+    line costs one lookup per move regardless of how many games are indexed.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache", "openings")
+
+    STATS = ['games', 'wins', 'draws', 'losses', 'opponent_rating_sum']
+
+    def __init__(self, player_name, max_plies=MAX_PLIES):
+        """
+        Initialize an empty OpeningIndex. Node 0 is the root for games played as
+        white and node 1 the root for games played as black.
+
+        :param player_name: The player's username on Chess.com.
+        :param max_plies: The number of plies indexed per game.
+        """
+        self.player_name = player_name
+        self.max_plies = max_plies
+        self.version = ChessDataCleaner.version_hash()
+        self.nodes = {}
+        self.children = [[], []]
+        self.moves = [None, None]
+        self.stats = np.zeros((len(self.STATS), 1024), dtype=np.int64)
+        # Number of games already indexed per (year, month); archives only grow at the end
+        self.ingested = {}
+        # Months indexed from their final archive, which are never fetched again
+        self.complete = set()
+        self._lock = threading.RLock()
+
+    def _node(self, parent, move):
+        """
+        Returns the node reached by playing a move from a parent node, creating it if needed.
+        """
+        key = (parent, move)
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = len(self.moves)
+            self.moves.append(move)
+            self.children.append([])
+            self.children[parent].append(node)
+        return node
+
+    def add_games(self, cleaned_data, pgns):
+        """
+        Adds games to the index.
+
+        :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+        :param pgns: The PGN of every game, in the same order.
+        """
+        is_white = ChessDataCleaner.plays_white(cleaned_data, self.player_name)
+        result = cleaned_data['result'].astype(str).to_numpy()
+        opponent_rating = cleaned_data["opponent's rating"].to_numpy(dtype=np.int64)
+
+        with self._lock:
+            # Walk the tree once per game, collecting (game, node) pairs
+            game_ids, node_ids = [], []
+            for game, moves in enumerate(opening_moves(pgns, self.max_plies)):
+                node = 0 if is_white[game] else 1
+                game_ids.append(game)
+                node_ids.append(node)
+                for move in moves:
+                    node = self._node(node, move)
+                    game_ids.append(game)
+                    node_ids.append(node)
+
+            if self.stats.shape[1] < len(self.moves):
+                grown = np.zeros((len(self.STATS), 2 * len(self.moves)), dtype=np.int64)
+                grown[:, :self.stats.shape[1]] = self.stats
+                self.stats = grown
+
+            game_ids = np.asarray(game_ids, dtype=np.int64)
+            node_ids = np.asarray(node_ids, dtype=np.int64)
+            values = np.stack([
+                np.ones(len(result), dtype=np.int64),
+                result == 'win',
+                result == 'draw',
+                result == 'loss',
+                opponent_rating,
+            ]).astype(np.int64)
+            for row in range(len(self.STATS)):
+                self.stats[row] += np.bincount(node_ids, weights=values[row, game_ids], minlength=self.stats.shape[1]).astype(np.int64)
+
+    def ingest_month(self, year, month):
+        """
+        Indexes the games of a month that have not been indexed yet.
+
+        :param year: The year of the games.
+        :param month: The month of the games.
+        :return: The number of newly indexed games.
+        """
+        key = (int(year), int(month))
+        with self._lock:
+            if key in self.complete:
+                return 0
+
+            data = ChessAPI.fetch_games(self.player_name, year, month, columns=OPENING_COLUMNS)
+            if data is None:
+                return 0
+            if data.attrs.get('complete'):
+                self.complete.add(key)
+
+            done = self.ingested.get(key, 0)
+            if len(data) <= done:
+                return 0
+
+            data = data.iloc[done:].reset_index(drop=True)
+            pgns = data['pgn'].tolist()
+            cleaned_data = ChessDataCleaner(data, self.player_name).clean_data()
+            self.add_games(cleaned_data, pgns)
+            self.ingested[key] = done + len(data)
+            return len(data)
+
+    def query(self, moves, color=None):
+        """
+        Returns the player's results after a sequence of moves.
+
+        :param moves: The moves, as a SAN string such as "1.e4 c5 2.Nf3" or a list of SAN moves.
+        :param color: 'white' or 'black' to only count games played with that color (optional).
+        :return: A dictionary with the totals, the score and the continuations, or None if the line was never played.
+        """
+        if isinstance(moves, str):
+            moves = split_moves(moves, max_plies=len(moves))
+        roots = [COLORS.index(color)] if color else [0, 1]
+
+        with self._lock:
+            nodes = [node for node in (self._find(root, moves) for root in roots) if node is not None]
+            if not nodes:
+                return None
+
+            totals = self.stats[:, nodes].sum(axis=1)
+            continuations = {}
+            for node in nodes:
+                for child in self.children[node]:
+                    continuations[self.moves[child]] = continuations.get(self.moves[child], 0) + self.stats[:, child]
+
+        return {
+            **self._summary(totals),
+            'continuations': pd.DataFrame(
+                [{'move': move, **self._summary(stats)} for move, stats in continuations.items()],
+                columns=['move', 'games', 'wins', 'draws', 'losses', 'score', 'avg_opponent_rating'],
+            ).sort_values('games', ascending=False, ignore_index=True),
+        }
+
+    def _find(self, node, moves):
+        """
+        Follows moves from a node, returning the node reached or None if the line was never played.
+        """
+        for move in moves:
+            node = self.nodes.get((node, move))
+            if node is None:
+                return None
+        return node
+
+    def _summary(self, stats):
+        games, wins, draws, losses, opponent_rating_sum = (int(value) for value in stats)
+        return {
+            'games': games,
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'score': (wins + draws / 2) / games if games else None,
+            'avg_opponent_rating': opponent_rating_sum / games if games else None,
+        }
+
+    @classmethod
+    def path(cls, player_name, directory=DEFAULT_DIRECTORY):
+        """
+        Returns the file an index is saved to.
+        """
+        return os.path.join(directory, f"{player_key(player_name)}.npz")
+
+    @classmethod
+    def load(cls, player_name, directory=DEFAULT_DIRECTORY):
+        """
+        Loads a saved index, or creates an empty one if there is none or the cleaner changed.
+
+        :param player_name: The player's username on Chess.com.
+        :param directory: The directory indexes are saved in.
+        :return: An OpeningIndex.
+        """
+        index = cls(player_name)
+        path = cls.path(player_name, directory)
+        if not os.path.exists(path):
+            return index
+
+        # Only plain arrays are read back, never pickled objects
+        with np.load(path, allow_pickle=False) as saved:
+            metadata = json.loads(saved['metadata'].item())
+            if metadata['version'] != index.version or metadata['max_plies'] != index.max_plies:
+                return index
+            for parent, move in zip(saved['parents'][2:].tolist(), saved['moves'][2:].tolist()):
+                index._node(parent, move)
+            index.stats = saved['stats'].copy()
+        index.ingested = {(year, month): games for year, month, games in metadata['ingested']}
+        index.complete = {tuple(key) for key in metadata['complete']}
+        return index
+
+    def save(self, directory=DEFAULT_DIRECTORY):
+        """
+        Atomically saves the index as NumPy arrays: every node's parent and move, in
+        creation order, and the stats.
+
+        :param directory: The directory indexes are saved in.
+        """
+        path = self.path(self.player_name, directory)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            parents = np.full(len(self.moves), -1, dtype=np.int64)
+            for (parent, _), node in self.nodes.items():
+                parents[node] = parent
+            metadata = {
+                'version': self.version,
+                'max_plies': self.max_plies,
+                'ingested': [[year, month, games] for (year, month), games in sorted(self.ingested.items())],
+                'complete': sorted(self.complete),
+            }
+            with open(temp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    parents=parents,
+                    moves=np.array([move or '' for move in self.moves], dtype=str),
+                    stats=self.stats[:, :len(self.moves)],
+                    metadata=np.array(json.dumps(metadata)),
+                )
+        os.replace(temp_path, path)
@@ -0,0 +1,272 @@
+import hashlib
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import density
+from aggregates import HISTOGRAM_EDGES, GameAggregates
+from caching import frame_version
+from fetch_games import ChessAPI
+from game_cache import month_range
+from instrumentation import span, submit
+from timeseries import daily_ohlc
+
+# Per time class sums over the games with an accuracy, x being the opponent's rating
+# and y the player's accuracy; enough to fit a least squares line without the games
+REGRESSION_SUMS = ['n', 'x', 'y', 'xx', 'xy', 'yy']
+
+# Per time class and opponent rating bin (HISTOGRAM_EDGES) sums of the accuracies
+ACCURACY_BIN_SUMS = ['n', 'y', 'yy']
+
+# Months loaded ahead of the one being aggregated
+PREFETCH_MONTHS = 2
+
+
+def available_months(player_name, start, end):
+    """
+    Lists the months of a range the player has a game archive for.
+
+    :param player_name: The player's username on Chess.com.
+    :param start: The first month as a (year, month) tuple.
+    :param end: The last month as a (year, month) tuple.
+    :return: A list of (year, month) tuples in chronological order.
+    """
+    available = {ChessAPI._parse_archive_url(url) for url in ChessAPI.fetch_game_archives(player_name)}
+    return [month for month in month_range(start, end) if month in available]
+
+
+class RangeAggregates:
+    """
+    Running aggregates of a player's games over a range of months.
+
+    Months are added one cleaned frame at a time and only summaries are kept:
+    monthly counts and opponent rating histograms, daily rating values, accuracy
+    regression sums and a bounded random sample of accuracy points. Memory therefore
+    grows with the number of days and time classes, not with the number of games.
+    """
+
+    # Accuracy points kept per time class for scatter plots
+    SAMPLE_SIZE = 1000
+
+    def __init__(self, player_name, sample_size=SAMPLE_SIZE, seed=0):
+        """
+        Initialize empty RangeAggregates.
+
+        :param player_name: The player's username on Chess.com.
+        :param sample_size: The number of accuracy points sampled per time class.
+        :param seed: The random seed of the sample.
+        """
+        self.player_name = player_name
+        self.sample_size = sample_size
+        self.months = []
+        self.regression = {}
+        self.accuracy_bins = {}
+        self._rows = []
+        self._daily = []
+        self._samples = {}
+        self._rng = np.random.default_rng(seed)
+        self._hash = hashlib.blake2b(player_name.lower().encode(), digest_size=8)
+
+    @classmethod
+    def from_frame(cls, cleaned_data, player_name, month=None):
+        """
+        Builds the aggregates of a single frame of cleaned games, e.g. one month.
+
+        :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+        :param player_name: The player's username on Chess.com.
+        :param month: The (year, month) of the games (optional).
+        :return: The RangeAggregates of the games.
+        """
+        aggregates = cls(player_name)
+        aggregates.add(cleaned_data, month)
+        return aggregates
+
+    def __len__(self):
+        """
+        The number of games added.
+        """
+        return int(sum(rows['games'].sum() for rows in self._rows))
+
+    @property
+    def version(self):
+        """
+        A content hash of the games added so far.
+        """
+        return self._hash.copy().hexdigest()
+
+    def add(self, cleaned_data, month=None):
+        """
+        Adds a month of cleaned games to the aggregates.
+
+        :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+        :param month: The (year, month) of the games (optional, only recorded).
+        """
+        if cleaned_data is None or cleaned_data.empty:
+            return
+
+        with span('aggregate.range', 'aggregate', rows=len(cleaned_data)):
+            rating = f"{self.player_name}'s rating"
+            accuracy = f"{self.player_name} accuracy"
+            self._hash.update(frame_version(cleaned_data, ['end_time', 'time_class', 'result', rating, "opponent's rating", accuracy]).encode())
+            self.months.append(month)
+            self._rows.append(GameAggregates.compute(cleaned_data, self.player_name))
+
+            labels, codes = density.group_codes(cleaned_data, 'time_class')
+            times = cleaned_data['end_time'].to_numpy()
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+            ratings = cleaned_data[rating].to_numpy(dtype=float)[order]
+            sorted_codes = codes[order]
+            for i, label in enumerate(labels):
+                in_group = sorted_codes == i
+                if in_group.any():
+                    daily = daily_ohlc(times[in_group], ratings[in_group])
+                    daily.insert(0, 'time_class', label)
+                    self._daily.append(daily)
+
+            if accuracy in cleaned_data.columns:
+                self._add_accuracy(
+                    cleaned_data["opponent's rating"].to_numpy(dtype=float),
+                    cleaned_data[accuracy].to_numpy(dtype=float),
+                    labels, codes,
+                )
+
+    def _add_accuracy(self, x, y, labels, codes):
+        valid = ~np.isnan(x) & ~np.isnan(y) & (codes >= 0)
+        x, y, codes = x[valid], y[valid], codes[valid]
+        if not len(x):
+            return
+
+        n_groups = len(labels)
+        ones = np.ones_like(x)
+        sums = np.stack([np.bincount(codes, weights=w, minlength=n_groups) for w in (ones, x, y, x * x, x * y, y * y)], axis=1)
+
+        n_bins = len(HISTOGRAM_EDGES) - 1
+        bins = np.clip(((x - HISTOGRAM_EDGES[0]) // (HISTOGRAM_EDGES[1] - HISTOGRAM_EDGES[0])).astype(np.int64), 0, n_bins - 1)
+        flat = codes * n_bins + bins
+        binned = np.stack([
+            np.bincount(flat, weights=w, minlength=n_groups * n_bins).reshape(n_groups, n_bins) for w in (ones, y, y * y)
+        ], axis=1)
+
+        # A uniform sample of all points so far: the ones with the smallest random keys
+        keys = self._rng.random(len(x))
+        for i, label in enumerate(labels):
+            if not sums[i, 0]:
+                continue
+            self.regression[label] = self.regression.get(label, 0) + sums[i]
+            self.accuracy_bins[label] = self.accuracy_bins.get(label, 0) + binned[i]
+
+            in_group = codes == i
+            sample = [keys[in_group], x[in_group], y[in_group]]
+            if label in self._samples:
+                sample = [np.concatenate(pair) for pair in zip(self._samples[label], sample)]
+            if len(sample[0]) > self.sample_size:
+                kept = np.argpartition(sample[0], self.sample_size)[:self.sample_size]
+                sample = [values[kept] for values in sample]
+            self._samples[label] = sample
+
+    def summary(self):
+        """
+        Summarizes the games per time class.
+
+        :return: A DataFrame as returned by GameAggregates.combine.
+        """
+        if not self._rows:
+            return GameAggregates.combine(pd.DataFrame(columns=GameAggregates.COLUMNS))
+        return GameAggregates.combine(pd.concat(self._rows, ignore_index=True))
+
+    def rating_curve(self):
+        """
+        Returns the player's rating per time class and day.
+
+        :return: A DataFrame indexed by day with 'time_class', 'open', 'high', 'low', 'close' and 'count' columns.
+        """
+        if not self._daily:
+            return pd.DataFrame(columns=['time_class', 'open', 'high', 'low', 'close', 'count'])
+        return pd.concat(self._daily)
+
+    def density_curves(self, common_norm=True):
+        """
+        Computes KDE curves of the opponent ratings per time class from the histograms.
+
+        :param common_norm: Whether the curves are scaled so their total area is 1.
+        :return: A tuple (grid, {time_class: density array}) as returned by density.grid_density.
+        """
+        summary = self.summary()
+        if summary.empty:
+            return np.zeros(0), {}
+
+        counts = np.stack(summary['histogram'].to_list()).astype(np.int64)
+        width = HISTOGRAM_EDGES[1] - HISTOGRAM_EDGES[0]
+        bandwidths = density.binned_std(counts, HISTOGRAM_EDGES[:-1] + width / 2) * np.maximum(counts.sum(axis=1), 1) ** -0.2
+
+        # Only keep the part of the grid around the data, like density.kde_curves
+        occupied = np.flatnonzero(counts.sum(axis=0))
+        padding = int(np.ceil(density.KDE_CUT * max(bandwidths.max(), width) / width))
+        first, last = max(occupied[0] - padding, 0), min(occupied[-1] + padding + 1, counts.shape[1])
+        return density.grid_density(counts[:, first:last], HISTOGRAM_EDGES[first:last + 1], bandwidths, list(summary.index), common_norm)
+
+    def accuracy_sample(self, time_class):
+        """
+        Returns a uniform random sample of the (opponent's rating, accuracy) points of a time class.
+
+        :param time_class: The time class.
+        :return: A tuple (x, y) of float arrays with at most sample_size points.
+        """
+        if time_class not in self._samples:
+            return np.zeros(0), np.zeros(0)
+        _, x, y = self._samples[time_class]
+        return x, y
+
+    def accuracy_summary(self):
+        """
+        Summarizes the player's accuracy per time class from the regression sums.
+
+        :return: A DataFrame indexed by time_class with 'games', 'avg_accuracy', 'avg_opponent_rating'
+            and 'correlation' (between accuracy and the opponent's rating) columns.
+        """
+        sums = pd.DataFrame.from_dict(self.regression, orient='index', columns=REGRESSION_SUMS).rename_axis('time_class')
+        n = sums['n']
+        sxx = sums['xx'] - sums['x'] ** 2 / n
+        syy = sums['yy'] - sums['y'] ** 2 / n
+        sxy = sums['xy'] - sums['x'] * sums['y'] / n
+        return pd.DataFrame({
+            'games': n.astype(np.int64),
+            'avg_accuracy': sums['y'] / n,
+            'avg_opponent_rating': sums['x'] / n,
+            'correlation': sxy / np.sqrt(sxx * syy).where(sxx * syy > 0),
+        }).sort_index()
+
+
+def analyze_range(player_name, months, cache, executor=None, prefetch=PREFETCH_MONTHS):
+    """
+    Streams a player's cleaned games month by month into RangeAggregates.
+
+    Each month is released once it has been added, and at most `prefetch` months are
+    loaded ahead of it, so memory is bounded by a few months of games however many
+    months the range spans.
+
+    :param player_name: The player's username on Chess.com.
+    :param months: An iterable of (year, month) tuples in chronological order.
+    :param cache: The CleanedGameCache months are loaded through.
+    :param executor: An executor loading the next months while one is aggregated (optional).
+    :param prefetch: The number of months loaded ahead when an executor is given.
+    :return: The RangeAggregates of the games.
+    """
+    aggregates = RangeAggregates(player_name)
+    if executor is None:
+        for month, cleaned_data in cache.iter_months(player_name, months):
+            aggregates.add(cleaned_data, month)
+        return aggregates
+
+    pending = deque()
+    for month in months:
+        pending.append((month, submit(executor, cache.load, player_name, *month)))
+        while len(pending) > prefetch:
+            month, future = pending.popleft()
+            aggregates.add(future.result(), month)
+    while pending:
+        month, future = pending.popleft()
+        aggregates.add(future.result(), month)
+    return aggregates
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Elo scale: a 400 point rating difference means 10:1 expected odds
+ELO_SCALE = 400.0
+# Glicko constant q = ln(10) / 400
+GLICKO_Q = np.log(10) / ELO_SCALE
+# Default K-factor of the reconstructed rating trajectory
+K_FACTOR = 20.0
+# Width of the opponent rating bands, in rating points
+BAND_WIDTH = 100
+
+
+def glicko_g(rating_deviation):
+    """
+    The Glicko attenuation factor of an opponent's rating deviation.
+
+    :param rating_deviation: An array of rating deviations (0 gives the Elo model).
+    :return: A float array of factors in (0, 1].
+    """
+    rating_deviation = np.asarray(rating_deviation, dtype=float)
+    return 1 / np.sqrt(1 + 3 * (GLICKO_Q * rating_deviation) ** 2 / np.pi ** 2)
+
+
+def expected_score(rating, opponent_rating, opponent_deviation=0):
+    """
+    Computes the expected score of every game at once.
+
+    With an opponent rating deviation this is the Glicko expectation, without one
+    it reduces to the Elo logistic curve.
+
+    :param rating: An array of the player's ratings.
+    :param opponent_rating: An array of the opponents' ratings.
+    :param opponent_deviation: The opponents' rating deviations (optional, a scalar or an array).
+    :return: A float array of expected scores between 0 and 1.
+    """
+    difference = np.asarray(rating, dtype=float) - np.asarray(opponent_rating, dtype=float)
+    return 1 / (1 + 10 ** (-glicko_g(opponent_deviation) * difference / ELO_SCALE))
+
+
+def add_expectations(cleaned_data, player_name, opponent_deviation=0):
+    """
+    Adds the expected score and the score above expectation of every game.
+
+    :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+    :param player_name: The player's username on Chess.com.
+    :param opponent_deviation: The opponents' rating deviation (optional, defaults to the Elo model).
+    :return: A copy of the DataFrame with 'expected score' and 'score surplus' columns.
+    """
+    cleaned_data = cleaned_data.copy()
+    expected = expected_score(
+        cleaned_data[f"{player_name}'s rating"].to_numpy(),
+        cleaned_data["opponent's rating"].to_numpy(),
+        opponent_deviation,
+    )
+    cleaned_data['expected score'] = expected.astype(np.float32)
+    cleaned_data['score surplus'] = (cleaned_data['score'].to_numpy(dtype=float) - expected).astype(np.float32)
+    return cleaned_data
+
+
+def reconstruct_ratings(cleaned_data, player_name, k_factor=K_FACTOR):
+    """
+    Reconstructs the player's rating trajectory per time class from the results.
+
+    Each game moves the rating by k_factor * (score - expected score), with the
+    expectation taken from the ratings recorded with the game. Because the
+    expectations do not depend on the reconstructed ratings themselves, the whole
+    trajectory is one grouped cumulative sum instead of a loop over the games.
+    Comparing it with the recorded ratings shows how far the results alone explain
+    the rating changes. The recorded ratings are those after each game, so the
+    trajectory starts at the rating after the first game and only the later games
+    move it.
+
+    :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+    :param player_name: The player's username on Chess.com.
+    :param k_factor: The rating change per point of surplus.
+    :return: A float Series aligned with cleaned_data.
+    """
+    if 'expected score' not in cleaned_data.columns:
+        cleaned_data = add_expectations(cleaned_data, player_name)
+    if cleaned_data.empty:
+        return pd.Series(dtype=float, index=cleaned_data.index)
+
+    games = cleaned_data.sort_values('end_time', kind='stable')
+    grouped = games.groupby('time_class', observed=True, sort=False)
+    start = grouped[f"{player_name}'s rating"].transform('first').astype(float)
+    surplus = grouped['score surplus']
+    change = k_factor * (surplus.cumsum() - surplus.transform('first')).astype(float)
+    return (start + change).reindex(cleaned_data.index)
+
+
+def band_summary(cleaned_data, player_name, band_width=BAND_WIDTH, by=('time_class',)):
+    """
+    Summarizes the results against the model's expectation per opponent rating band.
+
+    :param cleaned_data: A DataFrame returned by ChessDataCleaner.clean_data.
+    :param player_name: The player's username on Chess.com.
+    :param band_width: The width of the opponent rating bands.
+    :param by: Additional columns to group by.
+    :return: A DataFrame indexed by the grouping columns and 'opponent_band' with 'games',
+        'score', 'expected_score', 'surplus' and 'performance' (surplus per game) columns.
+    """
+    if 'expected score' not in cleaned_data.columns:
+        cleaned_data = add_expectations(cleaned_data, player_name)
+
+    band = (cleaned_data["opponent's rating"].to_numpy() // band_width * band_width).astype(np.int32)
+    grouped = cleaned_data.assign(opponent_band=band).groupby([*by, 'opponent_band'], observed=True)
+    summary = pd.DataFrame({
+        'games': grouped.size(),
+        'score': grouped['score'].sum(),
+        'expected_score': grouped['expected score'].sum().astype(float).round(2),
+        'surplus': grouped['score surplus'].sum().astype(float).round(2),
+    })
+    summary['performance'] = (summary['surplus'] / summary['games']).round(3)
+    return summary
@@ -0,0 +1,272 @@
+import contextlib
+import contextvars
+import datetime
+import email.utils
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Request priorities; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Who a request is made for (e.g. a Streamlit session) and how urgent it is
+_client = contextvars.ContextVar('request_client', default=None)
+_priority = contextvars.ContextVar('request_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def request_context(client=None, priority=None):
+    """
+    Sets the client and priority of the requests made in a block of code.
+
+    The values are context variables, so they follow the code into worker threads
+    started with instrumentation.submit.
+
+    :param client: An identifier of who the requests are for, e.g. a session id (optional).
+    :param priority: INTERACTIVE or BACKGROUND (optional).
+    """
+    tokens = []
+    if client is not None:
+        tokens.append((_client, _client.set(client)))
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    try:
+        yield
+    finally:
+        for variable, token in reversed(tokens):
+            variable.reset(token)
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    :param value: The header value (or None).
+    :param now: The current time as a POSIX timestamp (optional).
+    :return: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(date.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+class TokenBucket:
+    """
+    A token bucket: requests take one token each and tokens refill at a steady rate.
+
+    Not thread-safe on its own; RequestScheduler only uses it under its lock.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize the TokenBucket, full.
+
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens, i.e. the largest burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """
+        Returns how long to wait until a token is available.
+        """
+        self._refill(now)
+        if now < self.updated:
+            return self.updated - now + max(1 - self.tokens, 0) / self.rate
+        return max(1 - self.tokens, 0) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until):
+        """
+        Empties the bucket and stops refilling it until a given time.
+
+        :param until: A time.monotonic() value.
+        """
+        self.tokens = 0.0
+        self.updated = max(self.updated, until)
+
+
+class RequestScheduler:
+    """
+    A class admitting HTTP requests at the rate the upstream API allows.
+
+    Every request waits for a token from a shared token bucket and for a free
+    concurrency slot. Waiting requests are served by priority (interactive before
+    background) and, within a priority, round-robin across clients, so one session
+    syncing many archives cannot hold up another session's page load. When the API
+    answers 429, the whole scheduler pauses for the Retry-After period and halves
+    its rate, which then recovers gradually with every successful request.
+
+    Schedulers in several processes can share that pause through a
+    multiprocessing.Value holding the time.time() it ends at, so a 429 answered to
+    one process holds back all of them.
+    """
+
+    # Default limits. Chess.com serves serial requests without limit but may answer
+    # parallel ones with 429, so only a few requests are in flight at a time.
+    RATE = 8.0
+    BURST = 8
+    MAX_CONCURRENCY = 4
+    MIN_RATE = 0.5
+
+    def __init__(self, rate=RATE, burst=BURST, max_concurrency=MAX_CONCURRENCY, min_rate=MIN_RATE, shared_pause=None):
+        """
+        Initialize the RequestScheduler.
+
+        :param rate: The maximum number of requests started per second.
+        :param burst: The number of requests that can start at once after an idle period.
+        :param max_concurrency: The maximum number of requests in flight at the same time.
+        :param min_rate: The rate is never lowered below this after 429 responses.
+        :param shared_pause: A multiprocessing.Value('d') shared with the schedulers of other processes (optional).
+        """
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.shared_pause = shared_pause
+        self._bucket = TokenBucket(rate, burst)
+        self._queues = {}
+        self._active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self):
+        """
+        The current number of requests admitted per second.
+        """
+        return self._bucket.rate
+
+    def _head(self):
+        """
+        Returns the (priority, client) whose first request is admitted next, or None.
+        """
+        for priority in sorted(self._queues):
+            clients = self._queues[priority]
+            if clients:
+                return priority, next(iter(clients))
+        return None
+
+    def _remove(self, priority, client, ticket):
+        clients = self._queues[priority]
+        queue = clients[client]
+        queue.remove(ticket)
+        if queue:
+            # Round-robin: the client's next request waits behind the other clients
+            clients.move_to_end(client)
+        else:
+            del clients[client]
+
+    def acquire(self, priority=None, client=None):
+        """
+        Blocks until a request may be sent.
+
+        :param priority: INTERACTIVE or BACKGROUND (optional, defaults to the request context).
+        :param client: Who the request is for (optional, defaults to the request context).
+        :return: The number of seconds spent waiting.
+        """
+        priority = _priority.get() if priority is None else priority
+        client = _client.get() if client is None else client
+        ticket = object()
+        start = time.monotonic()
+
+        with self._condition:
+            self._queues.setdefault(priority, OrderedDict()).setdefault(client, deque()).append(ticket)
+            try:
+                while True:
+                    head = self._head()
+                    if head == (priority, client) and self._queues[priority][client][0] is ticket \
+                            and self._active < self.max_concurrency:
+                        now = time.monotonic()
+                        self._sync_pause(now)
+                        wait = self._bucket.wait_time(now)
+                        if wait <= 0:
+                            self._bucket.take(now)
+                            self._remove(priority, client, ticket)
+                            self._active += 1
+                            self._condition.notify_all()
+                            return time.monotonic() - start
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                if ticket in self._queues[priority].get(client, ()):
+                    self._remove(priority, client, ticket)
+                self._condition.notify_all()
+                raise
+
+    def release(self):
+        """
+        Marks a request admitted by acquire as finished.
+        """
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority=None, client=None):
+        """
+        Holds an admission slot for the duration of a block.
+
+        :param priority: INTERACTIVE or BACKGROUND (optional, defaults to the request context).
+        :param client: Who the request is for (optional, defaults to the request context).
+        :return: The number of seconds spent waiting.
+        """
+        waited = self.acquire(priority, client)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def rate_limited(self, retry_after=None):
+        """
+        Reacts to a 429 response: pauses every request and halves the rate.
+
+        :param retry_after: The number of seconds the API asked to wait (optional).
+        """
+        with self._condition:
+            self._bucket.rate = max(self._bucket.rate / 2, self.min_rate)
+            delay = retry_after if retry_after is not None else 1 / self._bucket.rate
+            self._bucket.pause(time.monotonic() + delay)
+            if self.shared_pause is not None:
+                with self.shared_pause.get_lock():
+                    self.shared_pause.value = max(self.shared_pause.value, time.time() + delay)
+            self._condition.notify_all()
+
+    def _sync_pause(self, now):
+        """
+        Applies a pause another process sharing shared_pause was asked for.
+
+        :param now: The current time.monotonic() value.
+        """
+        if self.shared_pause is not None:
+            remaining = self.shared_pause.value - time.time()
+            if remaining > 0:
+                self._bucket.pause(now + remaining)
+
+    def succeeded(self):
+        """
+        Reacts to a successful response by raising the rate back towards its maximum.
+        """
+        with self._condition:
+            if self._bucket.rate < self.max_rate:
+                self._bucket.rate = min(self._bucket.rate + self.max_rate / 20, self.max_rate)
@@ -1,13 +1,22 @@
 import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
-import seaborn as sns
-from matplotlib.backends.backend_agg import RendererAgg
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import instrumentation
+from accuracy_model import accuracy_models
+from aggregates import GameAggregates
+from caching import LRUCache, TTLCache
 from data_cleaner import ChessDataCleaner
 from data_visualizer import ChessDataVisualizer
 from fetch_games import ChessAPI
+from game_cache import CleanedGameCache, month_range
+from game_store import player_key
+from opening_index import OpeningIndex
+from range_analysis import RangeAggregates, analyze_range, available_months
+from request_scheduler import BACKGROUND, request_context
 
 # Constants
-SEABORN_STYLE = "whitegrid"
 DEFAULT_USERNAMES = [
     "DanielNaroditsky",
     "Hikaru",
@@ -16,13 +25,115 @@ DEFAULT_USERNAMES = [
 ]
 PAGE_TITLE = "Chess Analysis"
 
+# Monthly aggregates and cleaned monthly frames, shared by every session
+AGGREGATES = GameAggregates()
+CLEANED_GAMES = CleanedGameCache(aggregates=AGGREGATES)
 
+# Opening repertoire indexes of recently viewed players, shared by every session
+OPENING_INDEXES = LRUCache(maxsize=16)
 
-# Set seaborn style
-sns.set_style(SEABORN_STYLE)
+# Worker threads for the page's network requests, shared by every session
+FETCH_POOL = ThreadPoolExecutor(max_workers=8)
+
+# Aggregates of recently viewed date ranges, shared by every session. Ranges load
+# their months on a separate pool, since they are themselves run on FETCH_POOL.
+RANGE_AGGREGATES = TTLCache(maxsize=16, ttl=600)
+RANGE_POOL = ThreadPoolExecutor(max_workers=4)
+DEFAULT_RANGE_MONTHS = 36
+
+# Aggregates of recently viewed months, keyed by the content of their games
+MONTH_AGGREGATES = LRUCache(maxsize=64)
+
+# The months selected for analysis; a single month has start == end
+Period = namedtuple("Period", ["start", "end", "label", "is_range"])
+
+# The placeholders of the page sections and the values of their widgets
+Sections = namedtuple("Sections", [
+    "info", "kde", "stats", "distribution", "games", "performance", "accuracy", "openings", "show_lowess", "line",
+])
+
+
+def sync_openings(player_name, start, end):
+    """
+    Returns the player's opening index after adding the new games of a period's months to it.
+    """
+    index = OPENING_INDEXES.get_or_compute(player_name, lambda: OpeningIndex.load(player_name))
+    # Syncing the index must not hold up the requests the page is waiting for
+    with request_context(priority=BACKGROUND):
+        added = sum(index.ingest_month(year, month) for year, month in available_months(player_name, start, end))
+        if added:
+            index.save()
+    return index
+
+def load_range(player_name, start, end):
+    """
+    Returns the RangeAggregates of a player's games between two months, or None if there are none.
+    """
+    def load():
+        months = available_months(player_name, start, end)
+        return analyze_range(player_name, months, CLEANED_GAMES, executor=RANGE_POOL)
+
+    return RANGE_AGGREGATES.get_or_load((player_name, start, end, CLEANED_GAMES.version), load) or None
+
+def fetch_country(player_info):
+    """
+    Returns the data of the player's country, or None if the profile has no country.
+    """
+    if not player_info.get('country'):
+        return None
+    return ChessAPI.fetch_country_data(player_info['country'])
 
 def main():
-    
+    # Requests are queued fairly per session
+    ctx = get_script_run_ctx()
+    with request_context(client=ctx.session_id if ctx else None):
+        render_page()
+
+def render_page():
+    # Every span recorded while building this page belongs to one trace
+    trace = instrumentation.new_trace("page")
+    show_timings = st.sidebar.checkbox("Show timings", help="Break down where the time of this page load went.")
+
+    render_introduction()
+    player_name = select_player()
+    if player_name is None:
+        return
+
+    # Requests that only depend on the username start right away
+    profile_future = instrumentation.submit(FETCH_POOL, ChessAPI.fetch_player_data, player_name)
+    stats_future = instrumentation.submit(FETCH_POOL, ChessAPI.fetch_player_stats, player_name)
+
+    # The join date bounds the period selector, so the profile is needed first
+    player_info = profile_future.result()
+    if not player_info:
+        st.error(f"Could not load the Chess.com profile of **{player_name}**. Check the username or try again in a moment.")
+        return
+
+    period = select_period(datetime.datetime.fromtimestamp(player_info['joined']))
+    if period.is_range:
+        # Months are streamed through cleaning into running aggregates, never all held at once
+        games_future = instrumentation.submit(FETCH_POOL, load_range, player_name, period.start, period.end)
+    else:
+        # Fetch player's cleaned game data and country in parallel with the stats
+        games_future = instrumentation.submit(FETCH_POOL, CLEANED_GAMES.load, player_name, *period.start)
+    openings_future = instrumentation.submit(FETCH_POOL, sync_openings, player_name, period.start, period.end)
+    country_future = instrumentation.submit(FETCH_POOL, fetch_country, player_info)
+
+    sections = lay_out_sections(player_name)
+    render_games = render_range if period.is_range else render_month
+    renderers = {
+        country_future: lambda country_data: render_info(sections, player_info, country_data),
+        stats_future: lambda player_stats: render_stats(sections, player_stats),
+        games_future: lambda data: render_games(sections, player_name, period, data),
+        openings_future: lambda index: render_openings(sections, player_name, index),
+    }
+    for future in as_completed(renderers):
+        renderers[future](future.result())
+
+    if show_timings:
+        render_timings(trace)
+
+def render_introduction():
     # Create columns for the main content
     row0_spacer1, row0_1, row0_spacer2, row0_2, row0_spacer3 = st.columns((0.1, 2, 0.2, 0.6, 0.1))
 
@@ -47,6 +158,7 @@ def main():
             "**To begin, please enter the [chess.com](https://www.chess.com/) username (or use one of the default usernames).** 👇"
         )
 
+def select_player():
     # Create columns for user input
     row2_spacer1, row2_1, row2_spacer2 = st.columns((0.1, 3.2, 0.1))
 
@@ -55,97 +167,225 @@ def main():
     st.markdown("**or**")
     user_input = st.text_input("Input your own username")
 
-    # Fetch player data and date-related variables
-    if not user_input:
-        player_name = default_username
-    else:
-        player_name = user_input
+    try:
+        # Every store and cache is keyed by the lowercased username
+        return player_key((user_input or default_username).strip())
+    except ValueError:
+        st.error(f"**{user_input}** is not a valid Chess.com username. Usernames only contain letters, digits, '_' and '-'.")
+        return None
+
+def select_period(joined_date):
+    """
+    Shows the period selectors and returns the selected Period.
+    """
+    period = st.radio("Analysis period", ["Month", "Date range"], horizontal=True)
+    if period == "Month":
+        return select_month(joined_date, datetime.datetime.now())
+    return select_range(joined_date, datetime.datetime.now())
 
-    player_info = ChessAPI.fetch_player_data(player_name)
-    joined_date = datetime.datetime.fromtimestamp(player_info['joined'])
-    current_date = datetime.datetime.now()
-    current_year = current_date.year
-    current_month = current_date.month
-    year_range = list(range(current_year, joined_date.year - 1, -1))
+def select_month(joined_date, current_date):
+    year_range = list(range(current_date.year, joined_date.year - 1, -1))
 
     year = st.selectbox("Select a year", year_range)
-    if year == current_year:
-        month_range = ["{:02d}".format(i) for i in range(current_month, 0, -1)]
+    if year == current_date.year:
+        months = ["{:02d}".format(i) for i in range(current_date.month, 0, -1)]
     else:
         # Allow all months if the joined year is not the current year
-        month_range = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
-    month = st.selectbox("Select a month", month_range)
+        months = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
+    month = st.selectbox("Select a month", months)
+    return Period((year, int(month)), (year, int(month)), f"{year}-{month}", False)
 
+def select_range(joined_date, current_date):
+    months = month_range((joined_date.year, joined_date.month), (current_date.year, current_date.month))
+    options = ["{}-{:02d}".format(*m) for m in months]
+    first, last = st.select_slider(
+        "Select a range of months",
+        options=options,
+        value=(options[max(len(options) - DEFAULT_RANGE_MONTHS, 0)], options[-1]),
+    )
+    return Period(months[options.index(first)], months[options.index(last)], f"{first} to {last}", True)
+
+def lay_out_sections(player_name):
+    """
+    Lays out every section up front; each one is filled in as soon as its data arrives.
+    """
     # Create columns for header
     line1_spacer1, line1_1, line1_spacer2 = st.columns((0.1, 3.2, 0.1))
 
     with line1_1:
         st.header("Analyzing the Opponents' Ratings Distribution of: **{}**".format(player_name))
 
-    # Fetch player's game data for the selected year and month
-    df = ChessAPI.fetch_games(player_name, year, month)
-
-    # Check if data is available
-    if not df.empty:
-        data_available = True
-        cleaner = ChessDataCleaner(df, player_name)
-        cleaned_data = cleaner.clean_data()
+    st.write("")
 
-        # Create an instance of ChessDataVisualizer
-        visualizer = ChessDataVisualizer(cleaned_data, player_name)
+    row3_space1, row3_1, row3_space2, row3_2, row3_space3 = st.columns((0.1, 1, 0.1, 1, 0.1))
 
-        st.write("")
-        
-        row3_space1, row3_1, row3_space2, row3_2, row3_space3 = st.columns((0.1, 1, 0.1, 1, 0.1))
-        
-    else:
-        data_available = False
-
-    # Create columns for the charts in the main content area
     with row3_1:
-        ChessAPI.display_player_info(player_name)
+        info_slot = st.empty()
         st.subheader("Overall Distribution")
-
-        if data_available:
-            # Visualize Win-Loss Distribution
-            visualizer.print_kde(x="opponent's rating", hue='time_class', xlabel = 'Rating', ylabel = 'Density')
-        else:
-            st.write("No data available for the selected month. Please choose another month.")
+        kde_slot = st.empty()
 
     with row3_2:
-        ChessAPI.display_player_stats(player_name)
+        stats_slot = st.empty()
         st.subheader("Games by time control")
-        if data_available:
-            visualizer.print_distribution(column='time_class', xlabel = "Game type", ylabel = 'Count')
-        else:
-            st.markdown("We do not have information to find out about your games.")
+        distribution_slot = st.empty()
+
     # Create columns for header
     line2_spacer1, line2_1, line2_spacer2 = st.columns((0.1, 3.2, 0.1))
 
     with line2_1:
-        total_games = cleaned_data.end_time.count()
-        blitz_games = cleaned_data[cleaned_data.time_class == 'blitz'].shape[0]
-        rapid_games = cleaned_data[cleaned_data.time_class == 'rapid'].shape[0]
-        bullet_games = cleaned_data[cleaned_data.time_class == 'bullet'].shape[0]
-
-        st.header(f"Games: **{player_name}**")
-        st.markdown(f"It looks like {player_name} played a grand total of **{total_games}** games in {year}-{month}, including:")
-        st.markdown(f"- **{blitz_games}** blitz games,")
-        st.markdown(f"- **{rapid_games}** rapid game,")
-        st.markdown(f"- **{bullet_games}** bullet game,")
-    
+        games_slot = st.empty()
+
     row4_1, row4_space1 = st.columns((2,0.1))
 
     with row4_1:
         st.subheader("Performance")
-        visualizer.print_performance(data = cleaned_data)
-    
+        performance_slot = st.empty()
+
     row5_1, row5_space1 = st.columns((2,0.1))
 
     with row5_1:
         st.subheader("Accuracy")
-        fig = sns.lmplot(data=cleaned_data, x = "opponent's rating", y = player_name+" accuracy", col = 'time_class', scatter_kws={"color":"indigo","alpha":0.2,"s":10}, facet_kws=dict(sharex=False, sharey=False), col_wrap = 2)
-        st.pyplot(fig)       
+        show_lowess = st.checkbox("Show LOWESS trend", help="Add a locally weighted trend to the linear fit.")
+        accuracy_slot = st.empty()
+
+    row6_1, row6_space1 = st.columns((2,0.1))
+
+    with row6_1:
+        st.subheader("Openings")
+        line = st.text_input("Enter a line to explore (e.g. 1.e4 c5 2.Nf3)")
+        openings_slot = st.empty()
+
+    return Sections(
+        info_slot, kde_slot, stats_slot, distribution_slot, games_slot,
+        performance_slot, accuracy_slot, openings_slot, show_lowess, line,
+    )
+
+def render_info(sections, player_info, country_data):
+    with sections.info.container():
+        ChessAPI.render_player_info(player_info, country_data)
+
+def render_stats(sections, player_stats):
+    with sections.stats.container():
+        ChessAPI.render_player_stats(player_stats)
+
+def render_no_data(sections, period):
+    what = "months. Please choose another range." if period.is_range else "month. Please choose another month."
+    sections.kde.write(f"No data available for the selected {what}")
+    sections.distribution.markdown("We do not have information to find out about your games.")
+
+def render_month(sections, player_name, period, cleaned_data):
+    # Check if data is available
+    if cleaned_data is None:
+        render_no_data(sections, period)
+        return
+
+    # Create an instance of ChessDataVisualizer
+    visualizer = ChessDataVisualizer(cleaned_data, player_name)
+
+    with sections.kde.container():
+        # Visualize Win-Loss Distribution
+        visualizer.print_kde(x="opponent's rating", hue='time_class', xlabel = 'Rating', ylabel = 'Density')
+
+    with sections.distribution.container():
+        visualizer.print_distribution(column='time_class', xlabel = "Game type", ylabel = 'Count')
+
+    with sections.games.container():
+        render_game_counts(visualizer, player_name, period, AGGREGATES.rollup(player_name, period.start, period.end))
+        render_form(cleaned_data)
+
+    with sections.performance.container():
+        visualizer.print_performance(data = cleaned_data)
+
+    aggregates = MONTH_AGGREGATES.get_or_compute(
+        (player_name, visualizer.data_version),
+        lambda: RangeAggregates.from_frame(cleaned_data, player_name, period.start),
+    )
+    render_accuracy(sections, visualizer, aggregates)
+
+def render_range(sections, player_name, period, aggregates):
+    if aggregates is None:
+        render_no_data(sections, period)
+        return
+
+    # Every chart is drawn from the aggregates; the games themselves are gone
+    visualizer = ChessDataVisualizer(None, player_name, data_version=aggregates.version)
+    summary = aggregates.summary()
+
+    with sections.kde.container():
+        grid, curves = aggregates.density_curves()
+        visualizer.print_density_curves(grid, curves, 'time_class', xlabel='Rating', ylabel='Density')
+
+    with sections.distribution.container():
+        visualizer.print_distribution(column='time_class', xlabel="Game type", ylabel='Count', counts=summary['games'])
+
+    with sections.games.container():
+        render_game_counts(visualizer, player_name, period, summary)
+
+    with sections.performance.container():
+        visualizer.print_rating_curve(aggregates.rating_curve())
+
+    render_accuracy(sections, visualizer, aggregates)
+
+def render_game_counts(visualizer, player_name, period, summary):
+    total_games = int(summary['games'].sum())
+    blitz_games = int(summary['games'].get('blitz', 0))
+    rapid_games = int(summary['games'].get('rapid', 0))
+    bullet_games = int(summary['games'].get('bullet', 0))
+
+    st.header(f"Games: **{player_name}**")
+    st.markdown(f"It looks like {player_name} played a grand total of **{total_games}** games in {period.label}, including:")
+    st.markdown(f"- **{blitz_games}** blitz games,")
+    st.markdown(f"- **{rapid_games}** rapid game,")
+    st.markdown(f"- **{bullet_games}** bullet game,")
+    st.markdown(
+        f"Results: **{int(summary['wins'].sum())}** wins, **{int(summary['draws'].sum())}** draws and "
+        f"**{int(summary['losses'].sum())}** losses."
+    )
+    if total_games:
+        visualizer.print_rating_summary(summary)
+
+def render_form(cleaned_data):
+    form = ChessDataCleaner.form_metrics(cleaned_data)
+    latest = form.loc[form['end_time'].idxmax()]
+    st.markdown(f"The longest win streak was **{form['win streak'].max()}** games.")
+    st.markdown(
+        f"Over the last {ChessDataCleaner.FORM_WINDOW} games: score **{latest['rolling score']:.0%}**, "
+        f"performance rating **{latest['performance rating']:.0f}**."
+    )
+
+def render_accuracy(sections, visualizer, aggregates):
+    with sections.accuracy.container():
+        # The models are fitted from running sums and cached, so this check is cheap
+        if not accuracy_models(aggregates, sections.show_lowess):
+            st.markdown("None of these games have accuracy data.")
+            return
+        visualizer.print_accuracy(aggregates, lowess=sections.show_lowess)
+
+def render_openings(sections, player_name, index):
+    with sections.openings.container():
+        if index.ingested:
+            months = sorted(index.ingested)
+            st.caption(
+                "Covers the {} months indexed so far, from {}-{:02d} to {}-{:02d}.".format(len(months), *months[0], *months[-1])
+            )
+        if not sections.line.strip():
+            st.markdown("Enter a line above to see how it went.")
+            return
+        result = index.query(sections.line)
+        if result is None or result['games'] == 0:
+            st.markdown(f"{player_name} has no games with this line in the indexed months.")
+            return
+        st.markdown(
+            f"**{result['games']}** games, **{result['wins']}** wins, **{result['draws']}** draws, "
+            f"**{result['losses']}** losses (score **{result['score']:.0%}**, "
+            f"average opponent rating **{result['avg_opponent_rating']:.0f}**)"
+        )
+        st.dataframe(result['continuations'], hide_index=True)
+
+def render_timings(trace):
+    with st.expander("Timings", expanded=True):
+        st.dataframe(instrumentation.summary(trace))
+        st.dataframe(instrumentation.spans_frame(trace))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.server import ArchiveServer
+from benchmarks.synthetic import archive_bytes
+from data_cleaner import ChessDataCleaner
+from fetch_games import ChessAPI
+from game_parser import parse_games
+from game_store import GameStore
+
+PLAYER_NAME = 'TestPlayer'
+
+
+@pytest.fixture(scope='session')
+def archive():
+    """
+    A synthetic monthly archive of 300 games, as JSON bytes.
+    """
+    return archive_bytes(300, player_name=PLAYER_NAME, year=2023, month=1)
+
+
+@pytest.fixture(scope='session')
+def cleaned_games(archive):
+    """
+    The archive's games as returned by ChessDataCleaner.clean_data.
+    """
+    return ChessDataCleaner(parse_games([archive]), PLAYER_NAME).clean_data()
+
+
+@pytest.fixture
+def archive_server(archive, tmp_path, monkeypatch):
+    """
+    A local stand-in for api.chess.com serving the archive for 2023-01.
+
+    ChessAPI talks to it with an empty response cache and game store.
+    """
+    path = tmp_path / 'archive.json'
+    path.write_bytes(archive)
+    with ArchiveServer() as server:
+        server.add_archive(PLAYER_NAME, 2023, 1, str(path))
+        monkeypatch.setattr(ChessAPI, 'BASE_URL', server.base_url)
+        monkeypatch.setattr(ChessAPI, 'store', GameStore(str(tmp_path / 'chess.db')))
+        ChessAPI.responses.clear()
+        yield server
+        ChessAPI.responses.clear()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from accuracy_model import MIN_GAMES, accuracy_models, binned_lowess, linear_fit
+from aggregates import HISTOGRAM_EDGES
+from range_analysis import RangeAggregates
+
+from conftest import PLAYER_NAME
+
+
+def sums(x, y):
+    return [len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum(), (y * y).sum()]
+
+
+def test_linear_fit_matches_least_squares():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(1000, 2500, 200)
+    y = 40 + 0.02 * x + rng.normal(0, 5, 200)
+    grid = np.linspace(1000, 2500, 11)
+    model = linear_fit(sums(x, y), grid)
+
+    slope, intercept = np.polyfit(x, y, 1)
+    assert model['slope'] == pytest.approx(slope)
+    assert model['intercept'] == pytest.approx(intercept)
+    assert model['r'] == pytest.approx(np.corrcoef(x, y)[0, 1])
+    assert model['games'] == 200
+    np.testing.assert_allclose(model['fit'], intercept + slope * grid)
+
+
+def test_linear_fit_band_is_narrowest_at_the_mean():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(1000, 2000, 100)
+    y = 60 + rng.normal(0, 10, 100)
+    grid = np.array([1000, x.mean(), 2000])
+    model = linear_fit(sums(x, y), grid)
+
+    width = model['upper'] - model['lower']
+    assert (model['lower'] < model['fit']).all() and (model['fit'] < model['upper']).all()
+    assert width[1] < width[0] and width[1] < width[2]
+    # At the mean the band is z * s / sqrt(n)
+    residuals = y - (model['intercept'] + model['slope'] * x)
+    s = np.sqrt((residuals ** 2).sum() / (len(x) - 2))
+    assert width[1] / 2 == pytest.approx(1.96 * s / np.sqrt(len(x)))
+
+
+def test_linear_fit_is_flat_without_spread_in_ratings():
+    model = linear_fit(sums(np.full(5, 1500.0), np.array([60, 70, 80, 70, 60.0])), np.array([1400.0, 1600.0]))
+    assert model['slope'] == 0
+    np.testing.assert_allclose(model['fit'], [68, 68])
+    assert np.isnan(model['r'])
+
+
+def test_linear_fit_needs_enough_games():
+    x = np.arange(MIN_GAMES - 1, dtype=float)
+    assert linear_fit(sums(x, x), np.array([0.0])) is None
+
+
+def test_binned_lowess_follows_a_line():
+    centers = HISTOGRAM_EDGES[:-1] + 12.5
+    counts = np.zeros(len(centers))
+    counts[40:80] = 10
+    accuracy = 30 + 0.03 * centers
+    grid = np.linspace(centers[40], centers[79], 25)
+
+    curve = binned_lowess(counts, counts * accuracy, centers, grid)
+    np.testing.assert_allclose(curve, 30 + 0.03 * grid, rtol=1e-6)
+
+
+def test_accuracy_models_per_time_class(cleaned_games):
+    aggregates = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME)
+    models = accuracy_models(aggregates, lowess=True)
+
+    with_accuracy = cleaned_games.dropna(subset=[f"{PLAYER_NAME} accuracy"])
+    assert set(models) == set(with_accuracy['time_class'].astype(str))
+    for time_class, model in models.items():
+        games = with_accuracy[with_accuracy['time_class'] == time_class]
+        assert model['games'] == len(games)
+        assert len(model['grid']) == len(model['fit']) == len(model['lowess'])
+    assert accuracy_models(aggregates, lowess=True) is models
+    assert accuracy_models(aggregates)[time_class]['lowess'] is None
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import HISTOGRAM_EDGES, GameAggregates
+from data_cleaner import ChessDataCleaner
+from game_parser import parse_games
+from game_store import player_key
+
+from conftest import PLAYER_NAME
+
+
+def test_compute_counts_games_per_time_class(cleaned_games):
+    rows = GameAggregates.compute(cleaned_games, PLAYER_NAME)
+    assert list(rows.columns) == GameAggregates.COLUMNS
+    assert (rows[['year', 'month']] == (2023, 1)).all().all()
+
+    for row in rows.itertuples(index=False):
+        games = cleaned_games[cleaned_games['time_class'] == row.time_class]
+        rating = games[f"{PLAYER_NAME}'s rating"].astype(int)
+        assert row.games == len(games)
+        assert row.wins + row.draws + row.losses == len(games)
+        assert row.wins == (games['result'] == 'win').sum()
+        assert row.rating_sum == rating.sum()
+        assert (row.rating_min, row.rating_max) == (rating.min(), rating.max())
+        assert row.opponent_rating_max == games["opponent's rating"].max()
+        assert row.accuracy_count == games[f"{PLAYER_NAME} accuracy"].notna().sum()
+        assert len(row.histogram) == len(HISTOGRAM_EDGES) - 1
+        assert row.histogram.sum() == len(games)
+
+
+def test_combine_of_parts_equals_the_whole(cleaned_games):
+    first, second = cleaned_games.iloc[::2], cleaned_games.iloc[1::2]
+    parts = pd.concat([GameAggregates.compute(first, PLAYER_NAME), GameAggregates.compute(second, PLAYER_NAME)])
+    combined = GameAggregates.combine(parts)
+    whole = GameAggregates.combine(GameAggregates.compute(cleaned_games, PLAYER_NAME))
+
+    pd.testing.assert_frame_equal(combined.drop(columns='histogram'), whole.drop(columns='histogram'))
+    for time_class in whole.index:
+        np.testing.assert_array_equal(combined.loc[time_class, 'histogram'], whole.loc[time_class, 'histogram'])
+    assert whole['games'].sum() == len(cleaned_games)
+    np.testing.assert_allclose(whole['avg_opponent_rating'], whole['opponent_rating_sum'] / whole['games'])
+
+
+def test_combine_without_rows():
+    summary = GameAggregates.combine(pd.DataFrame(columns=GameAggregates.COLUMNS))
+    assert summary.empty
+    assert 'games' in summary.columns
+
+
+def test_rollup_of_stored_months(cleaned_games, tmp_path):
+    aggregates = GameAggregates(str(tmp_path / 'chess.db'))
+    assert not aggregates.has_month(PLAYER_NAME, 2023, 1)
+
+    aggregates.update(PLAYER_NAME, cleaned_games)
+    # Storing a month again replaces its rows
+    aggregates.update(PLAYER_NAME, cleaned_games)
+
+    assert aggregates.has_month(PLAYER_NAME.upper(), 2023, 1)
+    summary = aggregates.rollup(PLAYER_NAME, (2023, 1), (2023, 1))
+    assert summary['games'].sum() == len(cleaned_games)
+    assert aggregates.rollup(PLAYER_NAME, (2023, 2), (2023, 12)).empty
+
+
+def test_usernames_are_case_insensitive(archive, cleaned_games, tmp_path):
+    aggregates = GameAggregates(str(tmp_path / 'chess.db'))
+    aggregates.update(PLAYER_NAME, cleaned_games)
+    expected = aggregates.rollup(PLAYER_NAME)
+
+    # The archive spells the name 'TestPlayer'; a lowercased name must find the same side of every game
+    lowercased = ChessDataCleaner(parse_games([archive]), 'testplayer').clean_data()
+    assert lowercased['result'].tolist() == cleaned_games['result'].tolist()
+    np.testing.assert_array_equal(lowercased["testplayer's rating"], cleaned_games[f"{PLAYER_NAME}'s rating"])
+
+    aggregates.update('testplayer', lowercased)
+    pd.testing.assert_frame_equal(aggregates.rollup('TESTPLAYER'), expected)
+
+
+@pytest.mark.parametrize('name', ['', '../../x', 'a/b', 'name with spaces', 'café', None])
+def test_player_key_rejects_invalid_usernames(name):
+    with pytest.raises(ValueError):
+        player_key(name)
+
+
+def test_player_key_lowercases():
+    assert player_key('Daniel_Naroditsky-2') == 'daniel_naroditsky-2'
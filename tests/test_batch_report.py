@@ -0,0 +1,73 @@
+import argparse
+
+import pandas as pd
+import pytest
+
+import batch_report
+from aggregates import GameAggregates
+from game_cache import CleanedGameCache
+
+from conftest import PLAYER_NAME
+
+
+@pytest.fixture
+def cache(archive_server, tmp_path, monkeypatch):
+    """
+    Makes the report clean its months into a temporary cache (worker processes inherit it).
+    """
+    directory, database = str(tmp_path / 'cleaned'), str(tmp_path / 'aggregates.db')
+    monkeypatch.setattr(batch_report, 'CleanedGameCache', lambda: CleanedGameCache(directory, GameAggregates(database)))
+
+
+def test_parse_month():
+    assert batch_report.parse_month('2023-01') == (2023, 1)
+    with pytest.raises(argparse.ArgumentTypeError):
+        batch_report.parse_month('2023/01')
+
+
+def test_summarize_games(cleaned_games):
+    summary = batch_report.summarize_games(cleaned_games, PLAYER_NAME)
+    assert set(summary.index) == set(cleaned_games['time_class'])
+    assert summary['games'].sum() == len(cleaned_games)
+
+    blitz = cleaned_games[cleaned_games['time_class'] == 'blitz'].sort_values('end_time')
+    row = summary.loc['blitz']
+    assert row['rating_start'] == blitz[f"{PLAYER_NAME}'s rating"].iloc[0]
+    assert row['rating_end'] == blitz[f"{PLAYER_NAME}'s rating"].iloc[-1]
+    assert row['score'] == pytest.approx(blitz['score'].mean(), abs=1e-3)
+    assert 0 < row['expected_score'] < 1
+
+
+def test_summarize_moves(archive_server):
+    moves = batch_report.summarize_moves(PLAYER_NAME, [(2023, 1), (2023, 2)])
+    assert list(moves.columns) == ['avg_moves', 'avg_move_seconds', 'time_pressure_share']
+    assert (moves['avg_moves'] > 0).all()
+    assert moves['time_pressure_share'].between(0, 1).all()
+    assert batch_report.summarize_moves(PLAYER_NAME, [(2023, 2)]).empty
+
+
+def test_analyze_player(cache, cleaned_games):
+    report = batch_report.analyze_player(PLAYER_NAME, (2022, 12), (2023, 2))
+    assert (report['player'] == PLAYER_NAME).all()
+    assert report['games'].sum() == len(cleaned_games)
+    assert report['avg_move_seconds'].notna().all()
+
+    bands = batch_report.analyze_player(PLAYER_NAME, (2023, 1), (2023, 1), band_width=200)
+    assert (bands['opponent_band'] % 200 == 0).all()
+    assert batch_report.analyze_player(PLAYER_NAME, (2023, 2), (2023, 3)) is None
+
+
+def test_main_writes_one_report_per_player(cache, cleaned_games, tmp_path, capsys):
+    output = tmp_path / 'report.csv'
+    names = [PLAYER_NAME, PLAYER_NAME.upper(), 'nobody']
+    assert batch_report.main([*names, '--start', '2023-01', '--end', '2023-01', '-j', '2', '-o', str(output)]) == 0
+
+    report = pd.read_csv(output)
+    assert set(report['player']) == {PLAYER_NAME.lower()}
+    assert report['games'].sum() == len(cleaned_games)
+    assert "for 1 players" in capsys.readouterr().out
+
+
+def test_main_rejects_invalid_usernames(tmp_path):
+    with pytest.raises(SystemExit):
+        batch_report.main(['../x', '--start', '2023-01', '-o', str(tmp_path / 'report.csv')])
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import caching
+from caching import LRUCache, TTLCache, frame_version
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get_or_compute('b', lambda: 4) == 4
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.put('a', 1)
+    cache.put('b', 2, ttl=60)
+
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert 'a' not in cache
+
+
+def test_get_or_load_coalesces_concurrent_loads():
+    cache = TTLCache()
+    calls = []
+    waits = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(cache.get_or_load, 'key', load)
+        started.wait(5)
+        followers = [executor.submit(cache.get_or_load, 'key', load, on_wait=lambda: waits.append(1)) for _ in range(3)]
+        # Give the followers time to find the load in flight
+        deadline = time.monotonic() + 5
+        while len(waits) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result()] + [future.result() for future in followers]
+
+    assert results == ['value'] * 4
+    assert len(calls) == 1
+    assert len(waits) == 3
+    assert cache.get_or_load('key', load, on_wait=lambda: waits.append(1)) == 'value'
+    assert len(calls) == 1 and len(waits) == 3
+
+
+def test_get_or_load_shares_failures_without_caching_them():
+    cache = TTLCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream error")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(cache.get_or_load, 'key', fail)
+        started.wait(5)
+        waiting = threading.Event()
+        follower = executor.submit(cache.get_or_load, 'key', fail, on_wait=waiting.set)
+        waiting.wait(5)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert cache.get_or_load('key', lambda: 'value') == 'value'
+
+
+def test_get_or_load_does_not_cache_falsy_results():
+    cache = TTLCache()
+    assert cache.get_or_load('key', lambda: []) == []
+    assert cache.get_or_load('key', lambda: ['value']) == ['value']
+    assert cache.get_or_load('key', lambda: []) == ['value']
+
+
+def test_frame_version_follows_the_content():
+    frame = pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']})
+    assert frame_version(frame) == frame_version(frame.copy())
+    assert frame_version(frame) != frame_version(frame.assign(b=['x', 'z']))
+    assert frame_version(frame, ['a']) == frame_version(frame.assign(b=['x', 'z']), ['a'])
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from data_cleaner import ChessDataCleaner
+
+from conftest import PLAYER_NAME
+
+
+def games(results, opponent_ratings, end_times):
+    scores = {'win': 1.0, 'draw': 0.5, 'loss': 0.0}
+    return pd.DataFrame({
+        'end_time': pd.to_datetime(end_times, unit='s'),
+        'result': results,
+        'score': [scores[result] for result in results],
+        "opponent's rating": opponent_ratings,
+    })
+
+
+def test_form_metrics_streaks():
+    data = games(
+        ['win', 'win', 'loss', 'win', 'draw', 'loss', 'loss'],
+        [1500] * 7,
+        range(7),
+    )
+    form = ChessDataCleaner.form_metrics(data)
+    assert form['win streak'].tolist() == [1, 2, 0, 1, 0, 0, 0]
+    assert form['loss streak'].tolist() == [0, 0, 1, 0, 0, 1, 2]
+
+
+def test_form_metrics_rolling_window():
+    data = games(['win', 'loss', 'draw', 'win'], [1400, 1600, 1500, 1700], range(4))
+    form = ChessDataCleaner.form_metrics(data, window=2)
+
+    np.testing.assert_allclose(form['rolling score'], [1, 0.5, 0.25, 0.75])
+    # Average opponent rating of the window plus 400 * (wins - losses) / games
+    np.testing.assert_allclose(form['performance rating'], [1800, 1500, 1350, 1800])
+
+
+def test_form_metrics_follow_the_games_order_in_time():
+    data = games(['win', 'win', 'loss'], [1500] * 3, [30, 10, 20])
+    form = ChessDataCleaner.form_metrics(data)
+    # In time: win (10), loss (20), win (30)
+    assert form['win streak'].tolist() == [1, 1, 0]
+    assert form['loss streak'].tolist() == [0, 0, 1]
+    assert form.index.equals(data.index)
+
+
+def test_form_metrics_leave_the_input_unchanged(cleaned_games):
+    columns = list(cleaned_games.columns)
+    form = ChessDataCleaner.form_metrics(cleaned_games)
+    assert list(cleaned_games.columns) == columns
+    assert len(form) == len(cleaned_games)
+    assert form['win streak'].max() >= 1
+    assert form['rolling score'].between(0, 1).all()
+
+
+def test_form_metrics_without_games():
+    form = ChessDataCleaner.form_metrics(games([], [], []))
+    assert form.empty
+    assert {'win streak', 'loss streak', 'rolling score', 'performance rating'} <= set(form.columns)
+
+
+def test_clean_data_is_relative_to_the_player(cleaned_games):
+    rating = cleaned_games[f"{PLAYER_NAME}'s rating"]
+    as_white = cleaned_games['white.username'] == PLAYER_NAME
+    assert (rating[as_white] == cleaned_games['white.rating'][as_white]).all()
+    assert (rating[~as_white] == cleaned_games['black.rating'][~as_white]).all()
+    assert set(cleaned_games['result'].astype(str)) <= {'win', 'draw', 'loss'}
+
+
+def test_calculate_results_decodes_the_result_codes():
+    cleaner = ChessDataCleaner(pd.DataFrame({
+        'white.username': [PLAYER_NAME, 'opponent', PLAYER_NAME, 'opponent', PLAYER_NAME],
+        'black.username': ['opponent', PLAYER_NAME.lower(), 'opponent', PLAYER_NAME, 'opponent'],
+        'white.result': ['win', 'win', 'stalemate', 'timevsinsufficient', 'threecheck'],
+        'black.result': ['resigned', 'checkmated', 'stalemate', 'timevsinsufficient', 'win'],
+    }), PLAYER_NAME)
+    cleaner.find_player_color()
+    cleaner.calculate_results()
+
+    assert cleaner.dataframe['result'].tolist() == ['win', 'loss', 'draw', 'draw', 'loss']
+    assert cleaner.dataframe['score'].tolist() == [1.0, 0.0, 0.5, 0.5, 0.0]
+    assert cleaner.dataframe['termination'].tolist() == [
+        'resignation', 'checkmate', 'stalemate', 'timeout vs insufficient material', 'three-check',
+    ]
+
+
+def test_cleaned_games_use_the_schema_dtypes(cleaned_games):
+    for column, dtype in ChessDataCleaner.SCHEMA.items():
+        column = column.format(player=PLAYER_NAME)
+        if column in cleaned_games.columns:
+            assert cleaned_games[column].dtype == dtype, column
+
+
+def test_apply_schema_restores_the_dtypes_of_concatenated_months(cleaned_games):
+    first, second = cleaned_games.iloc[:150].copy(), cleaned_games.iloc[150:].copy()
+    # Months with different categories concatenate to plain string columns
+    second['opening'] = second['opening'].cat.add_categories(['Unseen-Opening'])
+    combined = pd.concat([first, second])
+    assert combined['opening'].dtype != 'category'
+
+    restored = ChessDataCleaner.apply_schema(combined, PLAYER_NAME)
+    assert restored['opening'].dtype == 'category'
+    assert restored['opening'].tolist() == cleaned_games['opening'].tolist()
+    assert ChessDataCleaner.apply_schema(cleaned_games, PLAYER_NAME) is cleaned_games
+
+
+def test_memory_usage_report(cleaned_games):
+    report = ChessDataCleaner.memory_usage_report(cleaned_games)
+    assert list(report.index) == [*cleaned_games.columns, 'total']
+    assert report.loc['total', 'bytes'] == cleaned_games.memory_usage(index=False, deep=True).sum()
+    assert report.loc["opponent's rating", 'dtype'] == 'int16'
+
+    # The compact dtypes take a fraction of the memory of plain object and 64-bit columns
+    plain = cleaned_games.astype({column: object for column in cleaned_games.select_dtypes('category').columns})
+    plain = plain.astype({column: 'float64' for column in plain.select_dtypes(['int16', 'float32']).columns})
+    assert report.loc['total', 'bytes'] < ChessDataCleaner.memory_usage_report(plain).loc['total', 'bytes'] / 2
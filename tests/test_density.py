@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import density
+
+
+def ratings(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'rating': np.concatenate([rng.normal(1500, 120, n), rng.normal(2100, 60, n // 4)]),
+        'time_class': ['blitz'] * n + ['bullet'] * (n // 4),
+    })
+
+
+def exact_kde(values, grid):
+    """
+    A Gaussian KDE with Scott's rule bandwidth, evaluated point by point.
+    """
+    bandwidth = values.std(ddof=1) * len(values) ** -0.2
+    z = (grid[:, None] - values[None, :]) / bandwidth
+    return np.exp(-0.5 * z ** 2).sum(axis=1) / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+
+
+def test_binned_counts_matches_numpy():
+    data = ratings()
+    labels, codes = density.group_codes(data, 'time_class')
+    edges = np.arange(1000, 2500, 25.0)
+    counts = density.binned_counts(data['rating'].to_numpy(), codes, len(labels), edges)
+
+    for i, label in enumerate(labels):
+        values = np.clip(data.loc[data['time_class'] == label, 'rating'], edges[0], edges[-1] - 1)
+        np.testing.assert_array_equal(counts[i], np.histogram(values, edges)[0])
+
+
+def test_kde_curves_match_an_exact_kde():
+    data = ratings()
+    grid, curves = density.kde_curves(data, 'rating', 'time_class', common_norm=False)
+    assert set(curves) == {'blitz', 'bullet'}
+
+    for label, curve in curves.items():
+        expected = exact_kde(data.loc[data['time_class'] == label, 'rating'].to_numpy(), grid)
+        assert np.abs(curve - expected).max() < 0.02 * expected.max()
+        assert curve.sum() * (grid[1] - grid[0]) == pytest.approx(1, abs=0.01)
+
+
+def test_kde_curves_common_norm_share_one_area():
+    data = ratings()
+    grid, curves = density.kde_curves(data, 'rating', 'time_class')
+    areas = {label: curve.sum() * (grid[1] - grid[0]) for label, curve in curves.items()}
+    assert sum(areas.values()) == pytest.approx(1, abs=0.01)
+    assert areas['blitz'] == pytest.approx(0.8, abs=0.01)
+
+
+def test_kde_curves_are_cached_by_content():
+    data = ratings()
+    first = density.kde_curves(data, 'rating', 'time_class')
+    assert density.kde_curves(data.copy(), 'rating', 'time_class') is first
+    assert density.kde_curves(ratings(seed=1), 'rating', 'time_class') is not first
+
+
+def test_kde_curves_without_values():
+    grid, curves = density.kde_curves(pd.DataFrame({'rating': [np.nan], 'time_class': ['blitz']}), 'rating', 'time_class')
+    assert len(grid) == 0 and curves == {}
+
+
+def test_histogram_counts_match_numpy():
+    data = ratings()
+    edges, counts = density.histogram_counts(data, 'rating', 'time_class', bins=10)
+    np.testing.assert_allclose(edges, np.histogram_bin_edges(data['rating'], 10))
+    for label, label_counts in counts.items():
+        expected = np.histogram(data.loc[data['time_class'] == label, 'rating'], edges)[0]
+        np.testing.assert_array_equal(label_counts, expected)
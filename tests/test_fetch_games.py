@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import archive_bytes
+from fetch_games import ChessAPI
+
+from conftest import PLAYER_NAME
+
+MONTHS = [(2022, 11), (2022, 12), (2023, 1)]
+
+
+@pytest.fixture
+def history(archive_server, tmp_path):
+    """
+    Serves three months of archives, 2023-01 being the conftest archive.
+    """
+    for year, month in MONTHS[:-1]:
+        path = tmp_path / f'{year}-{month}.json'
+        path.write_bytes(archive_bytes(50, player_name=PLAYER_NAME, year=year, month=month))
+        archive_server.add_archive(PLAYER_NAME, year, month, str(path))
+    return archive_server
+
+
+def test_fetch_all_games_returns_every_month_in_order(history):
+    games = ChessAPI.fetch_all_games(PLAYER_NAME)
+
+    assert len(games) == 50 + 50 + 300
+    months = pd.to_datetime(games['end_time'], unit='s').dt.to_period('M')
+    assert months.is_monotonic_increasing
+    assert sorted(months.astype(str).unique()) == ['2022-11', '2022-12', '2023-01']
+
+
+def test_fetch_all_games_caps_the_concurrent_downloads(history, monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    fetch_archive = ChessAPI._fetch_archive
+
+    def counting_fetch_archive(cls, *args):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        try:
+            return fetch_archive(*args)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(ChessAPI, '_fetch_archive', classmethod(counting_fetch_archive))
+    assert len(ChessAPI.fetch_all_games(PLAYER_NAME, max_workers=1)) == 400
+    assert peak[0] == 1
+
+    peak[0] = 0
+    ChessAPI.fetch_all_games(PLAYER_NAME, max_workers=3)
+    assert peak[0] == 3
+
+
+def test_fetch_all_games_without_archives(archive_server):
+    assert ChessAPI.fetch_all_games('nobody') is None
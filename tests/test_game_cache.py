@@ -0,0 +1,90 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+from aggregates import GameAggregates
+from fetch_games import ChessAPI
+from game_cache import CleanedGameCache, month_range
+
+from conftest import PLAYER_NAME
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CleanedGameCache(str(tmp_path / 'cleaned'), aggregates=GameAggregates(str(tmp_path / 'aggregates.db')))
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """
+    The (player, year, month) of every archive ChessAPI is asked for.
+    """
+    calls = []
+    fetch_games = ChessAPI.fetch_games
+    monkeypatch.setattr(ChessAPI, 'fetch_games', lambda player_name, year, month: calls.append((player_name, year, month)) or fetch_games(player_name, year, month))
+    return calls
+
+
+def assert_same_games(actual, expected):
+    # Parquet stores timestamps in milliseconds at the finest
+    pd.testing.assert_frame_equal(actual.astype({'end_time': expected['end_time'].dtype}), expected)
+
+
+def test_month_range():
+    assert month_range((2022, 11), (2023, 2)) == [(2022, 11), (2022, 12), (2023, 1), (2023, 2)]
+    assert month_range((2023, 1), (2023, 1)) == [(2023, 1)]
+    assert month_range((2023, 2), (2023, 1)) == []
+
+
+def test_closed_months_are_cached(archive_server, cache, cleaned_games, fetches):
+    cleaned_data = cache.load(PLAYER_NAME, 2023, 1)
+    assert os.path.exists(cache.path(PLAYER_NAME, 2023, 1))
+    assert_same_games(cleaned_data, cleaned_games)
+
+    cached = cache.load(PLAYER_NAME, 2023, 1)
+    assert len(fetches) == 1
+    assert_same_games(cached, cleaned_games)
+    assert cache.aggregates.rollup(PLAYER_NAME)['games'].sum() == len(cleaned_games)
+
+
+def test_the_current_month_is_not_cached(archive_server, archive, cache, fetches, tmp_path):
+    today = datetime.date.today()
+    path = tmp_path / 'current.json'
+    path.write_bytes(archive)
+    archive_server.add_archive(PLAYER_NAME, today.year, today.month, str(path))
+
+    # Its games can still change, so every load goes back to the (revalidated) archive
+    for _ in range(2):
+        assert len(cache.load(PLAYER_NAME, today.year, today.month)) == 300
+    assert len(fetches) == 2
+    assert not os.path.exists(cache.path(PLAYER_NAME, today.year, today.month))
+
+
+def test_months_without_games(archive_server, cache):
+    assert cache.load(PLAYER_NAME, 2023, 2) is None
+    assert not os.path.exists(cache.path(PLAYER_NAME, 2023, 2))
+
+
+def test_usernames_share_one_cache(archive_server, cache, cleaned_games, fetches):
+    assert cache.path('TESTPLAYER', 2023, 1) == cache.path(PLAYER_NAME, 2023, 1)
+    assert os.path.basename(os.path.dirname(os.path.dirname(cache.path(PLAYER_NAME, 2023, 1)))) == 'testplayer'
+
+    cache.load(PLAYER_NAME, 2023, 1)
+    lowercased = cache.load('testplayer', 2023, 1)
+    assert len(fetches) == 1
+    assert_same_games(lowercased, cleaned_games.rename(columns=lambda column: column.replace(PLAYER_NAME, 'testplayer')))
+
+
+@pytest.mark.parametrize('name', ['../../x', 'a/b', ''])
+def test_path_rejects_invalid_usernames(cache, name):
+    with pytest.raises(ValueError):
+        cache.path(name, 2023, 1)
+
+
+def test_load_range(archive_server, cache, cleaned_games):
+    cleaned_data = cache.load_range(PLAYER_NAME, month_range((2022, 12), (2023, 2)))
+    assert len(cleaned_data) == len(cleaned_games)
+    assert cleaned_data['time_class'].dtype == 'category'
+    assert cache.load_range(PLAYER_NAME, [(2023, 2)]) is None
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import archive_bytes
+from fetch_games import ChessAPI
+from game_parser import GAME_COLUMNS, iter_chunks, iter_games, parse_games
+
+from conftest import PLAYER_NAME
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 1 << 20])
+def test_iter_games_matches_json_for_any_chunk_size(chunk_size):
+    body = archive_bytes(10)
+    assert list(iter_games(iter_chunks(body, chunk_size))) == json.loads(body)['games']
+
+
+def test_iter_games_decodes_characters_split_across_chunks():
+    body = json.dumps({'games': [{'name': 'żółw ♞'}, {'name': 'é'}]}, ensure_ascii=False).encode()
+    for chunk_size in range(1, 6):
+        assert list(iter_games(iter_chunks(body, chunk_size))) == [{'name': 'żółw ♞'}, {'name': 'é'}]
+
+
+def test_iter_games_reads_str_chunks_and_other_keys():
+    assert list(iter_games(['{"other": 1, "items": [{"a": ', '1}, {"a": 2}]}'], key='items')) == [{'a': 1}, {'a': 2}]
+
+
+@pytest.mark.parametrize('body', [b'{"games": []}', b'{"games": [ ]}', b'{"archives": [1]}', b''])
+def test_iter_games_without_games(body):
+    assert list(iter_games([body])) == []
+
+
+def test_iter_games_raises_on_a_truncated_document():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_games(iter_chunks(b'{"games": [{"a": 1}, {"a": ', 4)))
+
+
+def test_parse_games_keeps_only_the_requested_columns(archive):
+    games = json.loads(archive)['games']
+    data = parse_games(iter_chunks(archive, 1000))
+
+    assert list(data.columns) == list(GAME_COLUMNS)
+    assert len(data) == len(games)
+    assert data['end_time'].dtype == np.int64
+    assert data['rated'].dtype == bool
+    assert data['white.username'].tolist() == [game['white']['username'] for game in games]
+    assert data['black.rating'].tolist() == [game['black']['rating'] for game in games]
+
+
+def test_parse_games_fills_missing_accuracies_with_nan(archive):
+    games = json.loads(archive)['games']
+    data = parse_games([archive])
+
+    has_accuracy = np.array(['accuracies' in game for game in games])
+    assert has_accuracy.any() and not has_accuracy.all()
+    assert data['accuracies.white'].isna().to_numpy().tolist() == (~has_accuracy).tolist()
+
+
+def test_parse_games_leaves_out_optional_columns_without_values():
+    data = parse_games([archive_bytes(20, accuracy_fraction=0)])
+    assert 'accuracies.white' not in data.columns
+    assert 'white.rating' in data.columns
+
+
+def test_parse_games_with_custom_columns():
+    columns = {'url': (('url',), 'str'), 'white.rating': (('white', 'rating'), 'int'), 'missing': (('a', 'b'), 'int')}
+    data = parse_games([archive_bytes(5)], columns=columns)
+    assert list(data.columns) == ['url', 'white.rating', 'missing']
+    assert data['missing'].tolist() == [0] * 5
+
+
+def test_parse_games_without_games():
+    assert parse_games([b'{"games": []}']) is None
+
+
+def test_fetch_games_through_the_archive_server(archive_server, archive):
+    data = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    assert data.equals(parse_games([archive]))
+    assert ChessAPI.fetch_games(PLAYER_NAME, 2023, 2) is None
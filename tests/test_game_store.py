@@ -0,0 +1,87 @@
+import datetime
+import os
+
+import pandas as pd
+
+from benchmarks.synthetic import archive_bytes
+from fetch_games import ChessAPI
+from game_store import GameStore
+
+from conftest import PLAYER_NAME
+
+ARCHIVE_PATH = f'/pub/player/{PLAYER_NAME}/games/2023/01'
+
+
+def test_is_closed_waits_for_the_grace_period():
+    end_of_january = datetime.datetime(2023, 2, 1)
+    assert not GameStore.is_closed(2023, 1, now=end_of_january)
+    assert not GameStore.is_closed(2023, 1, now=end_of_january + GameStore.CLOSED_MONTH_GRACE - datetime.timedelta(seconds=1))
+    assert GameStore.is_closed(2023, 1, now=end_of_january + GameStore.CLOSED_MONTH_GRACE)
+    assert GameStore.is_closed(2023, 12, now=datetime.datetime(2024, 1, 2))
+
+
+def test_put_and_get(tmp_path):
+    # The database directory is created on first use
+    store = GameStore(str(tmp_path / 'data' / 'nested' / 'chess.db'))
+    assert store.get(PLAYER_NAME, 2023, 1) is None
+    assert os.path.exists(tmp_path / 'data' / 'nested' / 'chess.db')
+
+    store.put(PLAYER_NAME, 2023, 1, b'{"games": []}', etag='"1"', last_modified='Wed, 01 Feb 2023 00:00:00 GMT')
+    archive = store.get(PLAYER_NAME.upper(), 2023, 1)
+    assert (archive.player, archive.body, archive.etag) == ('testplayer', b'{"games": []}', '"1"')
+    assert archive.complete
+
+    today = datetime.date.today()
+    store.put(PLAYER_NAME, today.year, today.month, b'{"games": []}')
+    assert not store.get(PLAYER_NAME, today.year, today.month).complete
+
+
+def test_closed_months_are_never_downloaded_again(archive_server):
+    first = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    assert first.attrs['complete']
+    ChessAPI.responses.clear()
+
+    second = ChessAPI.fetch_games(PLAYER_NAME.lower(), 2023, 1)
+    assert archive_server.requests == [(ARCHIVE_PATH, 200)]
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_open_months_are_revalidated(archive_server, tmp_path, monkeypatch):
+    # While January is still open, its stored copy is revalidated with its ETag
+    monkeypatch.setattr(GameStore, 'CLOSED_MONTH_GRACE', datetime.timedelta(days=100000))
+    first = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    stored = ChessAPI.store.get(PLAYER_NAME, 2023, 1)
+    assert not first.attrs['complete'] and not stored.complete and stored.etag
+
+    second = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    assert archive_server.requests == [(ARCHIVE_PATH, 200), (ARCHIVE_PATH, 304)]
+    assert ChessAPI.store.get(PLAYER_NAME, 2023, 1).fetched_at >= stored.fetched_at
+    pd.testing.assert_frame_equal(second, first)
+
+    # A changed archive is downloaded again and replaces the stored copy
+    changed = tmp_path / 'changed.json'
+    changed.write_bytes(archive_bytes(301, player_name=PLAYER_NAME, year=2023, month=1))
+    archive_server.add_archive(PLAYER_NAME, 2023, 1, str(changed))
+    assert len(ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)) == len(first) + 1
+    assert archive_server.requests[-1] == (ARCHIVE_PATH, 200)
+    assert ChessAPI.store.get(PLAYER_NAME, 2023, 1).body == changed.read_bytes()
+
+    # Once January is over, the next revalidation marks it complete and the network is no longer used
+    monkeypatch.setattr(GameStore, 'CLOSED_MONTH_GRACE', datetime.timedelta(hours=12))
+    assert ChessAPI.fetch_games(PLAYER_NAME, 2023, 1).attrs['complete']
+    assert archive_server.requests[-1] == (ARCHIVE_PATH, 304)
+    assert ChessAPI.store.get(PLAYER_NAME, 2023, 1).complete
+
+    requests = len(archive_server.requests)
+    ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    assert len(archive_server.requests) == requests
+
+
+def test_stored_copy_is_used_when_the_api_fails(archive_server, monkeypatch):
+    monkeypatch.setattr(GameStore, 'CLOSED_MONTH_GRACE', datetime.timedelta(days=100000))
+    games = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+
+    archive_server.stop()
+    fallback = ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    assert not fallback.attrs['complete']
+    pd.testing.assert_frame_equal(fallback, games)
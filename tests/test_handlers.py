@@ -0,0 +1,85 @@
+import json
+
+import pytest
+import requests
+
+from benchmarks.synthetic import TIME_CLASSES, archive_bytes, iter_archive
+from fetch_games import ChessAPI
+
+from conftest import PLAYER_NAME
+
+
+def test_games_handler_serves_the_archive(archive_server, archive):
+    response = requests.get(archive_server.archive_url(PLAYER_NAME, 2023, 1))
+    assert response.status_code == 200
+    assert response.content == archive
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+
+    # Unknown months are served as empty archives, as by Chess.com
+    assert requests.get(archive_server.archive_url(PLAYER_NAME, 2023, 2)).json() == {'games': []}
+
+
+def test_games_handler_answers_conditional_requests(archive_server):
+    url = archive_server.archive_url(PLAYER_NAME.upper(), 2023, 1)
+    etag = requests.get(url).headers['ETag']
+
+    response = requests.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.content == b''
+    assert requests.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_archives_handler(archive_server):
+    assert ChessAPI.fetch_game_archives(PLAYER_NAME) == [archive_server.archive_url(PLAYER_NAME.lower(), 2023, 1)]
+
+
+def test_player_handlers(archive_server):
+    player = ChessAPI.fetch_player_data(PLAYER_NAME)
+    assert player['username'] == PLAYER_NAME.lower()
+    assert ChessAPI.fetch_country_data(player['country'])['code'] == 'PL'
+    assert set(ChessAPI.fetch_player_stats(PLAYER_NAME)) == {'chess_bullet', 'chess_blitz', 'chess_rapid'}
+
+
+def test_unknown_paths_are_not_found(archive_server):
+    assert requests.get(f"{archive_server.base_url}/nothing/here").status_code == 404
+    assert archive_server.requests == [('/pub/nothing/here', 404)]
+
+
+def test_requests_are_logged(archive_server):
+    ChessAPI.fetch_games(PLAYER_NAME, 2023, 1)
+    ChessAPI.fetch_player_data(PLAYER_NAME)
+    assert archive_server.requests == [
+        (f'/pub/player/{PLAYER_NAME}/games/2023/01', 200),
+        (f'/pub/player/{PLAYER_NAME}', 200),
+    ]
+
+
+def test_iter_archive_is_valid_json():
+    for n_games in (0, 1, 5, 12):
+        document = json.loads(b''.join(iter_archive(n_games, chunk_games=5)))
+        assert len(document['games']) == n_games
+
+
+@pytest.mark.parametrize('time_classes', [['blitz'], ['bullet', 'daily']])
+def test_generator_time_classes(time_classes):
+    games = json.loads(archive_bytes(200, time_classes=time_classes))['games']
+    assert {game['time_class'] for game in games} == set(time_classes)
+    controls = {control for time_class in time_classes for control in TIME_CLASSES[time_class]}
+    assert {game['time_control'] for game in games} <= controls
+
+
+def test_generator_accuracies_and_pgn_size():
+    without = json.loads(archive_bytes(200, accuracy_fraction=0))['games']
+    assert not any('accuracies' in game for game in without)
+    every = json.loads(archive_bytes(200, accuracy_fraction=1))['games']
+    assert all('accuracies' in game for game in every)
+
+    short = json.loads(archive_bytes(200, pgn_moves=10))['games']
+    long = json.loads(archive_bytes(200, pgn_moves=80))['games']
+    assert sum(len(game['pgn']) for game in long) > 4 * sum(len(game['pgn']) for game in short)
+
+
+def test_generator_player_and_month():
+    games = json.loads(archive_bytes(100, player_name=PLAYER_NAME, year=2022, month=2))['games']
+    assert all(PLAYER_NAME in (game['white']['username'], game['black']['username']) for game in games)
+    assert min(game['end_time'] for game in games) >= 1643673600  # 2022-02-01
+    assert max(game['end_time'] for game in games) < 1646092800  # 2022-03-01
@@ -0,0 +1,80 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import instrumentation
+from data_cleaner import ChessDataCleaner
+from fetch_games import ChessAPI
+
+from conftest import PLAYER_NAME
+
+
+@pytest.fixture
+def trace():
+    return instrumentation.new_trace('test')
+
+
+def test_span_records_duration_and_attributes(trace):
+    with instrumentation.span('parse.archive', 'parse', url='x') as attributes:
+        attributes['bytes'] = 10
+
+    (record,) = instrumentation.recorder.spans(trace)
+    assert record['trace'] == trace == instrumentation.current_trace()
+    assert (record['name'], record['category'], record['url'], record['bytes']) == ('parse.archive', 'parse', 'x', 10)
+    assert record['duration_ms'] >= 0 and record['error'] is None
+
+
+def test_span_records_errors(trace):
+    with pytest.raises(KeyError):
+        with instrumentation.span('cache.lookup', 'cache'):
+            raise KeyError('missing')
+    assert instrumentation.recorder.spans(trace)[0]['error'] == 'KeyError'
+
+
+def test_submit_keeps_the_trace(trace):
+    def work():
+        with instrumentation.span('http.player', 'http'):
+            return instrumentation.current_trace()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert instrumentation.submit(executor, work).result() == trace
+        # A plain submit runs outside the trace
+        assert executor.submit(work).result() != trace
+    assert len(instrumentation.recorder.spans(trace)) == 1
+
+
+def test_summary(trace):
+    for hit in (True, False, True, True):
+        with instrumentation.span('cache.cleaned', 'cache', hit=hit):
+            pass
+    with instrumentation.span('http.archive', 'http', bytes=np.int64(100)):
+        pass
+
+    summary = instrumentation.summary(trace)
+    assert summary.loc[('cache', 'cache.cleaned'), 'count'] == 4
+    assert summary.loc[('cache', 'cache.cleaned'), 'hit_rate'] == 0.75
+    assert summary.loc[('http', 'http.archive'), 'bytes'] == 100
+    assert instrumentation.summary('no-such-trace').empty
+
+
+def test_export_and_log(trace, tmp_path, caplog):
+    with caplog.at_level(logging.DEBUG, logger='instrumentation.spans'):
+        with instrumentation.span('render.kde', 'render', rows=np.int32(3)):
+            pass
+    assert json.loads(caplog.records[-1].getMessage())['rows'] == 3
+
+    path = tmp_path / 'spans.jsonl'
+    instrumentation.export(str(path), trace)
+    (line,) = path.read_text().splitlines()
+    assert json.loads(line)['name'] == 'render.kde'
+
+
+def test_the_pipeline_is_instrumented(archive_server, trace):
+    ChessDataCleaner(ChessAPI.fetch_games(PLAYER_NAME, 2023, 1), PLAYER_NAME).clean_data()
+
+    names = set(instrumentation.spans_frame(trace)['name'])
+    assert {'cache.archive_store', 'clean.calculate_results', 'clean.compact'} <= names
+    assert any(name.startswith('http.') for name in names)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_games
+from move_stats import PIECES, TCN_ALPHABET, decode_tcn, extract_clocks, extract_move_stats, move_totals
+
+
+def tcn(*squares):
+    return ''.join(TCN_ALPHABET[square] for square in squares)
+
+
+def test_decode_tcn_squares():
+    # 1. e4 e5 2. Nf3: e2-e4, e7-e5, g1-f3
+    offsets, origin, target, promotion = decode_tcn([tcn(12, 28, 52, 36, 6, 21)])
+    assert offsets.tolist() == [0, 3]
+    assert origin.tolist() == [12, 52, 6]
+    assert target.tolist() == [28, 36, 21]
+    assert promotion.tolist() == [-1, -1, -1]
+
+
+def test_decode_tcn_promotions_and_drops():
+    # e7-e8=Q, d2xc1=N, and a knight dropped on f3
+    queen_straight = 64 + 3 * PIECES.index('q') + 1
+    knight_capture_left = 64 + 3 * PIECES.index('n')
+    knight_drop = 79 + PIECES.index('n')
+    offsets, origin, target, promotion = decode_tcn([tcn(52, queen_straight, 11, knight_capture_left, knight_drop, 21)])
+
+    assert origin.tolist() == [52, 11, -1]
+    assert target.tolist() == [60, 2, 21]
+    assert promotion.tolist() == [PIECES.index('q'), PIECES.index('n'), PIECES.index('n')]
+
+
+def test_decode_tcn_offsets_with_missing_games():
+    offsets, origin, _, _ = decode_tcn([tcn(12, 28), None, np.nan, tcn(52, 36, 6, 21)])
+    assert offsets.tolist() == [0, 1, 1, 1, 3]
+    assert origin.tolist() == [12, 52, 6]
+
+
+def test_extract_clocks():
+    pgns = [
+        '1. e4 {[%clk 0:02:59.9]} 1... e5 {[%clk 0:03:00]} 2. Nf3 {[%clk 1:02:03.4]}',
+        None,
+        '1. d4 {[%eval 0.3] [%clk 12:00:00]} 1... d5 {[%clk 123:04:05]} 100% done',
+        # An unclosed tag is skipped
+        '1. c4 {[%clk 0:01:00.5]} 1... c5 {[%clk 0:01:0',
+    ]
+    offsets, clock = extract_clocks(pgns)
+    assert offsets.tolist() == [0, 3, 3, 5, 6]
+    np.testing.assert_allclose(clock, [179.9, 180, 3723.4, 43200, 443045, 60.5], rtol=1e-6)
+
+
+def test_extract_clocks_in_batches_matches_one_batch():
+    pgns = [game['pgn'] for game in generate_games(50, pgn_moves=20)]
+    offsets, clock = extract_clocks(pgns)
+    batched_offsets, batched_clock = extract_clocks(pgns, batch_size=7)
+    assert offsets.tolist() == batched_offsets.tolist()
+    assert clock.tolist() == batched_clock.tolist()
+    assert offsets[-1] == sum(pgn.count('[%clk ') for pgn in pgns)
+
+
+def test_extract_clocks_without_games():
+    offsets, clock = extract_clocks([])
+    assert offsets.tolist() == [0]
+    assert len(clock) == 0
+
+
+def test_extract_move_stats():
+    games = pd.DataFrame({
+        'time_control': ['180+2', '1/86400'],
+        'tcn': [tcn(12, 28, 52, 36, 6, 21), tcn(11, 27)],
+        'pgn': [
+            '1. e4 {[%clk 0:02:50]} 1... e5 {[%clk 0:02:00]} 2. Nf3 {[%clk 0:00:10]}',
+            '1. d4 {[%clk 23:59:59]}',
+        ],
+    })
+    stats = extract_move_stats(games)
+
+    assert stats.move_count.tolist() == [3, 1]
+    assert stats.base_time[0] == 180 and np.isnan(stats.base_time[1])
+    assert stats.increment.tolist() == [2, 0]
+    # The first moves start from the base time, later ones from two plies back plus the increment
+    np.testing.assert_allclose(stats.time_spent[:3], [10, 60, 162])
+    # White drops below 10% of the base time on the third ply
+    assert stats.time_pressure_ply.tolist() == [2, -1]
+
+
+def test_move_totals_of_months_add_up():
+    games = pd.DataFrame(generate_games(400, seed=3))
+    totals = move_totals(games)
+    assert totals['games'].sum() == 400
+    assert set(totals.index) == set(games['time_class'])
+
+    stats = extract_move_stats(games)
+    assert totals['plies'].sum() == stats.move_count.sum()
+    assert totals['timed_plies'].sum() == (~np.isnan(stats.time_spent)).sum()
+    assert totals['seconds'].sum() == pytest.approx(np.nansum(stats.time_spent), rel=1e-5)
+    assert totals['time_pressure'].sum() == (stats.time_pressure_ply >= 0).sum()
+
+    halves = pd.concat([move_totals(games.iloc[:150]), move_totals(games.iloc[150:])])
+    combined = halves.groupby(level='time_class').sum()
+    pd.testing.assert_frame_equal(combined, totals, check_dtype=False)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaner import ChessDataCleaner
+from fetch_games import ChessAPI
+from game_parser import parse_games
+from opening_index import COLORS, OPENING_COLUMNS, OpeningIndex, opening_moves, split_moves
+
+from conftest import PLAYER_NAME
+
+
+@pytest.fixture
+def games(archive):
+    """
+    The archive's cleaned games with their first move and the color the player had.
+    """
+    data = parse_games([archive], OPENING_COLUMNS)
+    cleaned_data = ChessDataCleaner(data, PLAYER_NAME).clean_data()
+    cleaned_data['first move'] = [moves[0] for moves in opening_moves(data['pgn'])]
+    cleaned_data['color'] = np.where(data['white.username'] == PLAYER_NAME, 'white', 'black')
+    return cleaned_data
+
+
+def assert_same_result(actual, expected):
+    pd.testing.assert_frame_equal(actual['continuations'], expected['continuations'])
+    assert {**actual, 'continuations': None} == {**expected, 'continuations': None}
+
+
+def test_split_moves():
+    assert split_moves("1.e4 c5 2.Nf3 {[%clk 0:02:59]} 2...d6 3.d4!? 1-0") == ['e4', 'c5', 'Nf3', 'd6', 'd4']
+    assert split_moves("1. e4 e5 2. Nf3", max_plies=2) == ['e4', 'e5']
+
+
+@pytest.mark.parametrize('color', [None, 'white', 'black'])
+def test_query_counts_the_games_of_a_line(archive_server, games, color):
+    index = OpeningIndex(PLAYER_NAME)
+    assert index.ingest_month(2023, 1) == len(games)
+
+    expected = games[games['first move'] == 'e4']
+    if color:
+        expected = expected[expected['color'] == color]
+    result = index.query("1.e4", color=color)
+
+    assert result['games'] == len(expected)
+    assert result['wins'] == (expected['result'] == 'win').sum()
+    assert result['losses'] == (expected['result'] == 'loss').sum()
+    assert result['avg_opponent_rating'] == pytest.approx(expected["opponent's rating"].astype(float).mean())
+    assert result['continuations']['games'].sum() == len(expected)
+
+
+def test_query_of_an_unknown_line(archive_server):
+    index = OpeningIndex(PLAYER_NAME)
+    index.ingest_month(2023, 1)
+    assert index.query("1.h4 h5") is None
+    assert index.query([])['games'] == 300
+
+
+def test_closed_months_are_only_indexed_once(archive_server, monkeypatch):
+    fetches = []
+    fetch_games = ChessAPI.fetch_games
+    monkeypatch.setattr(ChessAPI, 'fetch_games', lambda *args, **kwargs: fetches.append(args) or fetch_games(*args, **kwargs))
+
+    index = OpeningIndex(PLAYER_NAME)
+    index.ingest_month(2023, 1)
+    assert (2023, 1) in index.complete
+    assert index.ingest_month(2023, 1) == 0
+    assert len(fetches) == 1
+
+
+def test_usernames_are_case_insensitive(archive_server):
+    index = OpeningIndex(PLAYER_NAME)
+    index.ingest_month(2023, 1)
+    lowercased = OpeningIndex(PLAYER_NAME.lower())
+    lowercased.ingest_month(2023, 1)
+
+    for color in COLORS:
+        assert_same_result(lowercased.query("1.e4", color=color), index.query("1.e4", color=color))
+
+
+def test_save_and_load(archive_server, tmp_path):
+    index = OpeningIndex(PLAYER_NAME)
+    index.ingest_month(2023, 1)
+    index.save(str(tmp_path))
+
+    assert OpeningIndex.path(PLAYER_NAME, str(tmp_path)) == str(tmp_path / 'testplayer.npz')
+    loaded = OpeningIndex.load(PLAYER_NAME.upper(), str(tmp_path))
+    assert loaded.ingested == index.ingested and loaded.complete == index.complete
+    for line in ("1.e4", "1.d4 Nf6 2.c4", "1.c4 e5"):
+        assert_same_result(loaded.query(line), index.query(line))
+
+    # Indexing continues from the saved state
+    assert loaded.ingest_month(2023, 1) == 0
+
+
+def test_load_starts_over_when_the_cleaner_changed(archive_server, tmp_path, monkeypatch):
+    index = OpeningIndex(PLAYER_NAME)
+    index.ingest_month(2023, 1)
+    index.save(str(tmp_path))
+
+    monkeypatch.setattr(ChessDataCleaner, 'version_hash', classmethod(lambda cls: 'changed'))
+    loaded = OpeningIndex.load(PLAYER_NAME, str(tmp_path))
+    assert loaded.ingested == {} and loaded.query("1.e4") is None
+
+
+@pytest.mark.parametrize('name', ['../../x', 'a/b', '.'])
+def test_path_rejects_invalid_usernames(name, tmp_path):
+    with pytest.raises(ValueError):
+        OpeningIndex.path(name, str(tmp_path))
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import GameAggregates
+from data_cleaner import ChessDataCleaner
+from game_cache import CleanedGameCache
+from range_analysis import RangeAggregates, analyze_range, available_months
+
+from conftest import PLAYER_NAME
+
+ACCURACY = f"{PLAYER_NAME} accuracy"
+
+
+def assert_same_summary(actual, expected):
+    pd.testing.assert_frame_equal(actual.drop(columns='histogram'), expected.drop(columns='histogram'))
+    for time_class in expected.index:
+        np.testing.assert_array_equal(actual.loc[time_class, 'histogram'], expected.loc[time_class, 'histogram'])
+
+
+def test_adding_months_equals_the_whole(cleaned_games):
+    whole = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME)
+    parts = RangeAggregates(PLAYER_NAME)
+    parts.add(cleaned_games.iloc[:120], (2023, 1))
+    parts.add(cleaned_games.iloc[:0], (2023, 2))
+    parts.add(cleaned_games.iloc[120:], (2023, 3))
+
+    assert len(parts) == len(whole) == len(cleaned_games)
+    assert parts.months == [(2023, 1), (2023, 3)]
+    assert_same_summary(parts.summary(), whole.summary())
+    assert_same_summary(whole.summary(), GameAggregates.combine(GameAggregates.compute(cleaned_games, PLAYER_NAME)))
+    pd.testing.assert_frame_equal(parts.accuracy_summary(), whole.accuracy_summary())
+
+
+def test_accuracy_summary(cleaned_games):
+    summary = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME).accuracy_summary()
+    for time_class, games in cleaned_games.dropna(subset=[ACCURACY]).groupby('time_class', observed=True):
+        row = summary.loc[time_class]
+        assert row['games'] == len(games)
+        assert row['avg_accuracy'] == pytest.approx(games[ACCURACY].astype(float).mean())
+        assert row['correlation'] == pytest.approx(np.corrcoef(games["opponent's rating"], games[ACCURACY].astype(float))[0, 1])
+
+
+def test_accuracy_sample_is_bounded(cleaned_games):
+    aggregates = RangeAggregates(PLAYER_NAME, sample_size=10)
+    for part in np.array_split(np.arange(len(cleaned_games)), 5):
+        aggregates.add(cleaned_games.iloc[part])
+
+    games = cleaned_games[cleaned_games['time_class'] == 'blitz'].dropna(subset=[ACCURACY])
+    x, y = aggregates.accuracy_sample('blitz')
+    assert len(x) == min(10, len(games))
+    points = set(zip(games["opponent's rating"].astype(float), games[ACCURACY].astype(float)))
+    assert set(zip(x, y)) <= points
+    assert len(aggregates.accuracy_sample('unknown')[0]) == 0
+
+
+def test_rating_curve(cleaned_games):
+    curve = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME).rating_curve()
+    assert curve['count'].sum() == len(cleaned_games)
+
+    games = cleaned_games.sort_values('end_time', kind='stable')
+    last = games.groupby(['time_class', games['end_time'].dt.floor('D')], observed=True)[f"{PLAYER_NAME}'s rating"].last()
+    for day, row in curve.iterrows():
+        assert row['close'] == last[(row['time_class'], day)]
+
+
+def test_density_curves(cleaned_games):
+    grid, curves = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME).density_curves()
+    assert set(curves) == set(cleaned_games['time_class'])
+    area = sum(curve.sum() for curve in curves.values()) * (grid[1] - grid[0])
+    assert area == pytest.approx(1, abs=0.01)
+    assert RangeAggregates(PLAYER_NAME).density_curves()[1] == {}
+
+
+def test_version_follows_the_content(cleaned_games):
+    first = RangeAggregates.from_frame(cleaned_games, PLAYER_NAME)
+    lowercased = ChessDataCleaner.rename_player(cleaned_games, PLAYER_NAME.lower())
+    assert RangeAggregates.from_frame(lowercased, PLAYER_NAME.lower()).version == first.version
+    assert RangeAggregates.from_frame(cleaned_games.iloc[1:], PLAYER_NAME).version != first.version
+
+
+def test_analyze_range(archive_server, cleaned_games, tmp_path):
+    months = available_months(PLAYER_NAME, (2022, 11), (2023, 3))
+    assert months == [(2023, 1)]
+
+    cache = CleanedGameCache(str(tmp_path / 'cleaned'))
+    sequential = analyze_range(PLAYER_NAME, months, cache)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        prefetched = analyze_range(PLAYER_NAME, months * 3, cache, executor=executor, prefetch=1)
+
+    assert len(sequential) == len(cleaned_games) and len(prefetched) == 3 * len(cleaned_games)
+    assert prefetched.months == months * 3
+    expected = sequential.summary()[['games', 'wins', 'draws', 'losses']] * 3
+    pd.testing.assert_frame_equal(prefetched.summary()[['games', 'wins', 'draws', 'losses']], expected)
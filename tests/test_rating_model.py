@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rating_model import add_expectations, band_summary, expected_score, glicko_g, reconstruct_ratings
+
+from conftest import PLAYER_NAME
+
+RATING = f"{PLAYER_NAME}'s rating"
+
+
+def games(ratings, opponent_ratings, scores, time_classes=None, end_times=None):
+    n = len(ratings)
+    return pd.DataFrame({
+        'end_time': end_times if end_times is not None else np.arange(n),
+        'time_class': time_classes or ['blitz'] * n,
+        RATING: ratings,
+        "opponent's rating": opponent_ratings,
+        'score': scores,
+    })
+
+
+def test_expected_score():
+    assert expected_score(1500, 1500) == pytest.approx(0.5)
+    assert expected_score(1900, 1500) == pytest.approx(10 / 11)
+    assert expected_score(1500, 1900) + expected_score(1900, 1500) == pytest.approx(1)
+
+    # An uncertain opponent rating pulls the expectation towards 0.5
+    assert glicko_g(0) == 1
+    assert 0.5 < expected_score(1900, 1500, opponent_deviation=200) < expected_score(1900, 1500)
+
+
+def test_add_expectations():
+    data = add_expectations(games([1500, 1900], [1500, 1500], [1.0, 0.0]), PLAYER_NAME)
+    np.testing.assert_allclose(data['expected score'], [0.5, 10 / 11], rtol=1e-6)
+    np.testing.assert_allclose(data['score surplus'], [0.5, -10 / 11], rtol=1e-6)
+
+
+def test_reconstruct_ratings_starts_at_the_first_recorded_rating():
+    data = games([1510, 1500, 1490], [1500, 1500, 1500], [1.0, 0.0, 0.0])
+    reconstructed = reconstruct_ratings(data, PLAYER_NAME, k_factor=20)
+
+    expected = add_expectations(data, PLAYER_NAME)['expected score']
+    assert reconstructed[0] == 1510
+    assert reconstructed[1] == pytest.approx(1510 + 20 * (0 - expected[1]))
+    assert reconstructed[2] == pytest.approx(reconstructed[1] + 20 * (0 - expected[2]))
+
+
+def test_reconstruct_ratings_per_time_class(cleaned_games):
+    shuffled = cleaned_games.sample(frac=1, random_state=0)
+    reconstructed = reconstruct_ratings(shuffled, PLAYER_NAME)
+    assert reconstructed.index.equals(shuffled.index)
+
+    # A game-by-game reference, in the order the games were played
+    data = add_expectations(cleaned_games, PLAYER_NAME).sort_values('end_time', kind='stable')
+    for _, group in data.groupby('time_class', observed=True):
+        rating = float(group[f"{PLAYER_NAME}'s rating"].iloc[0])
+        expected = [rating]
+        for surplus in group['score surplus'].iloc[1:]:
+            rating += 20 * float(surplus)
+            expected.append(rating)
+        np.testing.assert_allclose(reconstructed[group.index], expected, rtol=1e-5)
+
+
+def test_reconstruct_ratings_without_games(cleaned_games):
+    assert reconstruct_ratings(cleaned_games.iloc[:0], PLAYER_NAME).empty
+
+
+def test_band_summary(cleaned_games):
+    summary = band_summary(cleaned_games, PLAYER_NAME, band_width=200)
+    assert summary['games'].sum() == len(cleaned_games)
+    assert (summary.index.get_level_values('opponent_band') % 200 == 0).all()
+    assert summary['score'].sum() == cleaned_games['score'].sum()
+    np.testing.assert_allclose(summary['performance'], (summary['surplus'] / summary['games']).round(3))
@@ -0,0 +1,162 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from batch_report import init_worker, max_workers
+from fetch_games import ChessAPI
+from request_scheduler import BACKGROUND, INTERACTIVE, RequestScheduler, TokenBucket, parse_retry_after
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.25) == pytest.approx(0.25)
+    assert bucket.wait_time(now + 0.5) == pytest.approx(0)
+    # Tokens never exceed the capacity
+    assert bucket.wait_time(now + 100) == 0
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1, capacity=5)
+    now = bucket.updated
+    bucket.pause(now + 10)
+
+    assert bucket.tokens == 0
+    assert bucket.wait_time(now) == pytest.approx(11)
+    assert bucket.wait_time(now + 10) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    ('', None),
+    ('120', 120.0),
+    ('Thu, 01 Jan 1970 00:01:40 GMT', 40.0),
+    ('Thu, 01 Jan 1970 00:00:10 GMT', 0.0),
+    ('soon', None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value, now=60) == expected
+
+
+def test_rate_backs_off_on_429_and_recovers():
+    scheduler = RequestScheduler(rate=8, min_rate=1)
+    scheduler.rate_limited(retry_after=0)
+    assert scheduler.rate == 4
+    for _ in range(3):
+        scheduler.rate_limited(retry_after=0)
+    assert scheduler.rate == 1
+
+    for _ in range(100):
+        scheduler.succeeded()
+    assert scheduler.rate == 8
+
+
+def admission_order(scheduler, requests):
+    """
+    Queues requests behind a held slot, releases it and returns the order they were admitted in.
+    """
+    order = []
+    lock = threading.Lock()
+
+    def request(name, priority, client):
+        with scheduler.slot(priority, client):
+            with lock:
+                order.append(name)
+
+    scheduler.acquire(INTERACTIVE, 'holder')
+    threads = []
+    for name, priority, client in requests:
+        thread = threading.Thread(target=request, args=(name, priority, client))
+        thread.start()
+        threads.append(thread)
+        # Queue the requests one after the other
+        time.sleep(0.05)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_scheduler_serves_interactive_requests_first():
+    scheduler = RequestScheduler(rate=1000, burst=1000, max_concurrency=1)
+    order = admission_order(scheduler, [
+        ('sync-1', BACKGROUND, 'a'),
+        ('sync-2', BACKGROUND, 'a'),
+        ('page', INTERACTIVE, 'b'),
+    ])
+    assert order == ['page', 'sync-1', 'sync-2']
+
+
+def test_scheduler_is_round_robin_across_clients():
+    scheduler = RequestScheduler(rate=1000, burst=1000, max_concurrency=1)
+    order = admission_order(scheduler, [
+        ('a-1', INTERACTIVE, 'a'),
+        ('a-2', INTERACTIVE, 'a'),
+        ('a-3', INTERACTIVE, 'a'),
+        ('b-1', INTERACTIVE, 'b'),
+    ])
+    assert order == ['a-1', 'b-1', 'a-2', 'a-3']
+
+
+def test_scheduler_limits_concurrency():
+    scheduler = RequestScheduler(rate=1000, burst=1000, max_concurrency=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def request():
+        with scheduler.slot():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) == 2
+
+
+def test_scheduler_admits_at_most_the_rate():
+    scheduler = RequestScheduler(rate=20, burst=1, max_concurrency=4)
+    start = time.monotonic()
+    for _ in range(5):
+        with scheduler.slot():
+            pass
+    # The first request uses the burst, the other four wait 1/20 s each
+    assert time.monotonic() - start >= 0.18
+
+
+def test_a_shared_pause_holds_back_every_scheduler():
+    shared_pause = multiprocessing.Value('d', 0.0)
+    first = RequestScheduler(rate=1000, burst=10, shared_pause=shared_pause)
+    second = RequestScheduler(rate=1000, burst=10, shared_pause=shared_pause)
+
+    first.rate_limited(retry_after=0.2)
+    assert shared_pause.value == pytest.approx(time.time() + 0.2, abs=0.05)
+    start = time.monotonic()
+    with second.slot():
+        pass
+    assert time.monotonic() - start >= 0.15
+
+
+def test_worker_shares_stay_within_the_limits(monkeypatch):
+    # init_worker replaces the scheduler of the (worker) process
+    monkeypatch.setattr(ChessAPI, 'scheduler', ChessAPI.scheduler)
+    for workers in range(1, max_workers() + 1):
+        init_worker(workers, None)
+        scheduler = ChessAPI.scheduler
+        assert scheduler.max_concurrency >= 1 and scheduler.max_concurrency * workers <= RequestScheduler.MAX_CONCURRENCY
+        assert 1 <= scheduler._bucket.capacity and scheduler._bucket.capacity * workers <= RequestScheduler.BURST
+        assert scheduler.max_rate * workers == pytest.approx(RequestScheduler.RATE)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from timeseries import daily_ohlc, downsample, lttb
+
+
+def test_lttb_keeps_the_ends_and_the_threshold():
+    rng = np.random.default_rng(0)
+    x = np.arange(1000, dtype=float)
+    y = rng.normal(size=1000).cumsum()
+    selected = lttb(x, y, 50)
+
+    assert len(selected) == 50
+    assert selected[0] == 0 and selected[-1] == 999
+    assert (np.diff(selected) > 0).all()
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[123], y[321] = 100, -100
+    selected = lttb(x, y, 20)
+    assert 123 in selected and 321 in selected
+
+
+@pytest.mark.parametrize('threshold', [2, 10, 11])
+def test_lttb_keeps_everything_when_there_is_nothing_to_drop(threshold):
+    x = np.arange(10, dtype=float)
+    assert lttb(x, x, threshold).tolist() == list(range(10))
+
+
+def test_downsample_returns_the_selected_points():
+    times = np.arange('2023-01-01', '2023-03-01', dtype='datetime64[h]')
+    values = np.sin(np.arange(len(times)) / 50)
+    kept_times, kept_values = downsample(times, values, 100)
+
+    assert len(kept_times) == len(kept_values) == 100
+    assert kept_times[0] == times[0] and kept_times[-1] == times[-1]
+    positions = np.searchsorted(times, kept_times)
+    np.testing.assert_array_equal(values[positions], kept_values)
+
+
+def test_daily_ohlc():
+    times = np.array(['2023-01-01T10', '2023-01-01T12', '2023-01-01T20', '2023-01-03T09'], dtype='datetime64[s]')
+    daily = daily_ohlc(times, [1500, 1520, 1490, 1510])
+
+    assert [str(day.date()) for day in daily.index] == ['2023-01-01', '2023-01-03']
+    assert daily.loc['2023-01-01', ['open', 'high', 'low', 'close', 'count']].tolist() == [1500, 1520, 1490, 1490, 3]
+    assert daily.loc['2023-01-03', 'count'] == 1
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb(x, y, threshold):
+    """
+    Selects the points of a series to keep with Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept; every bucket in between contributes
+    the point forming the largest triangle with the previously selected point and
+    the average of the next bucket, which preserves the visual shape of the line.
+
+    :param x: A float array of x values in increasing order.
+    :param y: A float array of y values.
+    :param threshold: The number of points to keep.
+    :return: An integer array with the indices of the selected points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[anchor] - next_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (next_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(areas))
+        selected[i + 1] = anchor
+
+    return selected
+
+
+def downsample(times, values, threshold):
+    """
+    Downsamples a time series with LTTB.
+
+    :param times: A datetime64 array in increasing order.
+    :param values: A numeric array.
+    :param threshold: The number of points to keep.
+    :return: A tuple (times, values) of the kept points.
+    """
+    x = times.astype('datetime64[s]').astype(np.int64).astype(float)
+    y = np.asarray(values, dtype=float)
+    selected = lttb(x, y, threshold)
+    return times[selected], y[selected]
+
+
+def daily_ohlc(times, values):
+    """
+    Summarizes a time series as open/high/low/close values per day.
+
+    :param times: A datetime64 array in increasing order.
+    :param values: A numeric array.
+    :return: A DataFrame indexed by day with 'open', 'high', 'low', 'close' and 'count' columns.
+    """
+    series = pd.Series(np.asarray(values, dtype=float), index=pd.DatetimeIndex(times).normalize())
+    grouped = series.groupby(level=0, sort=True)
+    return pd.DataFrame({
+        'open': grouped.first(),
+        'high': grouped.max(),
+        'low': grouped.min(),
+        'close': grouped.last(),
+        'count': grouped.size(),
+    })